@@ -1,5 +1,6 @@
 import streamlit as st
-from PIL import Image
+
+from utils.sidebar import logo
 
 st.set_page_config(
     page_title='Home',
@@ -8,8 +9,7 @@ st.set_page_config(
 )
 
 #image_path='C:/Users/Phelipe Pachler/Documents/REPOS/ftc_python_analise_dados/notebooks/'
-image = Image.open('logo.png')
-st.sidebar.image(image, width=300)
+st.sidebar.image(logo(), width=300)
 
 st.sidebar.markdown('# Pachler Company')
 st.sidebar.markdown('## Fastest Delivery in Town')
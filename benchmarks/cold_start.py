@@ -0,0 +1,106 @@
+# ----------------------------------------
+# Benchmark da carga a frio de cada página
+#
+# Cada medida roda em um processo Python novo, como o primeiro acesso a um pod
+# recém-criado: nada importado e nenhum cache do Streamlit. Por página são
+# medidos
+#
+# - importacao: só os imports do topo do script da página;
+# - primeiro_run: o script inteiro em modo bare (imports, leitura do snapshot,
+#   cubo, sidebar e gráficos da aba padrão);
+# - modulos: quantos módulos ficaram carregados depois do primeiro run.
+#
+# O diretório de trabalho precisa ter dataset/train.csv e logo.png (o snapshot
+# é criado antes das medidas, se ainda não existir).
+#
+# Uso:
+#   python -m benchmarks.cold_start
+#   python -m benchmarks.cold_start --diretorio /srv/dashboard --repeticoes 5 --saida frio.json
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.run import versao_codigo
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGINAS = ['Home.py', 'pages/visao_empresa.py', 'pages/visao_entregadores.py', 'pages/visao_restaurantes.py']
+
+# executado no processo novo: argv = [modo, script]
+_MEDIDOR = '''
+import ast, json, runpy, sys, time, warnings
+warnings.simplefilter('ignore')
+modo, script = sys.argv[1:3]
+inicio = time.perf_counter()
+if modo == 'importacao':
+    arvore = ast.parse(open(script).read())
+    arvore.body = [no for no in arvore.body if isinstance(no, (ast.Import, ast.ImportFrom))]
+    exec(compile(arvore, script, 'exec'), {'__name__': '__frio__'})
+else:
+    runpy.run_path(script, run_name='__main__')
+print(json.dumps({'segundos': time.perf_counter() - inicio, 'modulos': len(sys.modules)}))
+'''
+
+# ----------------------------------------
+# Funções
+def medir_processo(modo, script, diretorio):
+    """ Roda o medidor em um processo novo e devolve o seu resultado
+
+        Input: 'importacao' ou 'primeiro_run', caminho do script, diretório de trabalho
+        Output: dicionário {segundos, modulos, processo} (processo inclui subir o Python)
+    """
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+    inicio = time.perf_counter()
+    saida = subprocess.run([sys.executable, '-c', _MEDIDOR, modo, script], cwd=diretorio, env=ambiente,
+                           capture_output=True, text=True, check=True).stdout
+    resultado = json.loads(saida.strip().splitlines()[-1])
+    resultado['processo'] = time.perf_counter() - inicio
+
+    return resultado
+
+def preparar(diretorio):
+    """ Garante o snapshot do csv, para o primeiro run medir a carga de um pod e não a conversão """
+    medir_processo('primeiro_run', os.path.join(RAIZ, PAGINAS[1]), diretorio)
+
+def rodar(diretorio, repeticoes=3, paginas=PAGINAS):
+    """ Mede importação e primeiro run de cada página, 'repeticoes' vezes (vale o menor)
+
+        Input: diretório de trabalho, repetições, scripts relativos à raiz do repositório
+        Output: lista de dicionários {pagina, modo, segundos, processo, modulos}
+    """
+    resultados = []
+    for pagina in paginas:
+        script = os.path.join(RAIZ, pagina)
+        for modo in ['importacao', 'primeiro_run']:
+            medidas = [medir_processo(modo, script, diretorio) for _ in range(repeticoes)]
+            melhor = min(medidas, key=lambda medida: medida['segundos'])
+            resultados.append(dict(melhor, pagina=pagina, modo=modo))
+            print('{:<30} {:<13} {:>8.3f}s {:>8.3f}s {:>6} módulos'.format(
+                pagina, modo, melhor['segundos'], melhor['processo'], melhor['modulos']), flush=True)
+
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Carga a frio de cada página do dashboard')
+    parser.add_argument('--diretorio', default='.', help='diretório com dataset/train.csv e logo.png')
+    parser.add_argument('--repeticoes', type=int, default=3, help='processos por medida (vale o menor tempo)')
+    parser.add_argument('--saida', default=None, help='arquivo JSON de resultados')
+    args = parser.parse_args(argv)
+
+    preparar(args.diretorio)
+    print('{:<30} {:<13} {:>9} {:>9}'.format('página', 'medida', 'script', 'processo'))
+    execucao = {'data': datetime.now().isoformat(timespec='seconds'), 'commit': versao_codigo(),
+                'python': sys.version.split()[0],
+                'resultados': rodar(args.diretorio, args.repeticoes)}
+
+    if args.saida:
+        os.makedirs(os.path.dirname(args.saida) or '.', exist_ok=True)
+        with open(args.saida, 'w') as arquivo:
+            json.dump(execucao, arquivo, indent=2)
+        print('\nresultados gravados em {}'.format(args.saida))
+
+if __name__ == '__main__':
+    main()
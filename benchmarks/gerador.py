@@ -0,0 +1,92 @@
+# ----------------------------------------
+# Gerador de pedidos sintéticos com o mesmo formato do dataset/train.csv
+#
+# Reproduz as "sujeiras" do csv original: espaços no fim dos textos, 'NaN '
+# como texto, 'conditions NaN' no clima e o tempo no formato '(min) NN'.
+#
+# Gerar um csv:
+#   python -m benchmarks.gerador 1000000 dataset/sintetico.csv
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLUNAS_CSV = ['ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+               'Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude',
+               'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+               'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order',
+               'Type_of_vehicle', 'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)']
+
+CIDADES = ['Urban ', 'Metropolitian ', 'Semi-Urban ']
+TRANSITO = ['Low ', 'Medium ', 'High ', 'Jam ']
+CLIMA = ['conditions Sunny', 'conditions Stormy', 'conditions Sandstorms', 'conditions Cloudy',
+         'conditions Fog', 'conditions Windy', 'conditions NaN']
+PEDIDOS = ['Snack ', 'Meal ', 'Drinks ', 'Buffet ']
+VEICULOS = ['motorcycle ', 'scooter ', 'electric_scooter ', 'bicycle ']
+
+# ----------------------------------------
+# Funções
+def _sorteio(rng, valores, n, p_nan=0.0):
+    """ Sorteia n valores de uma lista; uma fração p_nan vira o texto 'NaN ' """
+    valores = np.array(list(valores) + ['NaN '], dtype=object)
+    p = np.full(len(valores), (1 - p_nan) / (len(valores) - 1))
+    p[-1] = p_nan
+
+    return valores[rng.choice(len(valores), size=n, p=p)]
+
+def gerar_pedidos(n, seed=0, dias=60, p_nan=0.03):
+    """ Gera n pedidos sintéticos, crus, com o esquema do train.csv.
+
+        Os textos são sorteados de pequenos conjuntos de objetos compartilhados,
+        então a memória cresce pouco além dos arrays numéricos.
+
+        Input: número de linhas, semente, quantidade de dias, fração de 'NaN '
+        Output: dataframe cru (antes do clean_code)
+    """
+    rng = np.random.default_rng(seed)
+
+    n_entregadores = max(1000, n // 50)
+    entregadores = np.array(['CITYRES{:02d}DEL{:05d} '.format(i % 30, i) for i in range(n_entregadores)], dtype=object)
+
+    n_restaurantes = max(500, n // 200)
+    rest_lat = rng.uniform(10, 30, n_restaurantes)
+    rest_lon = rng.uniform(70, 90, n_restaurantes)
+    # o csv original tem restaurantes com latitude negativa e coordenadas zeradas
+    rest_lat[rng.random(n_restaurantes) < 0.01] *= -1
+    rest_lat[rng.random(n_restaurantes) < 0.005] = 0
+    restaurante = rng.integers(n_restaurantes, size=n)
+
+    datas = pd.date_range('2022-02-11', periods=dias).strftime('%d-%m-%Y')
+    horas = ['{:02d}:{:02d}:00'.format(h, m) for h in range(8, 24) for m in (0, 15, 30, 45)]
+
+    df = pd.DataFrame({
+        'ID': pd.Series(np.arange(n)).map('0x{:x} '.format),
+        'Delivery_person_ID': entregadores[rng.integers(n_entregadores, size=n)],
+        'Delivery_person_Age': _sorteio(rng, [str(i) for i in range(18, 40)], n, p_nan),
+        'Delivery_person_Ratings': _sorteio(rng, ['{:.1f}'.format(r / 10) for r in range(25, 51)], n, p_nan),
+        'Restaurant_latitude': rest_lat[restaurante],
+        'Restaurant_longitude': rest_lon[restaurante],
+        'Delivery_location_latitude': rest_lat[restaurante] + rng.normal(0, 0.05, n),
+        'Delivery_location_longitude': rest_lon[restaurante] + rng.normal(0, 0.05, n),
+        'Order_Date': _sorteio(rng, datas, n),
+        'Time_Orderd': _sorteio(rng, horas, n, p_nan),
+        'Time_Order_picked': _sorteio(rng, horas, n),
+        'Weatherconditions': _sorteio(rng, CLIMA, n),
+        'Road_traffic_density': _sorteio(rng, TRANSITO, n, p_nan),
+        'Vehicle_condition': rng.integers(0, 4, size=n),
+        'Type_of_order': _sorteio(rng, PEDIDOS, n),
+        'Type_of_vehicle': _sorteio(rng, VEICULOS, n),
+        'multiple_deliveries': _sorteio(rng, ['0', '1', '2', '3'], n, p_nan),
+        'Festival': _sorteio(rng, ['No ', 'Yes '], n, p_nan),
+        'City': _sorteio(rng, CIDADES, n, p_nan),
+        'Time_taken(min)': _sorteio(rng, ['(min) {}'.format(m) for m in range(10, 55)], n),
+    })
+
+    return df.loc[:, COLUNAS_CSV]
+
+if __name__ == '__main__':
+    n = int(float(sys.argv[1]))
+    saida = sys.argv[2] if len(sys.argv) > 2 else 'dataset/sintetico.csv'
+
+    gerar_pedidos(n).to_csv(saida, index=False)
+    print('{} pedidos gravados em {}'.format(n, saida))
@@ -0,0 +1,215 @@
+# ----------------------------------------
+# Benchmark das etapas do dashboard em vários tamanhos de dataset
+#
+# Roda sem servidor Streamlit: gera pedidos sintéticos, mede clean_code, os
+# filtros da sidebar, a montagem do índice e do cubo e cada função de gráfico
+# das três páginas, e grava os tempos em JSON para comparar versões. Para as
+# figuras também é gravado o tamanho do JSON enviado ao navegador.
+#
+# Uso:
+#   python -m benchmarks.run --tamanhos 1e6 5e6 --saida resultados.json
+#   python -m benchmarks.run --tamanhos 1e6 --comparar resultados_antigos.json
+#   python -m benchmarks.run --tamanhos 1e6 --dias 1500      # séries de vários anos
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from benchmarks.gerador import gerar_pedidos
+from utils import empresa, entregadores, restaurantes
+from utils.aproximado import ESTRATOS, FRACAO_AMOSTRA, Esbocos
+from utils.backend import FontePandas
+from utils.cubo import Cubo
+from utils.dados import clean_code
+from utils.espacial import IndiceEspacial
+from utils.figuras import tamanho_payload
+from utils.filtros import FilterIndex
+from utils.kpi import calcular_kpis, calcular_kpis_aproximados
+from utils.percentis import AGRUPAMENTOS, QUANTIS_AVALIACAO, QUANTIS_TEMPO, PercentisGrupos, percentis_por_grupo
+
+TAMANHOS_PADRAO = [1_000_000, 5_000_000, 10_000_000, 50_000_000]
+
+# filtros da visão padrão: até 13/04/2022 e todos os tipos de trânsito
+FILTROS_PADRAO = {'inicio': None, 'fim': date(2022, 4, 13),
+                  'Road_traffic_density': ['High', 'Jam', 'Low', 'Medium']}
+# período curto: o custo do filtro do cubo deve ser proporcional ao período
+FILTROS_SEMANA = dict(FILTROS_PADRAO, inicio=date(2022, 3, 6), fim=date(2022, 3, 13))
+
+# ----------------------------------------
+# Funções
+def medir(funcao, repeticoes):
+    """ Executa a função 'repeticoes' vezes e devolve (menor tempo em segundos, último resultado) """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    return min(tempos), resultado
+
+def etapas_graficos(df1, cubo):
+    """ Funções de gráfico/tabela de cada página, prontas para medir """
+    fonte = FontePandas(df1)
+    return {
+        'empresa.order_metric': lambda: empresa.order_metric(cubo),
+        'empresa.traffic_order_share': lambda: empresa.traffic_order_share(cubo),
+        'empresa.traffic_order_city': lambda: empresa.traffic_order_city(cubo),
+        'empresa.order_by_week': lambda: empresa.order_by_week(cubo),
+        'empresa.order_share_by_week': lambda: empresa.order_share_by_week(cubo),
+        'empresa.country_maps': lambda: empresa.country_maps(df1),
+        'entregadores.kpis': lambda: calcular_kpis(fonte, entregadores.KPIS),
+        'entregadores.avaliacao_entregador': lambda: entregadores.avaliacao_entregador(fonte),
+        'entregadores.avaliacao_transito': lambda: entregadores.avaliacao_transito(fonte),
+        'entregadores.avaliacao_clima': lambda: entregadores.avaliacao_clima(fonte),
+        'entregadores.top_delivers': lambda: entregadores.top_delivers(fonte),
+        'restaurantes.kpis': lambda: calcular_kpis(fonte, restaurantes.KPIS),
+        'restaurantes.tempo_cidade_media': lambda: restaurantes.tempo_cidade_media(cubo),
+        'restaurantes.tempo_cidade_desvio': lambda: restaurantes.tempo_cidade_desvio(cubo),
+        'restaurantes.avg_std_cidade_trafego': lambda: restaurantes.avg_std_cidade_trafego(cubo),
+        'restaurantes.distribuicao_distancia': lambda: restaurantes.distribuicao_distancia(cubo),
+        'restaurantes.tempo_por_faixa': lambda: restaurantes.tempo_por_faixa(fonte),
+    }
+
+def rodar(tamanho, repeticoes=3, seed=0, dias=60):
+    """ Mede todas as etapas para um tamanho de dataset
+
+        Input: número de linhas, repetições por etapa, semente e dias do gerador
+        Output: lista de dicionários {etapa, linhas, segundos} (+ payload_bytes nas figuras)
+    """
+    resultados = []
+
+    def registrar(etapa, funcao, linhas, repeticoes=repeticoes):
+        segundos, resultado = medir(funcao, repeticoes)
+        registro = {'etapa': etapa, 'tamanho': tamanho, 'linhas': int(linhas), 'segundos': segundos}
+        if isinstance(resultado, go.Figure):
+            registro['payload_bytes'] = tamanho_payload(resultado)
+        resultados.append(registro)
+        print('{:>12,} {:<40} {:>10.4f}s{}'.format(
+            tamanho, etapa, segundos,
+            ' {:>10.1f} KB'.format(registro['payload_bytes'] / 1024) if 'payload_bytes' in registro else ''),
+            flush=True)
+        return resultado
+
+    df = gerar_pedidos(tamanho, seed=seed, dias=dias)
+    df1 = registrar('clean_code', lambda: clean_code(df), len(df), repeticoes=1)
+    del df
+
+    indice = registrar('filtros.indice', lambda: FilterIndex(df1), len(df1), repeticoes=1)
+    linhas = registrar('filtros.select', lambda: indice.select(**FILTROS_PADRAO), len(df1))
+    filtrado = registrar('filtros.iloc', lambda: df1.iloc[linhas], len(linhas))
+
+    cubo = registrar('cubo.montagem', lambda: Cubo.from_frame(df1), len(df1), repeticoes=1)
+    cubo_filtrado = registrar('cubo.filtrar', lambda: cubo.filtrar(**FILTROS_PADRAO), len(cubo.celulas))
+    registrar('cubo.filtrar_semana', lambda: cubo.filtrar(**FILTROS_SEMANA), len(cubo.celulas))
+
+    for etapa, funcao in etapas_graficos(filtrado, cubo_filtrado).items():
+        registrar(etapa, funcao, len(filtrado))
+    # séries sem o filtro de datas (com --dias grande, mais pontos que pixels)
+    registrar('empresa.order_metric.todas_datas', lambda: empresa.order_metric(cubo), len(df1))
+    registrar('empresa.order_by_week.todas_datas', lambda: empresa.order_by_week(cubo), len(df1))
+
+    # índice espacial: raio de 5 km e vizinhos em volta do restaurante mais movimentado
+    espacial = registrar('espacial.indice', lambda: IndiceEspacial.from_frame(df1), len(df1), repeticoes=1)
+    centro = espacial.restaurantes.iloc[0]
+    no_raio = registrar('espacial.no_raio', lambda: espacial.no_raio(centro['lat'], centro['lon'], 5), len(df1))
+    registrar('espacial.restaurantes_proximos',
+              lambda: espacial.restaurantes_proximos(centro['lat'], centro['lon']), len(espacial.restaurantes))
+    registrar('espacial.tempo_por_faixa', lambda: restaurantes.tempo_por_faixa(FontePandas(df1, no_raio)),
+              len(no_raio))
+
+    # modo aproximado: esboços por dia x trânsito e amostra estratificada
+    esbocos = registrar('aproximado.esbocos', lambda: Esbocos.from_fonte(FontePandas(df1)), len(df1), repeticoes=1)
+    esbocos = registrar('aproximado.esbocos_filtrar', lambda: esbocos.filtrar(**FILTROS_PADRAO), len(esbocos))
+    amostra_global = registrar('aproximado.amostra_global',
+                               lambda: FontePandas(df1).amostrar(FRACAO_AMOSTRA, ESTRATOS), len(df1), repeticoes=1)
+    fonte = FontePandas(df1, linhas, lambda *args: amostra_global.posicoes, ['Order_Date', 'Road_traffic_density'])
+    amostra = registrar('aproximado.amostra', lambda: fonte.amostrar(FRACAO_AMOSTRA, ESTRATOS), len(fonte))
+    registrar('aproximado.restaurantes.kpis', lambda: calcular_kpis_aproximados(amostra, esbocos, restaurantes.KPIS),
+              len(amostra))
+    registrar('aproximado.restaurantes.percentis', lambda: restaurantes.percentis_tempo(esbocos), len(esbocos))
+    registrar('aproximado.empresa.order_share_by_week', lambda: empresa.order_share_by_week_aproximado(esbocos),
+              len(esbocos))
+
+    # percentis por grupo: t-digests por dia x trânsito x cidade x clima
+    percentis = registrar('percentis.montagem', lambda: PercentisGrupos.from_fonte(FontePandas(df1)), len(df1),
+                          repeticoes=1)
+    percentis = registrar('percentis.filtrar', lambda: percentis.filtrar(**FILTROS_PADRAO), len(percentis))
+    for por in AGRUPAMENTOS.values():
+        registrar('percentis.tempo.' + '_'.join(por),
+                  lambda: percentis_por_grupo(percentis, 'Time_taken(min)', por, QUANTIS_TEMPO), len(percentis))
+    registrar('percentis.avaliacao.Weatherconditions',
+              lambda: percentis_por_grupo(percentis, 'Delivery_person_Ratings', ['Weatherconditions'],
+                                          QUANTIS_AVALIACAO), len(percentis))
+
+    # seleção vazia (nenhum trânsito marcado na sidebar): os gráficos e o mapa
+    # têm de sair sem linhas - uma exceção aqui é regressão
+    vazio = df1.iloc[:0]
+    for etapa, funcao in etapas_graficos(vazio, cubo.filtrar(Road_traffic_density=[])).items():
+        registrar('vazio.' + etapa, funcao, 0, repeticoes=1)
+    registrar('vazio.empresa.mapa_html', lambda: empresa.mapa_html(vazio), 0, repeticoes=1)
+
+    return resultados
+
+def versao_codigo():
+    """ Commit atual do repositório (ou None fora de um checkout git) """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(atual, anterior):
+    """ Imprime a razão de tempo (atual / anterior) de cada etapa presente nos dois arquivos """
+    base = {(r['tamanho'], r['etapa']): r['segundos'] for r in anterior['resultados']}
+    print('\n{:>12} {:<40} {:>10} {:>10} {:>8}'.format('tamanho', 'etapa', 'anterior', 'atual', 'razão'))
+    for r in atual['resultados']:
+        chave = (r['tamanho'], r['etapa'])
+        if chave in base and base[chave] > 0:
+            print('{:>12,} {:<40} {:>9.4f}s {:>9.4f}s {:>7.2f}x'.format(
+                r['tamanho'], r['etapa'], base[chave], r['segundos'], r['segundos'] / base[chave]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark headless do dashboard')
+    parser.add_argument('--tamanhos', nargs='+', type=float, default=TAMANHOS_PADRAO,
+                        help='números de linhas a gerar (aceita 1e6)')
+    parser.add_argument('--repeticoes', type=int, default=3, help='repetições por etapa (vale o menor tempo)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dias', type=int, default=60, help='dias de pedidos gerados')
+    parser.add_argument('--saida', default=None, help='arquivo JSON de resultados')
+    parser.add_argument('--comparar', default=None, help='JSON de uma execução anterior para comparação')
+    args = parser.parse_args(argv)
+
+    execucao = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': versao_codigo(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'maquina': platform.machine(),
+        'cpus': os.cpu_count(),
+        'dias': args.dias,
+        'resultados': [],
+    }
+    for tamanho in args.tamanhos:
+        execucao['resultados'] += rodar(int(tamanho), args.repeticoes, args.seed, args.dias)
+
+    saida = args.saida or 'benchmarks/resultados/{}_{}.json'.format(
+        datetime.now().strftime('%Y%m%d_%H%M%S'), execucao['commit'] or 'local')
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w') as arquivo:
+        json.dump(execucao, arquivo, indent=2)
+    print('\nresultados gravados em {}'.format(saida))
+
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            comparar(execucao, json.load(arquivo))
+
+if __name__ == '__main__':
+    main()
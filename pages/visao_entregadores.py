@@ -1,97 +1,43 @@
 # ----------------------------------------
 # Importação de bibliotecas
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
 import math
-from datetime import datetime, date
-from PIL import Image
+
+from utils.dados import load_backend, load_espacial, load_percentis, versao_dados
+from utils.aproximado import ESTRATOS, FRACAO_AMOSTRA
+from utils.entregadores import (COLUNAS, KPIS, avaliacao_aproximada, avaliacao_clima, avaliacao_entregador,
+                                avaliacao_transito, top_delivers)
+from utils.exportar import Artefatos, artefatos_exportados
+from utils.kpi import calcular_kpis
+from utils.percentis import (AGRUPAMENTOS, QUANTIS_AVALIACAO, PercentisGrupos, grafico_percentis,
+                             percentis_por_grupo)
+from utils.profiling import etapa, iniciar, medir, painel, plotar
+from utils.sidebar import filtro_raio, modo_aproximado, sidebar
+from utils.tabela import tabela_paginada
 
 st.set_page_config( page_title='Visão Entregadores', page_icon='🛵', layout='wide')
+iniciar('visao_entregadores')
 
 # ----------------------------------------
 # Funções
-def clean_code(df1):
-    """ Esta função tem a responsabilidade de limpar o dataframe
-    
-        Tipos de limpeza:
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Remoção dos espaços das variáveis de texto
-        4. Formataçã das colunas de datas
-        5. Limpeza da coluna de tempo - remoção do texto da variável numérica
-        
-        Input: dataframe
-        Output: dataframe
-    """
-    df1['ID'] = df1.loc[:,'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1.loc[:,'Delivery_person_ID'].str.strip()
-    df1['Delivery_person_Age'] = df1.loc[:,'Delivery_person_Age'].str.strip()
-    df1['Delivery_person_Ratings'] = df1.loc[:,'Delivery_person_Ratings'].str.strip()
-    df1['multiple_deliveries'] = df1.loc[:,'multiple_deliveries'].str.strip()
-    df1['Type_of_order'] = df1.loc[:,'Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1.loc[:,'Type_of_vehicle'].str.strip()
-    df1['City'] = df1.loc[:,'City'].str.strip()
-    df1['Festival'] = df1.loc[:,'Festival'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:,'Road_traffic_density'].str.strip()
-
-    df1 = df1.loc[df1['Road_traffic_density'] != 'NaN']
-
-    df1 = df1.loc[df1['Delivery_person_Age'] != 'NaN']
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype('int64')
-
-    df1 = df1.loc[df1['Delivery_person_Ratings'] != 'NaN']
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype('float64')
-
-    df1 = df1.loc[df1['City'] != 'NaN']
-    df1['City'] = df1['City'].astype(str)
-
-    df1 = df1.loc[df1['Festival'] != 'NaN']
-    df1['Festival'] = df1['Festival'].astype(str)
-
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format='%d-%m-%Y')
-
-    df1 = df1.loc[df1['multiple_deliveries'] != 'NaN']
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype('int64')
-
-    df1 = df1.reset_index(drop=True)
-
-    df1['Time_taken(min)'] =  df1['Time_taken(min)'].apply(lambda x: x.split('(min) ')[1]).astype(int)
-
-    return df1
-
 vazio_zero = lambda x: 0 if math.isnan(x) else x
 
-def top_delivers(df1,top_asc):
-
-    df_6 = ( df1.loc[:,['Delivery_person_ID','City','Time_taken(min)']]
-            .groupby(['City','Delivery_person_ID']).mean()
-            .sort_values(['City','Time_taken(min)'],ascending=top_asc).reset_index() )
-
-    cidades = list(df_6.City.unique())
-
-    if len(cidades) == 0:
-        col1.markdown('No Data')
-
-    else:
-        df_aux01 = df_6.loc[df_6['City'] == cidades[0],:].head(10)
-        df_aux02 = df_6.loc[df_6['City'] == cidades[1],:].head(10)
-        df_aux03 = df_6.loc[df_6['City'] == cidades[2],:].head(10)
-        df_6 = pd.concat( [df_aux01, df_aux02, df_aux03]).reset_index(drop=True)
+@st.cache_data(show_spinner=False, max_entries=16)
+def avaliacao_entregador_filtros(filtros, raio, versao):
+    """ Avaliação média por entregador para um conjunto de filtros, em cache:
+        trocar de página, busca ou ordenação da tabela não reagrega
 
-    return df_6
+        Input: filtros da sidebar, raio (filtro_raio), versão dos dados (invalida o cache)
+        Output: dataframe com uma linha por entregador
+    """
+    return avaliacao_entregador(load_backend(COLUNAS).filtrar(**filtros, raio=raio))
 
 # --------------------------------- Início da estrutura lógica do código ---------------------------
 # ----------------------------------------
-# Importação do dataset
+# Importação e limpeza do dataset (em cache, compartilhado entre as páginas)
 # ----------------------------------------
-df = pd.read_csv('dataset/train.csv')
-
-# ----------------------------------------
-# Limpeza dos dados
-# ----------------------------------------
-df1 = clean_code(df)
+with etapa('load_backend'):
+    backend = load_backend(COLUNAS)
 
 # ---------- Visão Entregadores ----------
 
@@ -99,43 +45,31 @@ df1 = clean_code(df)
 # Sidebar
 # ----------------------------------------
 
-#image_path='C:/Users/Phelipe Pachler/Documents/REPOS/ftc_python_analise_dados/notebooks/'
-image = Image.open('logo.png')
-st.sidebar.image(image, width=300)
-
-st.sidebar.markdown('# Pachler Company')
-st.sidebar.markdown('## Fastest Delivery in Town')
-st.sidebar.markdown('---')
-st.sidebar.markdown('## Selecione uma data limite')
-
-min_date = df1['Order_Date'].min().date()
-max_date = df1['Order_Date'].max().date()
-
-date_slider = st.sidebar.slider(
-    'Até qual data?', value=date(2022,4,13),
-    min_value=min_date,
-    max_value=max_date,
-    format='DD/MM/YYYY')
-
-#st.header(date_slider)
-st.sidebar.markdown('---')
-
-traffic_options = st.sidebar.multiselect(
-    'Quais as condições do trânsito?',
-    list(df1['Road_traffic_density'].unique()),
-    default=list(df1['Road_traffic_density'].unique()))
-
-st.sidebar.markdown('---')
-st.sidebar.markdown('### Powered by Comunidade DS')
-
-# filtro de data
-linhas_selecionadas = df1['Order_Date'].apply(lambda x: x.date()) < date_slider
-
-df1 = df1.loc[linhas_selecionadas,:]
-
-# filtro de trânsito
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas,:]
+filtros = sidebar(backend, restaurantes=lambda: load_espacial().restaurantes)
+raio = filtro_raio()
+# os presets exportados não têm filtro por raio
+artefatos = artefatos_exportados('entregadores', filtros, versao_dados()) if raio is None else Artefatos()
+
+# filtros de data e trânsito (e raio, pelo índice espacial)
+with etapa('filtro'):
+    fonte = backend.filtrar(**filtros, raio=raio)
+
+# percentis das avaliações pelos t-digests montados na carga (com raio, das linhas dentro do raio)
+if raio is None:
+    with etapa('load_percentis') as registro:
+        percentis_grupos = load_percentis().filtrar(**filtros)
+        registro['linhas'] = len(percentis_grupos)
+else:
+    with etapa('percentis do raio') as registro:
+        percentis_grupos = PercentisGrupos.from_fonte(fonte, ['Delivery_person_Ratings'])
+        registro['linhas'] = len(percentis_grupos)
+
+# modo aproximado: médias e desvios das avaliações por amostra estratificada
+aproximado = modo_aproximado()
+if aproximado:
+    with etapa('amostra') as registro:
+        amostra = fonte.amostrar(FRACAO_AMOSTRA, ESTRATOS)
+        registro['linhas'] = len(amostra)
 
 # ----------------------------------------
 # Layout Dashboard
@@ -147,26 +81,10 @@ with st.container():
     st.title('Overall Metrics')
 
     col1,col2,col3,col4 = st.columns(4,gap='large')
+    kpis = artefatos.obter('kpis', calcular_kpis, fonte, KPIS)
 
-    with col1:
-        mais_velho = df1.loc[:,'Delivery_person_Age'].max()
-        mais_velho = vazio_zero(mais_velho)
-        col1.metric('Mais Velho', mais_velho)
-
-    with col2:
-        mais_novo = df1.loc[:,'Delivery_person_Age'].min()
-        mais_novo = vazio_zero(mais_novo)
-        col2.metric('Mais Novo', mais_novo)
-
-    with col3:
-        melhor_cond = df1.loc[:,'Vehicle_condition'].max()
-        melhor_cond = vazio_zero(melhor_cond)
-        col3.metric('Melhor Condição',melhor_cond)
-
-    with col4:
-        pior_cond = df1.loc[:,'Vehicle_condition'].min()
-        pior_cond = vazio_zero(pior_cond)
-        col4.metric('Pior Condição',pior_cond)
+    for col, kpi in zip([col1,col2,col3,col4], KPIS):
+        col.metric(kpi.nome, vazio_zero(kpis[kpi.nome]))
 
 with st.container():
     st.markdown('---')
@@ -176,26 +94,39 @@ with st.container():
 
     with col1:
         st.subheader('Avaliação Média por Entregador')
-        df_3 = df1.loc[:,['Delivery_person_ID','Delivery_person_Ratings']].groupby('Delivery_person_ID').mean().reset_index()
-        st.dataframe(df_3)
+        df_3 = artefatos.obter('avaliacao_entregador', avaliacao_entregador_filtros, filtros, raio,
+                               versao_dados())
+        medir('render avaliacao_entregador', tabela_paginada, df_3, 'tabela_entregador',
+              coluna_busca='Delivery_person_ID')
 
     with col2:
         st.subheader('Avaliação Média por Trânsito')
-        df_4 = ( df1.loc[:, ['Delivery_person_Ratings','Road_traffic_density']]
-                .groupby('Road_traffic_density')
-                .agg({'Delivery_person_Ratings':['mean','std']}).reset_index() )
-
-        df_4.columns = ['Road_traffic_density','delivery_mean','delivery_std']
-
-        st.dataframe(df_4)
+        if aproximado:
+            df_4 = medir('avaliacao_transito aproximada', avaliacao_aproximada, amostra, 'Road_traffic_density')
+        else:
+            df_4 = artefatos.obter('avaliacao_transito', avaliacao_transito, fonte)
+        medir('render avaliacao_transito', st.dataframe, df_4)
 
         st.subheader('Avaliação Média por Clima')
-        df_5 = ( df1.loc[:, ['Delivery_person_Ratings','Weatherconditions']].groupby('Weatherconditions')
-                .agg({'Delivery_person_Ratings':['mean','std']}).reset_index() )
+        if aproximado:
+            df_5 = medir('avaliacao_clima aproximada', avaliacao_aproximada, amostra, 'Weatherconditions')
+        else:
+            df_5 = artefatos.obter('avaliacao_clima', avaliacao_clima, fonte)
+        medir('render avaliacao_clima', st.dataframe, df_5)
 
-        df_5.columns = ['Weatherconditions','delivery_mean','delivery_std']
+with st.container():
+    st.markdown('---')
+    st.title('Percentis das Avaliações')
+    agrupamento = st.radio('Agrupar por', list(AGRUPAMENTOS), horizontal=True, key='percentis_avaliacao_por')
+    df_percentis = medir('percentis_por_grupo', percentis_por_grupo, percentis_grupos, 'Delivery_person_Ratings',
+                         AGRUPAMENTOS[agrupamento], QUANTIS_AVALIACAO)
 
-        st.dataframe(df_5)
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        fig = grafico_percentis(df_percentis, AGRUPAMENTOS[agrupamento], QUANTIS_AVALIACAO, 'Avaliação')
+        plotar('percentis_avaliacao', fig, use_container_width=True)
+    with col2:
+        medir('render percentis_avaliacao', st.dataframe, df_percentis, hide_index=True)
 
 with st.container():
     st.markdown('---')
@@ -203,14 +134,22 @@ with st.container():
 
     col1, col2 = st.columns(2)
 
+    fast_delivers, slow_delivers = artefatos.obter('top_delivers', top_delivers, fonte)
+
     with col1:
-        fast_delivers = top_delivers(df1,True)
         st.subheader('Top Entregadores Mais Rápidos')
-        st.dataframe(fast_delivers)
+        if len(fast_delivers) == 0:
+            st.markdown('No Data')
+        else:
+            medir('render top_delivers rápidos', st.dataframe, fast_delivers)
 
     with col2:
-        slow_delivers = top_delivers(df1,False)
         st.subheader('Top Entregadores Mais Lentos')
-        st.dataframe(slow_delivers)
+        if len(slow_delivers) == 0:
+            st.markdown('No Data')
+        else:
+            medir('render top_delivers lentos', st.dataframe, slow_delivers)
 
     st.markdown('---')
+
+painel()
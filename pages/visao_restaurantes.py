@@ -1,144 +1,28 @@
 # ----------------------------------------
 # Importação de bibliotecas
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-import numpy as np
-from haversine import haversine
-from datetime import datetime, date
-from PIL import Image
 
-st.set_page_config( page_title='Visão Restaurantes', page_icon='👩‍🍳', layout='wide')
+from utils.aproximado import ESTRATOS, FRACAO_AMOSTRA, formatar
+from utils.cubo import Cubo
+from utils.dados import load_backend, load_cube, load_esbocos, load_espacial, load_percentis, versao_dados
+from utils.exportar import Artefatos, artefatos_exportados
+from utils.kpi import calcular_kpis, calcular_kpis_aproximados
+from utils.percentis import AGRUPAMENTOS, QUANTIS_TEMPO, PercentisGrupos, grafico_percentis, percentis_por_grupo
+from utils.profiling import etapa, iniciar, medir, painel, plotar
+from utils.restaurantes import (COLUNAS, KPIS, avg_std_cidade_trafego, distribuicao_distancia, grafico_faixas,
+                                percentis_tempo, tempo_cidade_desvio, tempo_cidade_media, tempo_por_faixa)
+from utils.sidebar import filtro_raio, modo_aproximado, sidebar
+from utils.tabela import tabela_paginada
 
-# ----------------------------------------
-# Funções
-def clean_code(df1):
-    """ Esta função tem a responsabilidade de limpar o dataframe
-    
-        Tipos de limpeza:
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Remoção dos espaços das variáveis de texto
-        4. Formataçã das colunas de datas
-        5. Limpeza da coluna de tempo - remoção do texto da variável numérica
-        
-        Input: dataframe
-        Output: dataframe
-    """
-    df1['ID'] = df1.loc[:,'ID'].str.strip()
-    df1['Delivery_person_ID'] = df1.loc[:,'Delivery_person_ID'].str.strip()
-    df1['Delivery_person_Age'] = df1.loc[:,'Delivery_person_Age'].str.strip()
-    df1['Delivery_person_Ratings'] = df1.loc[:,'Delivery_person_Ratings'].str.strip()
-    df1['multiple_deliveries'] = df1.loc[:,'multiple_deliveries'].str.strip()
-    df1['Type_of_order'] = df1.loc[:,'Type_of_order'].str.strip()
-    df1['Type_of_vehicle'] = df1.loc[:,'Type_of_vehicle'].str.strip()
-    df1['City'] = df1.loc[:,'City'].str.strip()
-    df1['Festival'] = df1.loc[:,'Festival'].str.strip()
-    df1['Road_traffic_density'] = df1.loc[:,'Road_traffic_density'].str.strip()
-
-    df1 = df1.loc[df1['Road_traffic_density'] != 'NaN']
-
-    df1 = df1.loc[df1['Delivery_person_Age'] != 'NaN']
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype('int64')
-
-    df1 = df1.loc[df1['Delivery_person_Ratings'] != 'NaN']
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype('float64')
-
-    df1 = df1.loc[df1['City'] != 'NaN']
-    df1['City'] = df1['City'].astype(str)
-
-    df1 = df1.loc[df1['Festival'] != 'NaN']
-    df1['Festival'] = df1['Festival'].astype(str)
-
-    df1['Order_Date'] = pd.to_datetime(df1['Order_Date'], format='%d-%m-%Y')
-
-    df1 = df1.loc[df1['multiple_deliveries'] != 'NaN']
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype('int64')
-
-    df1 = df1.reset_index(drop=True)
-
-    df1['Time_taken(min)'] =  df1['Time_taken(min)'].apply(lambda x: x.split('(min) ')[1]).astype(int)
-
-    return df1
-
-def mean_distance(df1):
-
-    cols = ['Restaurant_latitude','Restaurant_longitude','Delivery_location_latitude','Delivery_location_longitude']
-    df1['distance'] = df1.loc[:,cols].apply(lambda x: 
-                                            haversine( (x['Restaurant_latitude'], x['Restaurant_longitude']),
-                                                      (x['Delivery_location_latitude'], x['Delivery_location_longitude']))
-                                            , axis=1)
-    distance = np.round(df1['distance'].mean(),2)
-
-    return distance
-
-def avg_std_festivais(df1,parametro,festival):
-
-    cols = ['Time_taken(min)','Festival']
-    df_6 = df1.loc[:,cols].groupby('Festival').agg({'Time_taken(min)':['mean','std']})
-    df_6.columns = ['avg_time','std_time']
-    df_6 = df_6.reset_index()
-    df_6 = df_6.loc[df_6['Festival'] == festival,:]
-    avg_time = np.round(df_6['avg_time'],2)
-    std_time = np.round(df_6['std_time'],2)
-
-    if parametro == 'std':
-        return std_time
-    elif parametro == 'avg':
-        return avg_time
-    
-def tempo_cidade_media(df1):
-    cols = ['Restaurant_latitude','Restaurant_longitude','Delivery_location_latitude','Delivery_location_longitude']
-    df1['distance'] = df1.loc[:,cols].apply(lambda x: haversine((x['Restaurant_latitude'],x['Restaurant_longitude']),
-                                                        (x['Delivery_location_latitude'],x['Delivery_location_longitude'])),axis=1)
-    df1['distance'].mean()
-    avg_distance = df1.loc[:,['City','distance']].groupby('City').mean().reset_index()
-    fig = go.Figure( data=[go.Pie(labels=avg_distance['City'], values=avg_distance['distance'], pull=[0,0.15,0])])
-
-    return fig
-
-def tempo_cidade_desvio(df1):
-    cols = ['City','Time_taken(min)']
-    df_3 = df1.loc[:,cols].groupby('City').agg({'Time_taken(min)':['mean','std']})
-    df_3.columns = ['avg_time','std_time']
-    df_3 = df_3.reset_index()
-
-    fig = go.Figure()
-    fig.add_trace( go.Bar( name='Control',x=df_3['City'],y=df_3['avg_time'],error_y=dict( type='data', array=df_3['std_time'])))
-    fig.update_layout(barmode='group')
-
-    return fig
-
-def avg_std_cidade_trafego(df1):
-    cols = ['City','Time_taken(min)','Road_traffic_density']
-    df_5 = df1.loc[:,cols].groupby(['City','Road_traffic_density']).agg({'Time_taken(min)':['mean','std']})
-    df_5.columns = ['avg_time','std_time']
-    df_5 = df_5.reset_index()
-    fig = px.sunburst(df_5, path=['City', 'Road_traffic_density'], values='avg_time',
-          color='std_time', color_continuous_scale='RdBu',
-          color_continuous_midpoint=np.average(df_5['std_time']) )
-
-    return fig
-
-def distribuicao_distancia(df1):
-    cols = ['City','Time_taken(min)','Type_of_order']
-    df_4 = df1.loc[:,cols].groupby(['City','Type_of_order']).agg({'Time_taken(min)':['mean','std']})
-    df_4.columns = ['avg_time','std_time']
-    df_4 = df_4.reset_index()
-    
-    return df_4
+st.set_page_config( page_title='Visão Restaurantes', page_icon='👩‍🍳', layout='wide')
+iniciar('visao_restaurantes')
 
 # --------------------------------- Início da estrutura lógica do código ---------------------------
 # ----------------------------------------
-# Importação do dataset
+# Importação e limpeza do dataset (em cache, compartilhado entre as páginas)
 # ----------------------------------------
-df = pd.read_csv('dataset/train.csv')
-
-# ----------------------------------------
-# Limpeza dos dados
-# ----------------------------------------
-df1 = clean_code(df)
+with etapa('load_backend'):
+    backend = load_backend(COLUNAS)
 
 # ---------- Visão Entregadores ----------
 
@@ -146,43 +30,45 @@ df1 = clean_code(df)
 # Sidebar
 # ----------------------------------------
 
-#image_path='C:/Users/Phelipe Pachler/Documents/REPOS/ftc_python_analise_dados/notebooks/'
-image = Image.open('logo.png')
-st.sidebar.image(image, width=300)
-
-st.sidebar.markdown('# Pachler Company')
-st.sidebar.markdown('## Fastest Delivery in Town')
-st.sidebar.markdown('---')
-st.sidebar.markdown('## Selecione uma data limite')
-
-min_date = df1['Order_Date'].min().date()
-max_date = df1['Order_Date'].max().date()
-
-date_slider = st.sidebar.slider(
-    'Até qual data?', value=date(2022,4,13),
-    min_value=min_date,
-    max_value=max_date,
-    format='DD/MM/YYYY')
-
-#st.header(date_slider)
-st.sidebar.markdown('---')
-
-traffic_options = st.sidebar.multiselect(
-    'Quais as condições do trânsito?',
-    list(df1['Road_traffic_density'].unique()),
-    default=list(df1['Road_traffic_density'].unique()))
-
-st.sidebar.markdown('---')
-st.sidebar.markdown('### Powered by Comunidade DS')
-
-# filtro de data
-linhas_selecionadas = df1['Order_Date'].apply(lambda x: x.date()) < date_slider
-
-df1 = df1.loc[linhas_selecionadas,:]
-
-# filtro de trânsito
-linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-df1 = df1.loc[linhas_selecionadas,:]
+filtros = sidebar(backend, restaurantes=lambda: load_espacial().restaurantes)
+raio = filtro_raio()
+# os presets exportados não têm filtro por raio
+artefatos = artefatos_exportados('restaurantes', filtros, versao_dados()) if raio is None else Artefatos()
+
+# filtros de data e trânsito (e raio, pelo índice espacial)
+with etapa('filtro'):
+    fonte = backend.filtrar(**filtros, raio=raio)
+
+# o cubo não guarda coordenadas: com raio ele é montado só das linhas dentro do raio
+if raio is None:
+    with etapa('load_cube') as registro:
+        cubo = load_cube().filtrar(**filtros)
+        registro['linhas'] = len(cubo)
+else:
+    with etapa('cubo do raio') as registro:
+        cubo = Cubo.from_fonte(fonte)
+        registro['linhas'] = len(cubo)
+
+# percentis por grupo: t-digests por dia x trânsito x cidade x clima, montados na carga
+# (como o cubo, com raio eles são montados das linhas dentro do raio)
+if raio is None:
+    with etapa('load_percentis') as registro:
+        percentis_grupos = load_percentis().filtrar(**filtros)
+        registro['linhas'] = len(percentis_grupos)
+else:
+    with etapa('percentis do raio') as registro:
+        percentis_grupos = PercentisGrupos.from_fonte(fonte, ['Time_taken(min)'])
+        registro['linhas'] = len(percentis_grupos)
+
+# modo aproximado: KPIs pela amostra estratificada e pelos esboços (HLL e t-digest);
+# os esboços não têm coordenadas, então com raio os KPIs são exatos
+aproximado = modo_aproximado() and raio is None
+if aproximado:
+    with etapa('load_esbocos'):
+        esbocos = load_esbocos().filtrar(**filtros)
+    with etapa('amostra') as registro:
+        amostra = fonte.amostrar(FRACAO_AMOSTRA, ESTRATOS)
+        registro['linhas'] = len(amostra)
 
 # ----------------------------------------
 # Layout Dashboard
@@ -194,25 +80,20 @@ with st.container():
     st.title('Overall Metrics')
 
     col1,col2,col3,col4,col5,col6 = st.columns(6)
+    if aproximado:
+        kpis = medir('kpis aproximados', calcular_kpis_aproximados, amostra, esbocos, KPIS)
 
-    with col1:
-        delivery_unique = df1.loc[:,'Delivery_person_ID'].nunique()
-        col1.metric('Entregadores',delivery_unique)
-
-    with col2:            
-        col2.metric('Distância Média', mean_distance(df1))
+        for col, kpi in zip([col1,col2,col3,col4,col5,col6], KPIS):
+            col.metric(kpi.nome, formatar(*kpis[kpi.nome]))
 
-    with col3:            
-        col3.metric('Tempo Festivais',avg_std_festivais(df1,parametro='avg',festival='Yes'))
+        percentis = medir('percentis_tempo', percentis_tempo, esbocos)
+        for col, (nome, (valor, erro)) in zip(st.columns(6), percentis.items()):
+            col.metric(nome, formatar(valor, erro))
+    else:
+        kpis = artefatos.obter('kpis', calcular_kpis, fonte, KPIS)
 
-    with col4:
-        col4.metric('Desvio Festivais',avg_std_festivais(df1,'std','Yes'))
-
-    with col5:
-        col5.metric('Tempo S/ Festivais',avg_std_festivais(df1,'avg','No'))
-
-    with col6:
-        col6.metric('Desvio S/ Festivais',avg_std_festivais(df1,'std','No'))
+        for col, kpi in zip([col1,col2,col3,col4,col5,col6], KPIS):
+            col.metric(kpi.nome, kpis[kpi.nome])
 
 with st.container():
     st.markdown('---')
@@ -221,23 +102,57 @@ with st.container():
     col1,col2 = st.columns(2,gap='large')
 
     with col1:
-        fig = tempo_cidade_media(df1)
+        fig = artefatos.obter('tempo_cidade_media', tempo_cidade_media, cubo)
         st.markdown('#### Média')        
-        st.plotly_chart(fig)
+        plotar('tempo_cidade_media', fig)
 
     with col2:
-        fig = tempo_cidade_desvio(df1)
+        fig = artefatos.obter('tempo_cidade_desvio', tempo_cidade_desvio, cubo)
         st.markdown('#### Desvio Padrão')        
-        st.plotly_chart(fig)
+        plotar('tempo_cidade_desvio', fig)
 
 with st.container():
     st.markdown('---')
-    fig = avg_std_cidade_trafego(df1)
+    fig = artefatos.obter('avg_std_cidade_trafego', avg_std_cidade_trafego, cubo)
     st.title('AVG e STD de Entrega por Cidade e Tipo de Tráfego')
-    st.plotly_chart(fig) 
+    plotar('avg_std_cidade_trafego', fig)
+
+with st.container():
+    st.markdown('---')
+    st.title('Percentis do Tempo de Entrega')
+    agrupamento = st.radio('Agrupar por', list(AGRUPAMENTOS), horizontal=True, key='percentis_tempo_por')
+    df_percentis = medir('percentis_por_grupo', percentis_por_grupo, percentis_grupos, 'Time_taken(min)',
+                         AGRUPAMENTOS[agrupamento], QUANTIS_TEMPO)
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        fig = grafico_percentis(df_percentis, AGRUPAMENTOS[agrupamento], QUANTIS_TEMPO, 'Tempo de entrega (min)')
+        plotar('percentis_tempo', fig, use_container_width=True)
+    with col2:
+        medir('render percentis_tempo', st.dataframe, df_percentis, hide_index=True)
 
 with st.container():
-    df_4 = distribuicao_distancia(df1)
+    df_4 = artefatos.obter('distribuicao_distancia', distribuicao_distancia, cubo)
     st.markdown('---')
     st.title('Distribuição da Distância')
-    st.dataframe(df_4)
+    medir('render distribuicao_distancia', tabela_paginada, df_4, 'tabela_distancia')
+
+with st.container():
+    st.markdown('---')
+    st.title('Tempo de Entrega por Faixa de Distância')
+    df_faixas = artefatos.obter('tempo_por_faixa', tempo_por_faixa, fonte)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        plotar('tempo_por_faixa', grafico_faixas(df_faixas), use_container_width=True)
+    with col2:
+        medir('render tempo_por_faixa', st.dataframe, df_faixas, hide_index=True)
+
+if raio is not None:
+    with st.container():
+        st.markdown('---')
+        st.title('Restaurantes Mais Próximos do Centro')
+        df_proximos = medir('restaurantes_proximos', load_espacial().restaurantes_proximos, raio['lat'], raio['lon'])
+        medir('render restaurantes_proximos', st.dataframe, df_proximos, hide_index=True)
+
+painel()
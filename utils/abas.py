@@ -0,0 +1,20 @@
+# ----------------------------------------
+# Abas preguiçosas
+#
+# No st.tabs o corpo de todas as abas roda a cada rerun, mesmo as que não estão
+# visíveis. Aqui a aba ativa é escolhida por um seletor horizontal e a página
+# executa apenas o corpo da aba escolhida; as demais nem são calculadas.
+import streamlit as st
+
+# ----------------------------------------
+# Funções
+def aba_ativa(abas, key):
+    """ Desenha o seletor de abas e devolve o nome da aba ativa.
+
+        A escolha fica guardada no session_state (key), então continua a mesma
+        quando os filtros da sidebar mudam.
+
+        Input: lista com os nomes das abas, chave única do widget
+        Output: nome da aba ativa
+    """
+    return st.radio('Aba', abas, horizontal=True, key=key, label_visibility='collapsed')
@@ -0,0 +1,388 @@
+# ----------------------------------------
+# Modo aproximado: esboços (sketches) e amostragem estratificada
+#
+# Para períodos longos uma resposta aproximada e instantânea vale mais que a
+# exata. Cada número exibido nesse modo vem com a sua margem de erro:
+#
+# - entregadores distintos: HyperLogLog, um por dia x Road_traffic_density,
+#   juntados (máximo registro a registro) para qualquer período e agrupamento;
+#   erro relativo de 1.04 / sqrt(2 ** PRECISAO_HLL)
+# - percentis do tempo de entrega: t-digest, também por dia x trânsito; o erro
+#   é a distância até os centróides vizinhos do percentil
+# - médias e desvios: calculados sobre uma amostra estratificada das linhas
+#   filtradas (fonte.amostrar), com intervalo de confiança de 95%
+#
+# Os esboços são montados uma vez por processo (dados.load_esbocos) e
+# filtrados como o cubo, pelas mesmas chaves da sidebar.
+#
+# As funções de t-digest por chave (digests_por_chave, fatiar_digests,
+# quantis_por_grupo) também montam os percentis por grupo de utils.percentis.
+import numpy as np
+import pandas as pd
+
+from utils.cubo import DERIVADAS, ENTREGADOR, fatia_de_datas
+
+# chave dos esboços: as dimensões filtradas pela sidebar
+CHAVES = ['Order_Date', 'Road_traffic_density']
+MEDIDA_PERCENTIS = 'Time_taken(min)'
+
+# 2 ** PRECISAO_HLL registros por chave (12 -> 4 KB por chave, erro de 1.6%)
+PRECISAO_HLL = 12
+# compressão do t-digest: no máximo ~COMPRESSAO / 2 centróides por digest
+COMPRESSAO = 200
+
+# amostra estratificada por dia x trânsito e o z do intervalo de confiança de 95%
+FRACAO_AMOSTRA = 0.05
+ESTRATOS = ['Order_Date', 'Road_traffic_density']
+Z = 1.96
+
+# ----------------------------------------
+# Classes
+class TDigest:
+    """ Centróides (média, peso) ordenados de uma distribuição, mais o mínimo e o máximo """
+
+    def __init__(self, medias, pesos, minimo, maximo):
+        self.medias = medias
+        self.pesos = pesos
+        self.minimo = minimo
+        self.maximo = maximo
+
+    def __len__(self):
+        return len(self.medias)
+
+    @classmethod
+    def from_valores(cls, valores, pesos=None, compressao=COMPRESSAO):
+        """ Digest de um conjunto de valores (pesos = repetições de cada valor)
+
+            Input: array de valores, array de pesos opcional, compressão
+            Output: TDigest
+        """
+        valores = np.asarray(valores, dtype='float64')
+        pesos = np.ones(len(valores)) if pesos is None else np.asarray(pesos, dtype='float64')
+        ordem = np.argsort(valores, kind='stable')
+        _, medias, pesos = _comprimir(np.zeros(len(valores), dtype='int64'), valores[ordem], pesos[ordem],
+                                      compressao)
+
+        return cls(medias, pesos, valores.min(initial=np.inf), valores.max(initial=-np.inf))
+
+    @classmethod
+    def juntar(cls, digests, compressao=COMPRESSAO):
+        """ Junta digests parciais (ex.: de dias diferentes) em um só """
+        medias = np.concatenate([digest.medias for digest in digests])
+        pesos = np.concatenate([digest.pesos for digest in digests])
+        digest = cls.from_valores(medias, pesos, compressao)
+        digest.minimo = min(digest.minimo for digest in digests)
+        digest.maximo = max(digest.maximo for digest in digests)
+
+        return digest
+
+    def quantil(self, q):
+        """ Quantil q (0 a 1), interpolado entre os centróides
+
+            Input: q
+            Output: (valor, erro) - o valor exato está a no máximo 'erro' do
+                    estimado, entre os centróides vizinhos (NaN sem dados)
+        """
+        if len(self.medias) == 0:
+            return np.nan, np.nan
+
+        total = self.pesos.sum()
+        posicoes = np.concatenate([[0], np.cumsum(self.pesos) - self.pesos / 2, [total]])
+        valores = np.concatenate([[self.minimo], self.medias, [self.maximo]])
+        alvo = q * total
+        valor = np.interp(alvo, posicoes, valores)
+
+        direita = min(max(np.searchsorted(posicoes, alvo, side='right'), 1), len(valores) - 1)
+
+        return valor, max(valor - valores[direita - 1], valores[direita] - valor)
+
+class Esbocos:
+    """ HyperLogLog de entregadores e t-digest do tempo de entrega por chave.
+
+        chaves: dataframe ordenado por CHAVES com CHAVES, DERIVADAS e 'n' (pedidos da chave)
+        registros: matriz uint8 (chave x 2 ** PRECISAO_HLL) do HyperLogLog
+        centroides: dataframe (chave, media, peso) com os t-digests, ordenado
+                    por chave e média
+        extremos: dataframe (minimo, maximo) por chave
+    """
+
+    def __init__(self, chaves, registros, centroides, extremos):
+        for col, derivar in DERIVADAS.items():
+            if col not in chaves.columns:
+                chaves[col] = derivar(chaves)
+
+        self.chaves = chaves
+        self.registros = registros
+        self.centroides = centroides
+        self.extremos = extremos
+
+    def __len__(self):
+        return len(self.chaves)
+
+    @classmethod
+    def from_fonte(cls, fonte, precisao=PRECISAO_HLL, compressao=COMPRESSAO):
+        """ Monta os esboços com duas agregações da fonte (utils.backend): os
+            pares chave/entregador distintos e a contagem de cada tempo de
+            entrega por chave - nenhuma das duas traz as linhas para a memória.
+
+            Input: fonte de utils.backend, precisão do HLL, compressão do t-digest
+            Output: Esbocos
+        """
+        df_tempos = fonte.agregar(CHAVES + [MEDIDA_PERCENTIS], {'n': (MEDIDA_PERCENTIS, 'size')})
+        grupos = df_tempos.groupby(CHAVES, observed=True, sort=True)
+        chaves = grupos['n'].sum().sort_index().reset_index()
+        indice = pd.MultiIndex.from_frame(chaves[CHAVES])
+
+        chave = indice.get_indexer(pd.MultiIndex.from_frame(df_tempos[CHAVES]))
+        centroides, extremos = digests_por_chave(chave, df_tempos[MEDIDA_PERCENTIS], df_tempos['n'], len(chaves),
+                                                 compressao)
+
+        df_pares = fonte.agregar(CHAVES + [ENTREGADOR], {'n': (ENTREGADOR, 'size')})
+        chave = indice.get_indexer(pd.MultiIndex.from_frame(df_pares[CHAVES]))
+        registros = registros_hll(chave, _hash(df_pares[ENTREGADOR]), len(chaves), precisao)
+
+        return cls(chaves, registros, centroides, extremos)
+
+    def filtrar(self, inicio=None, fim=None, **filtros):
+        """ Mantém só as chaves dentro do período [inicio, fim) e dos filtros
+            (mesmo contrato de Cubo.filtrar, restrito às colunas de CHAVES)
+        """
+        lo, hi = fatia_de_datas(self.chaves['Order_Date'], inicio, fim)
+        chaves = self.chaves.iloc[lo:hi]
+        mascara = np.ones(hi - lo, dtype=bool)
+        for col, escolhidos in filtros.items():
+            if col not in CHAVES:
+                raise ValueError('os esboços só filtram por {}, recebido {!r}'.format(CHAVES, col))
+            mascara &= chaves[col].isin(list(escolhidos)).to_numpy()
+
+        centroides, extremos = fatiar_digests(self.centroides, self.extremos, lo, hi, mascara)
+
+        return Esbocos(chaves.loc[mascara].reset_index(drop=True), self.registros[lo:hi][mascara],
+                       centroides, extremos)
+
+    def agrupar(self, por=()):
+        """ Pedidos e entregadores distintos estimados por grupo
+
+            Input: lista de colunas de CHAVES ou DERIVADAS (vazia = total geral)
+            Output: dataframe com 'por', 'n' (exato), 'Delivery_person_ID'
+                    (estimado pelo HyperLogLog) e 'Delivery_person_ID_erro' (95%)
+        """
+        grupo, df_aux = grupos_de_chaves(self.chaves, por)
+        ordem = np.argsort(grupo, kind='stable')
+        inicios = _inicios(grupo[ordem])
+
+        df_aux['n'] = np.add.reduceat(self.chaves['n'].to_numpy()[ordem], inicios) if len(ordem) else []
+        juntos = np.maximum.reduceat(self.registros[ordem], inicios, axis=0) if len(ordem) else self.registros
+        df_aux[ENTREGADOR] = estimar_hll(juntos)
+        df_aux[ENTREGADOR + '_erro'] = df_aux[ENTREGADOR] * Z * erro_hll(self.registros.shape[1])
+
+        return df_aux.reset_index(drop=True)
+
+    def quantis(self, quantis, por=()):
+        """ Percentis do tempo de entrega por grupo, juntando os t-digests das chaves
+
+            Input: lista de quantis (ex.: [0.5, 0.9]) e colunas de agrupamento
+            Output: dataframe com 'por' e, por quantil, 'p<nn>' e 'p<nn>_erro'
+        """
+        grupo, df_aux = grupos_de_chaves(self.chaves, por)
+
+        return quantis_por_grupo(grupo, df_aux, self.centroides, self.extremos, quantis)
+
+# ----------------------------------------
+# Funções
+def _inicios(ordenado):
+    """ Posições em que começa cada sequência de valores iguais de um array ordenado """
+    if len(ordenado) == 0:
+        return np.zeros(0, dtype='int64')
+
+    return np.flatnonzero(np.concatenate([[True], ordenado[1:] != ordenado[:-1]]))
+
+def _comprimir(grupo, medias, pesos, compressao):
+    """ Comprime centróides em t-digests, um por grupo, de uma só vez.
+
+        Cada centróide recebe a posição do seu centro na distribuição do grupo
+        (q de 0 a 1), convertida pela escala k = compressao / (2 pi) * asin(2q - 1);
+        centróides com a mesma parte inteira de k são somados. A escala dá
+        centróides pequenos nas caudas (percentis altos precisos) e grandes no meio.
+
+        Input: grupo, médias e pesos, ordenados por (grupo, média)
+        Output: (grupo, médias, pesos) dos centróides comprimidos
+    """
+    if len(medias) == 0:
+        return grupo, medias, pesos
+
+    inicios = _inicios(grupo)
+    total = np.add.reduceat(pesos, inicios)
+    tamanho = np.diff(np.append(inicios, len(pesos)))
+    acumulado = np.cumsum(pesos) - np.repeat(np.cumsum(pesos)[inicios] - pesos[inicios], tamanho)
+    q = (acumulado - pesos / 2) / np.repeat(total, tamanho)
+    k = np.floor(compressao / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)) + compressao)
+
+    balde = grupo.astype('int64') * (2 * compressao + 1) + k.astype('int64')
+    inicios = _inicios(balde)
+    soma = np.add.reduceat(pesos, inicios)
+
+    return grupo[inicios], np.add.reduceat(medias * pesos, inicios) / soma, soma
+
+def digests_por_chave(chave, valores, pesos, n_chaves, compressao=COMPRESSAO):
+    """ t-digests de uma medida, um por chave, a partir das contagens de cada valor
+
+        Input: chave (0 a n_chaves - 1) de cada valor distinto, valores, pesos
+               (repetições), número de chaves, compressão
+        Output: (centroides, extremos) - dataframe (chave, media, peso) ordenado
+                por chave e média, e dataframe (minimo, maximo) com uma linha
+                por chave (+inf/-inf nas chaves sem valores)
+    """
+    chave = np.asarray(chave, dtype='int64')
+    valores = np.asarray(valores, dtype='float64')
+    pesos = np.asarray(pesos, dtype='float64')
+    ordem = np.lexsort((valores, chave))
+    chave, valores, pesos = chave[ordem], valores[ordem], pesos[ordem]
+
+    chave_c, medias, pesos_c = _comprimir(chave, valores, pesos, compressao)
+    centroides = pd.DataFrame({'chave': chave_c, 'media': medias, 'peso': pesos_c})
+
+    minimo, maximo = np.full(n_chaves, np.inf), np.full(n_chaves, -np.inf)
+    inicios = _inicios(chave)
+    if len(inicios):
+        minimo[chave[inicios]] = np.minimum.reduceat(valores, inicios)
+        maximo[chave[inicios]] = np.maximum.reduceat(valores, inicios)
+
+    return centroides, pd.DataFrame({'minimo': minimo, 'maximo': maximo})
+
+def fatiar_digests(centroides, extremos, lo, hi, mascara):
+    """ Digests das chaves lo a hi - 1 marcadas na máscara, renumeradas a partir de 0
+
+        Input: centroides e extremos de digests_por_chave, fatia de chaves e
+               máscara booleana (tamanho hi - lo) das chaves mantidas
+        Output: (centroides, extremos) das chaves mantidas
+    """
+    chave = centroides['chave'].to_numpy()
+    centroides = centroides.iloc[np.searchsorted(chave, lo):np.searchsorted(chave, hi)]
+    novo_id = np.full(hi - lo, -1)
+    novo_id[mascara] = np.arange(mascara.sum())
+    centroides = centroides.loc[mascara[centroides['chave'].to_numpy() - lo]]
+    centroides = centroides.assign(chave=novo_id[centroides['chave'].to_numpy() - lo])
+
+    return centroides.reset_index(drop=True), extremos.iloc[lo:hi].loc[mascara].reset_index(drop=True)
+
+def grupos_de_chaves(chaves, por):
+    """ Grupo de cada chave para um agrupamento
+
+        Input: dataframe de chaves, colunas de agrupamento (vazia = total geral)
+        Output: (grupo de cada chave, dataframe com os rótulos de cada grupo, ordenados)
+    """
+    if not por:
+        return np.zeros(len(chaves), dtype='int64'), pd.DataFrame(index=[0] if len(chaves) else [])
+
+    grupos = chaves.groupby(list(por), observed=True, sort=True)
+    rotulos = grupos.size().sort_index().reset_index().loc[:, list(por)]
+    grupo = pd.MultiIndex.from_frame(rotulos).get_indexer(pd.MultiIndex.from_frame(chaves[list(por)]))
+
+    return grupo, rotulos
+
+def quantis_por_grupo(grupo, df_aux, centroides, extremos, quantis, compressao=COMPRESSAO):
+    """ Quantis por grupo juntando os t-digests das chaves de cada grupo.
+
+        Todos os grupos são comprimidos de uma vez (_comprimir); só o cálculo
+        do quantil, sobre poucos centróides, roda por grupo.
+
+        Input: grupo de cada chave (grupos_de_chaves), rótulos dos grupos,
+               centroides e extremos das chaves, lista de quantis, compressão
+        Output: rótulos com, por quantil, 'p<nn>' e 'p<nn>_erro'
+    """
+    n_grupos = len(df_aux)
+    grupo_c = grupo[centroides['chave'].to_numpy()]
+    medias = centroides['media'].to_numpy(dtype='float64')
+    ordem = np.lexsort((medias, grupo_c))
+    grupo_c, medias, pesos = _comprimir(grupo_c[ordem], medias[ordem],
+                                        centroides['peso'].to_numpy(dtype='float64')[ordem], compressao)
+
+    minimo, maximo = np.full(n_grupos, np.inf), np.full(n_grupos, -np.inf)
+    np.minimum.at(minimo, grupo, extremos['minimo'].to_numpy())
+    np.maximum.at(maximo, grupo, extremos['maximo'].to_numpy())
+
+    limites = np.searchsorted(grupo_c, np.arange(n_grupos + 1))
+    digests = [TDigest(medias[i:f], pesos[i:f], minimo[g], maximo[g])
+               for g, (i, f) in enumerate(zip(limites[:-1], limites[1:]))]
+
+    for q in quantis:
+        nome = 'p{:.0f}'.format(q * 100)
+        resultado = np.array([digest.quantil(q) for digest in digests], dtype='float64').reshape(-1, 2)
+        df_aux[nome] = resultado[:, 0]
+        df_aux[nome + '_erro'] = resultado[:, 1]
+
+    return df_aux.reset_index(drop=True)
+
+def _hash(serie):
+    """ Hash de 64 bits de cada valor (categorias são hasheadas uma única vez) """
+    serie = serie.astype('category')
+    hashes = pd.util.hash_array(serie.cat.categories.to_numpy(dtype=object))
+
+    return hashes[serie.cat.codes.to_numpy()]
+
+def registros_hll(grupo, hashes, n_grupos, precisao=PRECISAO_HLL):
+    """ Registros do HyperLogLog de cada grupo: os primeiros 'precisao' bits
+        do hash escolhem o registro, que guarda o maior número de zeros à
+        esquerda (+1) visto no resto do hash
+
+        Input: grupo de cada valor, hashes uint64, número de grupos, precisão
+        Output: matriz uint8 (n_grupos x 2 ** precisao)
+    """
+    hashes = np.asarray(hashes, dtype='uint64')
+    registro = (hashes >> np.uint64(64 - precisao)).astype('int64')
+    resto = hashes << np.uint64(precisao)
+
+    posto = np.full(len(hashes), 64 - precisao + 1, dtype='uint8')
+    nao_nulo = resto != 0
+    posto[nao_nulo] = 64 - np.floor(np.log2(resto[nao_nulo].astype('float64'))).astype('int64')
+    posto = np.minimum(posto, 64 - precisao + 1)
+
+    registros = np.zeros((n_grupos, 2 ** precisao), dtype='uint8')
+    np.maximum.at(registros, (np.asarray(grupo, dtype='int64'), registro), posto)
+
+    return registros
+
+def estimar_hll(registros):
+    """ Número de valores distintos de cada linha de registros do HyperLogLog,
+        com a correção de contagem linear para cardinalidades pequenas
+    """
+    m = registros.shape[1]
+    alfa = 0.7213 / (1 + 1.079 / m)
+    estimativa = alfa * m ** 2 / np.sum(2.0 ** -registros.astype('float64'), axis=1)
+
+    zeros = np.sum(registros == 0, axis=1)
+    pequena = (estimativa <= 2.5 * m) & (zeros > 0)
+    estimativa[pequena] = m * np.log(m / zeros[pequena])
+
+    return estimativa
+
+def erro_hll(m):
+    """ Erro relativo padrão do HyperLogLog com m registros """
+    return 1.04 / np.sqrt(m)
+
+def resumo_amostra(amostra, por, medida, fracao=FRACAO_AMOSTRA):
+    """ Média e desvio de uma medida estimados pela amostra estratificada,
+        com a margem de erro (95%) da média e do desvio
+
+        Input: fonte amostrada (fonte.amostrar), colunas de agrupamento, medida,
+               fração amostrada
+        Output: dataframe com 'por', 'n' (linhas da amostra), 'mean',
+                'mean_erro', 'std' e 'std_erro'
+    """
+    df_aux = amostra.agregar(por, {'n': (medida, 'count'), 'mean': (medida, 'mean'), 'std': (medida, 'std')})
+    n = df_aux['n'].astype('float64')
+    correcao = np.sqrt(1 - fracao)
+    df_aux.insert(df_aux.columns.get_loc('mean') + 1, 'mean_erro', Z * df_aux['std'] / np.sqrt(n) * correcao)
+    df_aux['std_erro'] = Z * df_aux['std'] / np.sqrt(2 * (n - 1).where(n > 1)) * correcao
+
+    return df_aux
+
+def formatar(valor, erro, casas=2):
+    """ Texto 'valor ± erro' de um número aproximado (inteiros sem casas decimais) """
+    if valor is None or np.isnan(valor):
+        return '-'
+    if isinstance(valor, int):
+        casas = 0
+
+    return '{:.{casas}f} ± {:.{casas}f}'.format(valor, erro, casas=casas)
@@ -0,0 +1,318 @@
+# ----------------------------------------
+# Backends de consulta: pandas (em memória) ou DuckDB (fora da memória)
+#
+# As funções dos gráficos descrevem filtros e agrupamentos uma única vez, por
+# meio de uma "fonte" já filtrada:
+#
+#   fonte = backend.filtrar(inicio=..., fim=..., Road_traffic_density=[...])
+#   fonte.agregar(['City'], {'tempo': ('Time_taken(min)', 'mean')})
+#   fonte.linhas(['Delivery_location_latitude', 'Delivery_location_longitude'])
+#   fonte.amostrar(0.05, ['Order_Date', 'Road_traffic_density'])  # modo aproximado
+#   backend.filtrar(..., raio={'lat': ..., 'lon': ..., 'km': 5})  # entregas no raio
+#
+# - pandas: o dataframe limpo fica em memória, compartilhado e somente leitura,
+#   e os filtros usam o FilterIndex (posições das linhas, sem cópias); o raio
+#   usa a grade do utils.espacial.
+# - duckdb: cada consulta vira um SQL sobre arquivos Parquet já limpos (o
+#   snapshot ou um diretório de partições), com filtros e colunas empurrados
+#   para a leitura; só o resultado agregado chega ao pandas.
+#
+# O backend é escolhido pela variável de ambiente DASHBOARD_BACKEND (pandas por
+# padrão). Com duckdb, DASHBOARD_PARQUET aponta para os arquivos lidos (aceita
+# glob, ex.: 'dados/pedidos_2022/*.parquet'); sem ela, vale o snapshot do csv.
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.espacial import COLUNAS_ENTREGA, retangulo
+from utils.geo import RAIO_TERRA_KM
+
+BACKENDS = ['pandas', 'duckdb']
+BACKEND_PADRAO = 'pandas'
+
+# agregações aceitas por Fonte.agregar, com o equivalente em SQL
+AGREGACOES_SQL = {
+    'size': 'COUNT(*)',
+    'count': 'COUNT({col})',
+    'sum': 'SUM({col})',
+    'mean': 'AVG({col})',
+    'std': 'STDDEV_SAMP({col})',
+    'min': 'MIN({col})',
+    'max': 'MAX({col})',
+    'nunique': 'COUNT(DISTINCT {col})',
+}
+
+# ----------------------------------------
+# Classes
+class FontePandas:
+    """ Linhas filtradas de um dataframe em memória, sem cópia do dataframe.
+
+        Guarda o dataframe (compartilhado, somente leitura) e as posições das
+        linhas filtradas; cada consulta copia só as colunas que usa, e só nas
+        posições filtradas.
+
+        df1 pode ser o dataframe ou uma função que o devolve; nesse caso ele só
+        é calculado no primeiro uso (páginas servidas por artefatos exportados
+        não chegam a carregar as linhas). posicoes None = todas as linhas.
+
+        amostras: função opcional (fracao, estratos, semente) -> posições da
+        amostra estratificada do dataset inteiro, calculada uma vez por
+        processo; filtrado: colunas usadas para chegar às posições.
+    """
+
+    def __init__(self, df1, posicoes=None, amostras=None, filtrado=()):
+        self._df1 = df1
+        self.posicoes = posicoes
+        self._amostras = amostras
+        self.filtrado = tuple(filtrado)
+
+    @property
+    def df1(self):
+        if callable(self._df1):
+            self._df1 = self._df1()
+        return self._df1
+
+    def __len__(self):
+        return len(self.df1) if self.posicoes is None else len(self.posicoes)
+
+    def _colunas(self, colunas):
+        if self.posicoes is None:
+            return self.df1.loc[:, colunas]
+
+        return pd.DataFrame({col: self.df1[col].array.take(self.posicoes) for col in colunas})
+
+    def agregar(self, por, agregacoes):
+        """ Agrupa as linhas e calcula as agregações pedidas
+
+            Input: lista de colunas de agrupamento (vazia = total geral) e
+                   dicionário nome -> (coluna, agregação de AGREGACOES_SQL)
+            Output: dataframe com as colunas de 'por' e uma coluna por agregação,
+                    ordenado por 'por' (uma única linha quando 'por' é vazio)
+        """
+        df_aux = self._colunas(list(dict.fromkeys(list(por) + [col for col, _ in agregacoes.values()])))
+        if not por:
+            return pd.DataFrame([{nome: df_aux[col].agg(funcao) for nome, (col, funcao) in agregacoes.items()}])
+
+        df_aux = df_aux.groupby(por, observed=True).agg(**agregacoes)
+
+        # com observed=True o pandas 1.5 devolve categorias na ordem de aparição
+        return df_aux.sort_index().reset_index()
+
+    def linhas(self, colunas):
+        """ As linhas filtradas, só com as colunas pedidas """
+        return self._colunas(colunas)
+
+    def amostrar(self, fracao, estratos, semente=0):
+        """ Amostra estratificada: de cada estrato (combinação dos valores de
+            'estratos') ficam ceil(fracao * linhas do estrato) linhas sorteadas.
+            A mesma semente e os mesmos filtros dão sempre a mesma amostra.
+
+            Quando a fonte só foi filtrada por colunas dos estratos, cada estrato
+            entra inteiro ou fica de fora, então a amostra do dataset inteiro
+            (self._amostras) restrita às posições filtradas já é a amostra
+            estratificada da fonte - sem passar por todas as linhas filtradas.
+
+            Input: fração, colunas que definem os estratos, semente
+            Output: FontePandas com as linhas sorteadas
+        """
+        if self._amostras is not None and set(self.filtrado) <= set(estratos):
+            amostra = self._amostras(fracao, tuple(estratos), semente)
+            if self.posicoes is not None:
+                posicoes = np.asarray(self.posicoes)
+                lugar = np.minimum(np.searchsorted(posicoes, amostra), max(len(posicoes) - 1, 0))
+                amostra = amostra[posicoes[lugar] == amostra] if len(posicoes) else amostra[:0]
+            return FontePandas(self._df1, amostra)
+
+        posicoes = np.arange(len(self.df1)) if self.posicoes is None else np.asarray(self.posicoes)
+        estrato = self._colunas(estratos).groupby(estratos, observed=True, sort=False).ngroup().to_numpy()
+
+        sorteio = np.random.default_rng(semente).random(len(posicoes))
+        ordem = np.lexsort((sorteio, estrato))
+        tamanho = np.bincount(estrato)
+        inicio = np.cumsum(tamanho) - tamanho
+        estrato = estrato[ordem]
+        posto = np.arange(len(ordem)) - inicio[estrato]
+        escolhidas = posto < np.ceil(fracao * tamanho[estrato])
+
+        return FontePandas(self._df1, np.sort(posicoes[ordem[escolhidas]]))
+
+class BackendPandas:
+    """ Dataset limpo em memória + FilterIndex (o comportamento original das páginas).
+
+        O dataframe só é carregado quando uma fonte é usada: a sidebar usa apenas
+        o índice, e páginas que desenham tudo a partir do cubo nunca leem as linhas.
+        espacial: função que devolve o IndiceEspacial (só chamada por filtros com raio).
+    """
+
+    nome = 'pandas'
+
+    def __init__(self, indice, carregar, amostras=None, espacial=None):
+        self.indice = indice
+        self._carregar = carregar
+        self._amostras = amostras
+        self._espacial = espacial
+        self._df1 = None
+
+    @property
+    def df1(self):
+        if self._df1 is None:
+            self._df1 = self._carregar()
+        return self._df1
+
+    def periodo(self):
+        return self.indice.periodo()
+
+    def valores(self, col):
+        return self.indice.valores(col)
+
+    def filtrar(self, inicio=None, fim=None, raio=None, **filtros):
+        """ Fonte com as linhas do período [inicio, fim), dos filtros categóricos
+            e, com raio ({'lat', 'lon', 'km'}), só das entregas a até 'km' do ponto
+        """
+        filtrado = (['Order_Date'] if inicio is not None or fim is not None else []) + list(filtros)
+        posicoes = self.indice.select(inicio, fim, **filtros)
+        if raio is not None:
+            posicoes = np.intersect1d(posicoes, self._espacial().no_raio(**raio), assume_unique=True)
+            filtrado += COLUNAS_ENTREGA
+
+        return FontePandas(lambda: self.df1, posicoes, self._amostras, filtrado)
+
+class FonteDuckDB:
+    """ Consulta SQL filtrada sobre arquivos Parquet, executada só quando agregada.
+        origem: subconsulta no lugar dos arquivos do backend (ex.: uma amostra)
+    """
+
+    def __init__(self, backend, condicoes, parametros, origem=None):
+        self.backend = backend
+        self.condicoes = condicoes
+        self.parametros = parametros
+        self.origem = origem or backend.origem
+        self._tamanho = None
+
+    def __len__(self):
+        if self._tamanho is None:
+            self._tamanho = int(self._executar('SELECT COUNT(*) AS n', []).iloc[0, 0])
+        return self._tamanho
+
+    def _executar(self, selecao, por):
+        sql = '{} FROM {}'.format(selecao, self.origem)
+        if self.condicoes:
+            sql += ' WHERE ' + ' AND '.join(self.condicoes)
+        if por:
+            sql += ' GROUP BY {0} ORDER BY {0}'.format(', '.join(_coluna(col) for col in por))
+
+        return self.backend.consultar(sql, self.parametros)
+
+    def agregar(self, por, agregacoes):
+        """ Mesmo contrato de FontePandas.agregar, calculado pelo DuckDB """
+        selecao = [_coluna(col) for col in por]
+        selecao += ['{} AS {}'.format(AGREGACOES_SQL[funcao].format(col=_coluna(col)), _coluna(nome))
+                    for nome, (col, funcao) in agregacoes.items()]
+
+        return self._executar('SELECT ' + ', '.join(selecao), list(por))
+
+    def linhas(self, colunas):
+        """ As linhas filtradas, só com as colunas pedidas """
+        return self._executar('SELECT ' + ', '.join(_coluna(col) for col in colunas), [])
+
+    def amostrar(self, fracao, estratos, semente=0):
+        """ Mesmo contrato de FontePandas.amostrar; o sorteio é a ordem de um hash
+            das linhas com a semente, então a amostra não muda entre consultas
+        """
+        particao = ', '.join(_coluna(col) for col in estratos)
+        sql = ('(SELECT * EXCLUDE (_sorteio) FROM (SELECT *, hash(*COLUMNS(*), ?) AS _sorteio FROM {} {})'
+               ' QUALIFY row_number() OVER (PARTITION BY {p} ORDER BY _sorteio)'
+               ' <= ceil(? * count(*) OVER (PARTITION BY {p}))) AS amostra').format(
+            self.origem, 'WHERE ' + ' AND '.join(self.condicoes) if self.condicoes else '', p=particao)
+
+        return FonteDuckDB(self.backend, [], [semente] + list(self.parametros) + [fracao], sql)
+
+class BackendDuckDB:
+    """ Consultas fora da memória sobre Parquet limpo (snapshot ou partições) """
+
+    nome = 'duckdb'
+
+    def __init__(self, arquivos, categoricas=()):
+        import duckdb
+
+        self.conexao = duckdb.connect()
+        self.origem = "read_parquet('{}')".format(arquivos.replace("'", "''"))
+        self.categoricas = set(categoricas)
+
+    def consultar(self, sql, parametros=()):
+        """ Executa o SQL num cursor próprio (as sessões do Streamlit rodam em
+            threads diferentes) e devolve um dataframe, com as colunas
+            categóricas do dataset de volta como category.
+        """
+        df_aux = self.conexao.cursor().execute(sql, list(parametros)).df()
+        for col in df_aux.columns:
+            if col in self.categoricas:
+                df_aux[col] = df_aux[col].astype('category')
+
+        return df_aux
+
+    def periodo(self):
+        df_aux = self.consultar('SELECT MIN(Order_Date) AS inicio, MAX(Order_Date) AS fim FROM ' + self.origem)
+
+        return df_aux['inicio'].iloc[0].date(), df_aux['fim'].iloc[0].date()
+
+    def valores(self, col):
+        df_aux = self.consultar('SELECT DISTINCT {0} FROM {1} ORDER BY {0}'.format(_coluna(col), self.origem))
+
+        return df_aux[col].astype(str).tolist()
+
+    def filtrar(self, inicio=None, fim=None, raio=None, **filtros):
+        """ Fonte com as linhas do período [inicio, fim), dos filtros categóricos
+            e, com raio ({'lat', 'lon', 'km'}), só das entregas a até 'km' do ponto
+        """
+        condicoes, parametros = [], []
+        if inicio is not None:
+            condicoes.append('Order_Date >= ?')
+            parametros.append(pd.Timestamp(inicio).to_pydatetime())
+        if fim is not None:
+            condicoes.append('Order_Date < ?')
+            parametros.append(pd.Timestamp(fim).to_pydatetime())
+        for col, escolhidos in filtros.items():
+            escolhidos = list(escolhidos)
+            if not escolhidos:
+                condicoes.append('FALSE')
+                continue
+            condicoes.append('{} IN ({})'.format(_coluna(col), ', '.join('?' * len(escolhidos))))
+            parametros += [str(valor) for valor in escolhidos]
+        if raio is not None:
+            novas, valores = _condicoes_raio(**raio)
+            condicoes += novas
+            parametros += valores
+
+        return FonteDuckDB(self, condicoes, parametros)
+
+# ----------------------------------------
+# Funções
+def _coluna(nome):
+    """ Identificador SQL entre aspas (há colunas como 'Time_taken(min)') """
+    return '"{}"'.format(nome.replace('"', '""'))
+
+def _condicoes_raio(lat, lon, km):
+    """ Condições SQL das entregas a até 'km' de (lat, lon): o retângulo
+        envolvente (barato, aproveita as estatísticas do Parquet) e a haversine
+    """
+    lat_col, lon_col = (_coluna(col) for col in COLUNAS_ENTREGA)
+    haversine = ('2 * {r} * asin(sqrt(pow(sin(radians({lat} - ?) / 2), 2) + cos(radians(?)) * '
+                 'cos(radians({lat})) * pow(sin(radians({lon} - ?) / 2), 2))) <= ?').format(
+        r=RAIO_TERRA_KM, lat=lat_col, lon=lon_col)
+    condicoes = ['{} BETWEEN ? AND ?'.format(lat_col), '{} BETWEEN ? AND ?'.format(lon_col), haversine]
+
+    return condicoes, list(retangulo(lat, lon, km)) + [lat, lat, lon, km]
+
+def backend_configurado():
+    """ Nome do backend escolhido em DASHBOARD_BACKEND (pandas por padrão) """
+    nome = os.environ.get('DASHBOARD_BACKEND', BACKEND_PADRAO).strip().lower() or BACKEND_PADRAO
+    if nome not in BACKENDS:
+        raise ValueError('DASHBOARD_BACKEND deve ser um de {}, recebido {!r}'.format(BACKENDS, nome))
+    if nome == 'duckdb' and importlib.util.find_spec('duckdb') is None:
+        raise ImportError('DASHBOARD_BACKEND=duckdb precisa do pacote duckdb '
+                          '(pip install -r requirements.txt)')
+
+    return nome
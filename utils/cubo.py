@@ -0,0 +1,226 @@
+# ----------------------------------------
+# Cubo de agregados pré-calculados
+#
+# Cada célula do cubo é uma combinação dia x City x Road_traffic_density x
+# Type_of_order x Festival x Weatherconditions e guarda agregados que podem ser
+# somados entre células: contagem, soma, soma dos quadrados, mínimo e máximo de
+# cada medida, além do conjunto de entregadores distintos da célula (guardado
+# como pares célula/entregador). Os gráficos filtram as células pela sidebar e
+# re-agregam só o que sobrou, então o custo depende do número de células e não
+# do número de pedidos. As células ficam ordenadas por Order_Date: o período da
+# sidebar vira uma fatia achada por busca binária, e períodos curtos custam
+# proporcionalmente menos.
+import numpy as np
+import pandas as pd
+
+from utils.particoes import semana_do_ano
+
+DIMENSOES = ['Order_Date', 'City', 'Road_traffic_density', 'Type_of_order', 'Festival', 'Weatherconditions']
+MEDIDAS = ['Time_taken(min)', 'distance']
+ENTREGADOR = 'Delivery_person_ID'
+
+# dimensões derivadas, calculadas uma única vez sobre as células quando o cubo é montado
+DERIVADAS = {
+    'week_of_year': lambda celulas: semana_do_ano(celulas['Order_Date']),
+}
+
+# ----------------------------------------
+# Classes
+class Cubo:
+    """ Cubo de agregados mergeáveis.
+
+        celulas: dataframe ordenado por DIMENSOES (Order_Date primeiro) com
+                 DIMENSOES, DERIVADAS, 'n' e, por medida, as colunas
+                 '<medida>_soma', '<medida>_soma_quad', '<medida>_min', '<medida>_max'
+        pares: dataframe (celula, entregador) com os entregadores distintos de
+               cada célula, ordenado por célula
+        entregadores: categorias de Delivery_person_ID (o código do par indexa esta lista)
+    """
+
+    def __init__(self, celulas, pares, entregadores):
+        for col, derivar in DERIVADAS.items():
+            if col not in celulas.columns:
+                celulas[col] = derivar(celulas)
+
+        self.celulas = celulas
+        self.pares = pares
+        self.entregadores = entregadores
+
+    def __len__(self):
+        return len(self.celulas)
+
+    @classmethod
+    def from_frame(cls, df1, medidas=MEDIDAS):
+        """ Constrói o cubo a partir do dataframe limpo
+
+            Input: dataframe limpo
+            Output: Cubo
+        """
+        entregador = df1[ENTREGADOR].astype('category')
+        df_aux = df1.loc[:, DIMENSOES + medidas]
+        for medida in medidas:
+            df_aux[medida + '_quad'] = df_aux[medida].astype('float64') ** 2
+
+        agregacoes = {'n': (medidas[0], 'size')}
+        for medida in medidas:
+            agregacoes[medida + '_soma'] = (medida, 'sum')
+            agregacoes[medida + '_soma_quad'] = (medida + '_quad', 'sum')
+            agregacoes[medida + '_min'] = (medida, 'min')
+            agregacoes[medida + '_max'] = (medida, 'max')
+
+        grupos = df_aux.groupby(DIMENSOES, observed=True, sort=True)
+        celulas = grupos.agg(**agregacoes).reset_index()
+
+        celula = grupos.ngroup().to_numpy()
+        pares = _pares_distintos(celula, entregador.cat.codes.to_numpy(), len(entregador.cat.categories))
+
+        return cls(celulas, pares, entregador.cat.categories)
+
+    @classmethod
+    def from_fonte(cls, fonte, medidas=MEDIDAS):
+        """ Constrói o cubo com duas agregações de uma fonte (utils.backend), sem
+            trazer as linhas para a memória: uma por célula e outra pelos pares
+            célula/entregador. A soma dos quadrados vem de n, média e desvio.
+
+            Input: fonte de utils.backend (ex.: BackendDuckDB().filtrar())
+            Output: Cubo
+        """
+        agregacoes = {'n': (medidas[0], 'size')}
+        for medida in medidas:
+            agregacoes[medida + '_soma'] = (medida, 'sum')
+            agregacoes[medida + '_std'] = (medida, 'std')
+            agregacoes[medida + '_min'] = (medida, 'min')
+            agregacoes[medida + '_max'] = (medida, 'max')
+
+        celulas = fonte.agregar(DIMENSOES, agregacoes)
+        for medida in medidas:
+            variancia = (celulas.pop(medida + '_std').astype('float64') ** 2).fillna(0)
+            soma = celulas[medida + '_soma'].astype('float64')
+            celulas.insert(celulas.columns.get_loc(medida + '_soma') + 1, medida + '_soma_quad',
+                           variancia * (celulas['n'] - 1) + soma ** 2 / celulas['n'])
+
+        df_pares = fonte.agregar(DIMENSOES + [ENTREGADOR], {'n': (ENTREGADOR, 'size')})
+        celula = pd.MultiIndex.from_frame(celulas[DIMENSOES]).get_indexer(
+            pd.MultiIndex.from_frame(df_pares[DIMENSOES]))
+        entregador = df_pares[ENTREGADOR].astype('category')
+        pares = _pares_distintos(celula, entregador.cat.codes.to_numpy(), len(entregador.cat.categories))
+
+        return cls(celulas, pares, entregador.cat.categories)
+
+    @classmethod
+    def juntar(cls, cubos):
+        """ Junta cubos parciais (ex.: de partições do dataset montadas em
+            processos separados). Células com as mesmas dimensões são somadas:
+            n, somas e somas dos quadrados somam, mínimos e máximos se combinam
+            e os pares de entregadores distintos são unidos.
+
+            Input: lista de Cubo com as mesmas medidas
+            Output: Cubo
+        """
+        entregadores = pd.Index(sorted(set().union(*[cubo.entregadores for cubo in cubos])))
+
+        celulas, pares, deslocamento = [], [], 0
+        for cubo in cubos:
+            celulas.append(cubo.celulas)
+            codigo = entregadores.get_indexer(cubo.entregadores)
+            pares.append(pd.DataFrame({'celula': cubo.pares['celula'].to_numpy() + deslocamento,
+                                       'entregador': codigo[cubo.pares['entregador'].to_numpy()]}))
+            deslocamento += len(cubo.celulas)
+
+        # categorias iguais em todas as partes, senão o concat perde o tipo category
+        for col in DIMENSOES:
+            if isinstance(celulas[0][col].dtype, pd.CategoricalDtype):
+                tipo = pd.CategoricalDtype(sorted(set().union(*[parte[col].cat.categories for parte in celulas])))
+                celulas = [parte.assign(**{col: parte[col].astype(object).astype(tipo)}) for parte in celulas]
+
+        todas = pd.concat(celulas, ignore_index=True)
+        agregacoes = {col: 'min' if col.endswith('_min') else 'max' if col.endswith('_max') else 'sum'
+                      for col in todas.columns if col not in DIMENSOES and col not in DERIVADAS}
+
+        grupos = todas.groupby(DIMENSOES, observed=True, sort=True)
+        juntas = grupos.agg(agregacoes).reset_index()
+
+        celula = grupos.ngroup().to_numpy()
+        pares = pd.concat(pares, ignore_index=True)
+        pares = _pares_distintos(celula[pares['celula'].to_numpy()], pares['entregador'].to_numpy(),
+                                 len(entregadores))
+
+        return cls(juntas, pares, entregadores)
+
+    def filtrar(self, inicio=None, fim=None, **filtros):
+        """ Mantém só as células dentro do período [inicio, fim) e dos filtros categóricos
+
+            Input: data inicial, data final e, por dimensão, a lista de valores aceitos
+            Output: Cubo
+        """
+        lo, hi = fatia_de_datas(self.celulas['Order_Date'], inicio, fim)
+        celulas = self.celulas.iloc[lo:hi]
+        mascara = np.ones(hi - lo, dtype=bool)
+        for col, escolhidos in filtros.items():
+            mascara &= celulas[col].isin(list(escolhidos)).to_numpy()
+
+        # pares das células do período: também uma fatia, pois estão ordenados por célula
+        celula = self.pares['celula'].to_numpy()
+        pares = self.pares.iloc[np.searchsorted(celula, lo):np.searchsorted(celula, hi)]
+        novo_id = np.full(hi - lo, -1)
+        novo_id[mascara] = np.arange(mascara.sum())
+        pares = pares.loc[mascara[pares['celula'].to_numpy() - lo]]
+        pares = pares.assign(celula=novo_id[pares['celula'].to_numpy() - lo])
+
+        return Cubo(celulas.loc[mascara].reset_index(drop=True), pares.reset_index(drop=True),
+                    self.entregadores)
+
+    def agrupar(self, por, medidas=(), distintos=False):
+        """ Re-agrega as células pelas dimensões pedidas.
+
+            Input: lista de dimensões (de DIMENSOES ou DERIVADAS), medidas a
+                   resumir e se deve contar os entregadores distintos
+            Output: dataframe com as dimensões, 'n', '<medida>_mean',
+                    '<medida>_std', '<medida>_min', '<medida>_max' e, se pedido,
+                    'Delivery_person_ID' com o número de entregadores distintos
+        """
+        colunas = ['n']
+        for medida in medidas:
+            colunas += [medida + '_soma', medida + '_soma_quad', medida + '_min', medida + '_max']
+        celulas = self.celulas.loc[:, list(por) + colunas]
+
+        grupos = celulas.groupby(por, observed=True, sort=True)
+        soma = grupos[[col for col in colunas if not col.endswith(('_min', '_max'))]].sum()
+        df_aux = soma.loc[:, ['n']]
+        for medida in medidas:
+            media = soma[medida + '_soma'] / soma['n']
+            variancia = (soma[medida + '_soma_quad'] - soma[medida + '_soma'] * media) / (soma['n'] - 1)
+            variancia = variancia.where(soma['n'] > 1)
+            df_aux[medida + '_mean'] = media
+            df_aux[medida + '_std'] = np.sqrt(variancia.clip(lower=0))
+            df_aux[medida + '_min'] = grupos[medida + '_min'].min()
+            df_aux[medida + '_max'] = grupos[medida + '_max'].max()
+
+        if distintos:
+            grupo = grupos.ngroup().to_numpy()
+            pares = _pares_distintos(grupo[self.pares['celula'].to_numpy()],
+                                     self.pares['entregador'].to_numpy(), len(self.entregadores))
+            df_aux[ENTREGADOR] = np.bincount(pares['celula'].to_numpy(), minlength=len(df_aux))
+
+        # com observed=True o pandas 1.5 devolve categorias na ordem de aparição
+        return df_aux.sort_index().reset_index()
+
+# ----------------------------------------
+# Funções
+def fatia_de_datas(datas, inicio=None, fim=None):
+    """ Posições [lo, hi) das linhas com inicio <= data < fim numa coluna ordenada
+
+        Input: Series de datas ordenada, data inicial, data final
+        Output: (lo, hi)
+    """
+    datas = datas.to_numpy()
+    lo = 0 if inicio is None else int(np.searchsorted(datas, np.datetime64(pd.Timestamp(inicio), 'ns')))
+    hi = len(datas) if fim is None else int(np.searchsorted(datas, np.datetime64(pd.Timestamp(fim), 'ns')))
+
+    return lo, max(lo, hi)
+
+def _pares_distintos(grupo, entregador, n_entregadores):
+    """ Pares (grupo, entregador) distintos, ordenados por grupo """
+    chave = np.unique(grupo.astype('int64') * n_entregadores + entregador)
+
+    return pd.DataFrame({'celula': chave // n_entregadores, 'entregador': chave % n_entregadores})
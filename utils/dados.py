@@ -0,0 +1,526 @@
+# ----------------------------------------
+# Carregamento e limpeza do dataset compartilhados pelas páginas
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+from utils.aproximado import CHAVES, MEDIDA_PERCENTIS, Esbocos
+from utils.backend import BackendDuckDB, BackendPandas, FontePandas, backend_configurado
+from utils.cubo import DIMENSOES, ENTREGADOR, MEDIDAS, Cubo
+from utils.espacial import COLUNAS_ENTREGA, COLUNAS_RESTAURANTE, IndiceEspacial
+from utils.filtros import COLUNAS_BITMAP, FilterIndex
+from utils.geo import haversine_km
+from utils.percentis import CHAVES as CHAVES_PERCENTIS, MEDIDAS as MEDIDAS_PERCENTIS, PercentisGrupos
+from utils.profiling import anexar, etapa
+from utils.snapshot import read_snapshot, snapshot_path, snapshot_valido, write_snapshot, write_snapshot_blocos
+
+DATASET_PATH = 'dataset/train.csv'
+
+# esquema declarado do dataset limpo: só as colunas usadas pelas páginas, pelo
+# cubo e pelo índice de filtros, cada uma no menor tipo que guarda os valores
+# sem perda: inteiros pequenos em int8/int16, coordenadas e distância em
+# float32 e textos repetidos em category. Ratings fica em float64 (em float32
+# notas como 4.9 viram 4.900000095 nas médias e tabelas). ID, Time_Orderd e
+# Time_Order_picked nem são lidos do csv.
+ESQUEMA = {
+    'Delivery_person_ID': 'category',
+    'Delivery_person_Age': 'int8',
+    'Delivery_person_Ratings': 'float64',
+    'Restaurant_latitude': 'float32',
+    'Restaurant_longitude': 'float32',
+    'Delivery_location_latitude': 'float32',
+    'Delivery_location_longitude': 'float32',
+    'Order_Date': 'datetime64[ns]',
+    'Weatherconditions': 'category',
+    'Road_traffic_density': 'category',
+    'Vehicle_condition': 'int8',
+    'Type_of_order': 'category',
+    'Type_of_vehicle': 'category',
+    'multiple_deliveries': 'int8',
+    'Festival': 'category',
+    'City': 'category',
+    'Time_taken(min)': 'int16',
+    'distance': 'float32',
+}
+
+# colunas lidas do csv (distance é calculada na limpeza)
+COLUNAS_CSV = [col for col in ESQUEMA if col != 'distance']
+
+# colunas de texto com espaços sobrando no csv original
+COLUNAS_TEXTO = ['Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+                 'multiple_deliveries', 'Type_of_order', 'Type_of_vehicle', 'City', 'Festival',
+                 'Road_traffic_density']
+
+# linhas com 'NaN' em qualquer uma destas colunas são descartadas
+COLUNAS_SEM_NAN = ['Road_traffic_density', 'Delivery_person_Age', 'Delivery_person_Ratings',
+                   'City', 'Festival', 'multiple_deliveries']
+
+COLUNAS_CATEGORICAS = [col for col, tipo in ESQUEMA.items() if tipo == 'category']
+
+# colunas numéricas; valores que não convertem, ou que não cabem no tipo do
+# ESQUEMA, marcam a linha como malformada
+COLUNAS_NUMERICAS = ['Delivery_person_Age', 'Delivery_person_Ratings', 'multiple_deliveries',
+                     'Vehicle_condition', 'Restaurant_latitude', 'Restaurant_longitude',
+                     'Delivery_location_latitude', 'Delivery_location_longitude', 'Time_taken(min)']
+
+# csv acima deste tamanho é convertido em blocos de LINHAS_POR_BLOCO linhas
+LIMITE_EM_BLOCOS = 256 * 2 ** 20
+LINHAS_POR_BLOCO = 500_000
+
+# ----------------------------------------
+# Funções
+def _texto(serie):
+    """ Coluna como texto sem espaços; vazios viram 'NaN', como no csv original """
+    if serie.dtype != object:
+        serie = serie.astype(object)
+
+    return serie.str.strip().fillna('NaN')
+
+def clean_code(df1, relatorio=None):
+    """ Esta função tem a responsabilidade de limpar o dataframe
+
+        Tipos de limpeza:
+        1. Remoção dos espaços das variáveis de texto
+        2. Remoção dos dados NaN - uma única máscara combinada, um único filtro
+        3. Mudança do tipo das colunas para o ESQUEMA (textos repetidos viram
+           category, números o menor tipo que os comporta)
+        4. Formatação das colunas de datas
+        5. Limpeza da coluna de tempo - remoção do texto da variável numérica
+        6. Remoção das linhas malformadas (números, datas ou tempo que não
+           convertem ou não cabem no tipo do ESQUEMA)
+        7. Cálculo da distância restaurante -> entrega (coluna distance, em km)
+        8. Projeção nas colunas do ESQUEMA e ordenação por Order_Date (base do
+           índice de filtros da sidebar)
+
+        Input: dataframe e, opcionalmente, um dicionário que acumula as linhas
+               'descartadas' (NaN) e 'malformadas'
+        Output: dataframe
+    """
+    texto = {col: _texto(df1[col]) for col in COLUNAS_TEXTO}
+
+    validos = np.ones(len(df1), dtype=bool)
+    for col in COLUNAS_SEM_NAN:
+        validos &= (texto[col] != 'NaN').to_numpy()
+
+    df1 = df1.loc[validos].reset_index(drop=True)
+    for col in COLUNAS_TEXTO:
+        df1[col] = texto[col].to_numpy()[validos]
+
+    convertidas = {col: pd.to_numeric(df1[col], errors='coerce') for col in COLUNAS_NUMERICAS
+                   if col != 'Time_taken(min)'}
+    convertidas['Order_Date'] = pd.to_datetime(df1['Order_Date'], format='%d-%m-%Y', errors='coerce')
+    convertidas['Time_taken(min)'] = pd.to_numeric(
+        df1['Time_taken(min)'].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
+
+    malformadas = np.zeros(len(df1), dtype=bool)
+    for col, serie in convertidas.items():
+        malformadas |= serie.isna().to_numpy()
+        if np.issubdtype(np.dtype(ESQUEMA[col]), np.integer):
+            limites = np.iinfo(ESQUEMA[col])
+            malformadas |= ((serie < limites.min) | (serie > limites.max)).to_numpy()
+
+    if malformadas.any():
+        df1 = df1.loc[~malformadas].reset_index(drop=True)
+        convertidas = {col: serie[~malformadas].reset_index(drop=True) for col, serie in convertidas.items()}
+
+    # distância calculada com as coordenadas em float64, antes do float32 do ESQUEMA
+    df1['distance'] = haversine_km(convertidas['Restaurant_latitude'], convertidas['Restaurant_longitude'],
+                                   convertidas['Delivery_location_latitude'],
+                                   convertidas['Delivery_location_longitude'])
+    for col, serie in convertidas.items():
+        df1[col] = serie
+
+    df1 = df1.loc[:, list(ESQUEMA)].astype(ESQUEMA)
+    df1 = df1.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+
+    if relatorio is not None:
+        relatorio['descartadas'] = relatorio.get('descartadas', 0) + int((~validos).sum())
+        relatorio['malformadas'] = relatorio.get('malformadas', 0) + int(malformadas.sum())
+
+    return df1
+
+def _faixas_de_datas(contagem, linhas_por_bloco):
+    """ Agrupa dias consecutivos em faixas de até linhas_por_bloco linhas
+        (um dia maior que o bloco fica sozinho na sua faixa)
+
+        Input: Series dia -> número de linhas, ordenada por dia
+        Output: lista de (primeiro dia, último dia)
+    """
+    faixas, inicio, linhas = [], None, 0
+    for dia, n in contagem.items():
+        if inicio is not None and linhas + n > linhas_por_bloco:
+            faixas.append((inicio, anterior))
+            inicio, linhas = None, 0
+        if inicio is None:
+            inicio = dia
+        linhas += n
+        anterior = dia
+
+    if inicio is not None:
+        faixas.append((inicio, anterior))
+
+    return faixas
+
+def resumo_bloco(bloco):
+    """ O que a segunda passada de ingerir_em_blocos precisa saber de um bloco limpo
+
+        Input: bloco limpo
+        Output: (linhas por dia, {coluna categórica: categorias})
+    """
+    return (bloco['Order_Date'].value_counts(),
+            {col: list(bloco[col].cat.categories) for col in COLUNAS_CATEGORICAS})
+
+def ingerir_em_blocos(path, parquet_path, assinatura, linhas_por_bloco=LINHAS_POR_BLOCO, progresso=None,
+                      processos=1):
+    """ Gera o snapshot lendo o csv em blocos, com memória limitada ao bloco.
+
+        1. Cada bloco do csv é limpo por clean_code (linhas malformadas são
+           descartadas e contadas por bloco) e anexado a um Parquet temporário.
+           Com processos > 1 os blocos são faixas de bytes do csv, limpas em
+           paralelo (utils.paralelo), cada uma no seu temporário.
+        2. O snapshot precisa estar ordenado por data: os dias são agrupados em
+           faixas de até linhas_por_bloco linhas, e cada faixa é lida dos
+           temporários, ordenada e anexada ao snapshot, já com as categorias
+           finais (a união das vistas em todos os blocos).
+
+        A ordenação é estável e os blocos seguem a ordem do csv, então o
+        resultado é o mesmo de clean_code(pd.read_csv(path)).
+
+        Input: caminho do csv, caminho do parquet, assinatura do csv, linhas por
+               bloco, função progresso(fase, feito, total) opcional, processos
+        Output: dicionário com 'linhas', 'descartadas', 'malformadas' e 'blocos'
+    """
+    relatorio = {'linhas': 0, 'descartadas': 0, 'malformadas': 0, 'blocos': 0}
+    categorias = {col: set() for col in COLUNAS_CATEGORICAS}
+    contagem = []
+    tamanho = os.path.getsize(path)
+    prefixo_tmp = '{}.{}.blocos'.format(parquet_path, os.getpid())
+    tmp_paths = []
+
+    def acumular(linhas, resumo):
+        relatorio['linhas'] += linhas
+        contagem.append(resumo[0])
+        for col, valores in resumo[1].items():
+            categorias[col].update(valores)
+
+    def blocos_limpos(arquivo):
+        for bloco in pd.read_csv(arquivo, usecols=COLUNAS_CSV, chunksize=linhas_por_bloco):
+            with etapa('clean_code', len(bloco)):
+                bloco = clean_code(bloco, relatorio)
+            relatorio['blocos'] += 1
+            if progresso is not None:
+                progresso('limpeza', arquivo.tell(), tamanho)
+            if len(bloco) == 0:
+                continue
+
+            acumular(len(bloco), resumo_bloco(bloco))
+            yield bloco
+
+    def faixas_ordenadas(faixas):
+        tipos = {col: pd.CategoricalDtype(sorted(valores)) for col, valores in categorias.items()}
+        for i, (inicio, fim) in enumerate(faixas):
+            tabela = pq.read_table(tmp_paths, filters=[('Order_Date', '>=', inicio), ('Order_Date', '<=', fim)])
+            df1 = tabela.to_pandas()
+            for col, tipo in tipos.items():
+                df1[col] = df1[col].astype(object).astype(tipo)
+            if progresso is not None:
+                progresso('ordenação', i + 1, len(faixas))
+            yield df1.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+
+    try:
+        if processos > 1:
+            from utils.paralelo import limpar_em_paralelo
+
+            with etapa('clean_code paralelo'):
+                for parcial in limpar_em_paralelo(path, prefixo_tmp, linhas_por_bloco, processos, progresso):
+                    for chave in ('descartadas', 'malformadas'):
+                        relatorio[chave] += parcial['relatorio'].get(chave, 0)
+                    relatorio['blocos'] += 1
+                    if parcial['destino'] is not None:
+                        tmp_paths.append(parcial['destino'])
+                        acumular(parcial['linhas'], parcial['resumo'])
+        else:
+            tmp_paths.append(prefixo_tmp + '.tmp')
+            with open(path, 'rb') as arquivo:
+                write_snapshot_blocos(blocos_limpos(arquivo), tmp_paths[0], assinatura, particionar=False)
+
+        if not contagem:
+            raise ValueError('nenhuma linha válida em {}'.format(path))
+
+        contagem = pd.concat(contagem).groupby(level=0).sum().sort_index()
+        with etapa('write_snapshot', relatorio['linhas']):
+            write_snapshot_blocos(faixas_ordenadas(_faixas_de_datas(contagem, linhas_por_bloco)),
+                                  parquet_path, assinatura)
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return relatorio
+
+def assinatura_arquivo(path):
+    """ Retorna a assinatura (mtime, tamanho) do arquivo, usada como chave do cache.
+        Qualquer alteração no arquivo de origem muda a assinatura e invalida o cache.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _garantir_snapshot(path, assinatura):
+    parquet_path = snapshot_path(path)
+    if snapshot_valido(parquet_path, assinatura):
+        return parquet_path
+
+    if assinatura[1] > LIMITE_EM_BLOCOS:
+        from utils.paralelo import processos_configurados
+
+        ingerir_em_blocos(path, parquet_path, assinatura, processos=processos_configurados())
+    else:
+        with etapa('read_csv') as registro:
+            df = pd.read_csv(path, usecols=COLUNAS_CSV)
+            registro['linhas'] = len(df)
+        with etapa('clean_code') as registro:
+            df = clean_code(df)
+            registro['linhas'] = len(df)
+        with etapa('write_snapshot'):
+            write_snapshot(df, parquet_path, assinatura)
+
+    return parquet_path
+
+def somente_leitura(df1):
+    """ Marca os arrays do dataframe como somente leitura: ele é compartilhado
+        entre sessões, então uma escrita acidental vira erro em vez de alterar os
+        dados de todos os usuários
+
+        Input: dataframe
+        Output: o mesmo dataframe
+    """
+    for array in df1._mgr.arrays:
+        # category e datetime guardam os valores num ndarray interno
+        getattr(array, '_ndarray', array).flags.writeable = False
+
+    return df1
+
+def memoria_por_coluna(df1):
+    """ Memória ocupada por cada coluna do dataframe, com o tipo e o total
+
+        Input: dataframe
+        Output: dataframe coluna, tipo, mb (maiores primeiro, total na última linha)
+    """
+    memoria = df1.memory_usage(index=False, deep=True) / 2 ** 20
+    df_aux = pd.DataFrame({'coluna': memoria.index, 'tipo': df1.dtypes.astype(str).to_numpy(),
+                           'mb': memoria.to_numpy()})
+    df_aux = df_aux.sort_values('mb', ascending=False, ignore_index=True)
+    total = pd.DataFrame([{'coluna': 'total', 'tipo': '', 'mb': memoria.sum()}])
+
+    return pd.concat([df_aux, total], ignore_index=True).round({'mb': 3})
+
+@st.cache_resource(show_spinner='Carregando dados...', max_entries=8)
+def _carregar(path, assinatura, colunas):
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    with etapa('read_snapshot'):
+        df1 = read_snapshot(parquet_path, list(colunas) if colunas is not None else None)
+
+    return somente_leitura(df1)
+
+def load_data(colunas=None, path=DATASET_PATH):
+    """ Carrega o dataset limpo a partir do snapshot colunar (Parquet).
+
+        Na primeira execução - ou quando o mtime/tamanho do csv mudam - o csv é
+        lido, limpo e convertido em snapshot. Depois disso, as páginas leem só
+        as colunas que usam. O dataframe é lido uma vez por processo e
+        compartilhado, sem cópia, entre reruns, páginas e sessões - por isso é
+        somente leitura: filtre por posições (FilterIndex) e copie só as
+        colunas necessárias.
+
+        Input: colunas usadas pela página (None = todas), caminho do csv
+        Output: dataframe limpo (somente leitura)
+    """
+    if colunas is not None:
+        colunas = tuple(colunas)
+
+    return _carregar(path, assinatura_arquivo(path), colunas)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice(path, assinatura):
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    return FilterIndex(read_snapshot(parquet_path, ['Order_Date'] + COLUNAS_BITMAP))
+
+def load_index(path=DATASET_PATH):
+    """ Índice de filtros (datas + bitmaps) do dataset, construído uma vez por processo.
+
+        As posições que ele devolve valem para qualquer projeção de colunas
+        retornada por load_data, pois o snapshot é gravado ordenado por data.
+
+        Input: caminho do csv
+        Output: FilterIndex
+    """
+    return _indice(path, assinatura_arquivo(path))
+
+@st.cache_resource(show_spinner='Montando cubo de agregados...', max_entries=2)
+def _cubo(path, assinatura, backend, arquivos):
+    if backend == 'duckdb':
+        return Cubo.from_fonte(_duckdb(path, assinatura, arquivos).filtrar())
+
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    from utils.paralelo import montar_cubo, processos_configurados
+
+    processos = processos_configurados()
+    if processos > 1 and pq.ParquetFile(parquet_path).metadata.num_rows > LINHAS_POR_BLOCO:
+        return montar_cubo(parquet_path, processos)
+
+    return Cubo.from_frame(read_snapshot(parquet_path, DIMENSOES + MEDIDAS + [ENTREGADOR]))
+
+def load_cube(path=DATASET_PATH):
+    """ Cubo de agregados do dataset, construído uma vez por processo.
+
+        Com o backend duckdb o cubo é montado por consultas SQL sobre o
+        Parquet, sem carregar as linhas. Com pandas, snapshots grandes são
+        divididos por datas e montados em vários processos (utils.paralelo).
+
+        Input: caminho do csv
+        Output: Cubo
+    """
+    backend, arquivos, assinatura = versao_dados(path)
+
+    return _cubo(path, assinatura, backend, arquivos)
+
+@st.cache_resource(show_spinner='Montando esboços do modo aproximado...', max_entries=2)
+def _esbocos(path, assinatura, backend, arquivos):
+    if backend == 'duckdb':
+        return Esbocos.from_fonte(_duckdb(path, assinatura, arquivos).filtrar())
+
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    return Esbocos.from_fonte(FontePandas(read_snapshot(parquet_path, CHAVES + [MEDIDA_PERCENTIS, ENTREGADOR])))
+
+def load_esbocos(path=DATASET_PATH):
+    """ Esboços do modo aproximado (HyperLogLog e t-digest por dia x
+        trânsito, ver utils.aproximado), montados uma vez por processo.
+
+        Input: caminho do csv
+        Output: Esbocos
+    """
+    backend, arquivos, assinatura = versao_dados(path)
+
+    return _esbocos(path, assinatura, backend, arquivos)
+
+@st.cache_resource(show_spinner='Montando percentis por grupo...', max_entries=2)
+def _percentis(path, assinatura, backend, arquivos):
+    if backend == 'duckdb':
+        return PercentisGrupos.from_fonte(_duckdb(path, assinatura, arquivos).filtrar())
+
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    return PercentisGrupos.from_fonte(FontePandas(read_snapshot(parquet_path, CHAVES_PERCENTIS + MEDIDAS_PERCENTIS)))
+
+def load_percentis(path=DATASET_PATH):
+    """ t-digests do tempo de entrega e das avaliações por dia x trânsito x
+        cidade x clima (ver utils.percentis), montados uma vez por processo.
+
+        Input: caminho do csv
+        Output: PercentisGrupos
+    """
+    backend, arquivos, assinatura = versao_dados(path)
+
+    return _percentis(path, assinatura, backend, arquivos)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _amostra(path, assinatura, fracao, estratos, semente):
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    return FontePandas(read_snapshot(parquet_path, list(estratos))).amostrar(fracao, list(estratos), semente).posicoes
+
+def load_amostra(fracao, estratos, semente=0, path=DATASET_PATH):
+    """ Posições da amostra estratificada do dataset inteiro (FontePandas.amostrar),
+        sorteada uma vez por processo; o modo aproximado a restringe aos filtros.
+
+        Input: fração, colunas dos estratos, semente, caminho do csv
+        Output: array ordenado de posições
+    """
+    return _amostra(path, assinatura_arquivo(path), fracao, tuple(estratos), semente)
+
+@st.cache_resource(show_spinner='Montando índice espacial...', max_entries=2)
+def _espacial(path, assinatura, backend, arquivos):
+    if backend == 'duckdb':
+        return IndiceEspacial.from_fonte(_duckdb(path, assinatura, arquivos).filtrar())
+
+    parquet_path = _garantir_snapshot(path, assinatura)
+
+    return IndiceEspacial.from_frame(read_snapshot(parquet_path, COLUNAS_RESTAURANTE + COLUNAS_ENTREGA + ['City']))
+
+def load_espacial(path=DATASET_PATH):
+    """ Índice espacial (utils.espacial) dos restaurantes e, no backend pandas,
+        dos locais de entrega, montado uma vez por processo. As posições das
+        entregas valem para qualquer projeção de load_data (snapshot ordenado).
+
+        Input: caminho do csv
+        Output: IndiceEspacial
+    """
+    backend, arquivos, assinatura = versao_dados(path)
+
+    return _espacial(path, assinatura, backend, arquivos)
+
+def versao_dados(path=DATASET_PATH):
+    """ Backend configurado, arquivos Parquet (DASHBOARD_PARQUET, só no duckdb)
+        e a assinatura desses dados - serve de chave para caches derivados.
+    """
+    backend = backend_configurado()
+    arquivos = None
+    if backend == 'duckdb':
+        arquivos = os.environ.get('DASHBOARD_PARQUET') or None
+
+    return backend, arquivos, assinatura_origem(path, arquivos)
+
+def assinatura_origem(path, arquivos=None):
+    """ Assinatura dos dados lidos: a do csv ou, com DASHBOARD_PARQUET, a de
+        cada arquivo Parquet que casa com o glob.
+    """
+    if arquivos is None:
+        return assinatura_arquivo(path)
+
+    return tuple((nome,) + assinatura_arquivo(nome) for nome in sorted(glob.glob(arquivos)))
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _duckdb(path, assinatura, arquivos):
+    if arquivos is None:
+        arquivos = _garantir_snapshot(path, assinatura)
+
+    return BackendDuckDB(arquivos, COLUNAS_CATEGORICAS)
+
+def load_backend(colunas=None, path=DATASET_PATH):
+    """ Backend de consultas escolhido em DASHBOARD_BACKEND (ver utils.backend).
+
+        - pandas: load_data(colunas) + load_index(), com as linhas carregadas só
+          quando a fonte filtrada é usada
+        - duckdb: consultas sobre o snapshot, ou sobre os arquivos de
+          DASHBOARD_PARQUET; 'colunas' é ignorado (cada consulta lê só o que usa)
+
+        Input: colunas usadas pela página (None = todas), caminho do csv
+        Output: BackendPandas ou BackendDuckDB
+    """
+    backend, arquivos, assinatura = versao_dados(path)
+    if backend == 'duckdb':
+        return _duckdb(path, assinatura, arquivos)
+
+    def carregar():
+        with etapa('load_data') as registro:
+            df1 = load_data(colunas, path)
+            registro['linhas'] = len(df1)
+        anexar('Memória por coluna', memoria_por_coluna, df1)
+        return df1
+
+    def amostras(fracao, estratos, semente):
+        return load_amostra(fracao, estratos, semente, path)
+
+    def espacial():
+        with etapa('load_espacial'):
+            return load_espacial(path)
+
+    return BackendPandas(load_index(path), carregar, amostras, espacial)
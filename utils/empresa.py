@@ -0,0 +1,143 @@
+# ----------------------------------------
+# Gráficos da Visão Empresa
+#
+# Funções puras (dados -> figura), usadas pela página e pelos benchmarks sem
+# precisar de um servidor Streamlit. plotly.express e folium são importados
+# dentro das funções: a aba geográfica não paga o plotly, as outras não pagam o
+# folium e figuras lidas de artefatos exportados não pagam nenhum dos dois.
+from utils.figuras import agregar_barras, modo_render, reduzir_serie
+from utils.geo import agrupar_em_grade, geojson_payload, heatmap_payload
+
+# colunas lidas do snapshot pela página
+COLUNAS = ['Order_Date', 'Road_traffic_density', 'City', 'Restaurant_latitude', 'Restaurant_longitude',
+           'Delivery_location_latitude', 'Delivery_location_longitude']
+
+# ----------------------------------------
+# Funções
+def order_metric(cubo):
+    import plotly.express as px
+
+    df_1 = cubo.agrupar(['Order_Date']).rename(columns={'n':'ID'})
+    # barras não passam pelo LTTB: com mais dias que pixels elas viram semanas
+    df_barras = agregar_barras(df_1, 'Order_Date', 'ID')
+    graph1 = px.bar(df_barras, x='Order_Date', y='ID')
+    if len(df_barras) < len(df_1):
+        graph1.update_xaxes(title_text='Order_Date (semana)')
+
+    return graph1
+
+def traffic_order_share(cubo):
+    import plotly.express as px
+
+    df_3 = cubo.agrupar(['Road_traffic_density']).rename(columns={'n':'ID'})
+    df_3[ 'entrega_erc'] = df_3['ID'] / df_3[ 'ID'].sum()
+    graph2 = px.pie( df_3, values='entrega_erc', names='Road_traffic_density')
+
+    return graph2
+
+def traffic_order_city(cubo):
+    import plotly.express as px
+
+    df_4 = cubo.agrupar(['City','Road_traffic_density']).rename(columns={'n':'ID'})
+    # categorias sem pedidos quebram o color/eixos do plotly
+    df_4 = df_4.astype({'City': str, 'Road_traffic_density': str})
+    graph3 = px.scatter(df_4,x='City',y='Road_traffic_density',size='ID', color='City',
+                        render_mode=modo_render(len(df_4)))
+    
+    return graph3
+
+def order_by_week(cubo):
+    import plotly.express as px
+
+    df_2 = reduzir_serie(cubo.agrupar(['week_of_year']).rename(columns={'n':'ID'}), 'week_of_year', 'ID')
+    graph4 = px.line( df_2, x='week_of_year',y='ID', render_mode=modo_render(len(df_2)))
+
+    return graph4
+
+def order_share_by_week(cubo):
+    import plotly.express as px
+
+    df_5 = cubo.agrupar(['week_of_year'], distintos=True).rename(columns={'n':'ID'})
+    df_5['order_by_deliver'] = df_5['ID'] / df_5['Delivery_person_ID']
+    df_5 = reduzir_serie(df_5, 'week_of_year', 'order_by_deliver')
+
+    graph5 = px.line(df_5,x='week_of_year',y='order_by_deliver', render_mode=modo_render(len(df_5)))
+
+    return graph5
+
+def order_share_by_week_aproximado(esbocos):
+    """ order_share_by_week do modo aproximado: entregadores distintos por
+        semana estimados pelo HyperLogLog dos esboços, com a margem de erro
+        (95%) como barra de erro
+
+        Input: esboços filtrados (utils.aproximado.Esbocos)
+        Output: figura
+    """
+    import plotly.express as px
+
+    df_5 = esbocos.agrupar(['week_of_year']).rename(columns={'n':'ID'})
+    df_5['order_by_deliver'] = df_5['ID'] / df_5['Delivery_person_ID']
+    # pedidos são exatos: o erro da razão vem só do denominador
+    relativo = df_5['Delivery_person_ID_erro'] / df_5['Delivery_person_ID']
+    df_5['erro'] = df_5['order_by_deliver'] * relativo / (1 - relativo)
+    df_5 = reduzir_serie(df_5, 'week_of_year', 'order_by_deliver')
+
+    graph5 = px.line(df_5,x='week_of_year',y='order_by_deliver', error_y='erro',
+                     render_mode=modo_render(len(df_5)))
+
+    return graph5
+
+def country_maps(df1):
+    import folium
+    from folium.plugins import HeatMap
+
+    # medianas por cidade e trânsito
+    cols = ['City','Road_traffic_density','Delivery_location_latitude','Delivery_location_longitude']
+    df_6 = df1.loc[:,cols].groupby( ['City','Road_traffic_density'], observed=True ).median().sort_index().reset_index()
+    map = folium.Map()
+    medianas = folium.FeatureGroup(name='Medianas por cidade e trânsito').add_to(map)
+    for index, location in df_6.iterrows():
+        folium.Marker( [location['Delivery_location_latitude'],location['Delivery_location_longitude']],
+                      popup = location[['City','Road_traffic_density']]).add_to(medianas)
+
+    # entregas e restaurantes agrupados em grade no servidor
+    # seleção vazia: sem camadas, só o mapa base (o tooltip do GeoJson exige features)
+    entregas = agrupar_em_grade(df1['Delivery_location_latitude'], df1['Delivery_location_longitude'])
+    if len(entregas) > 0:
+        HeatMap(heatmap_payload(entregas), name='Entregas', radius=15).add_to(map)
+
+    restaurantes = agrupar_em_grade(df1['Restaurant_latitude'], df1['Restaurant_longitude'])
+    if len(restaurantes) > 0:
+        folium.GeoJson(geojson_payload(restaurantes), name='Restaurantes', show=False,
+                       marker=folium.CircleMarker(radius=4, fill=True, color='darkred'),
+                       tooltip=folium.GeoJsonTooltip(fields=['n'], aliases=['Pedidos'])).add_to(map)
+
+    folium.LayerControl().add_to(map)
+    if len(entregas) > 0:
+        map.fit_bounds([[entregas['lat'].min(), entregas['lon'].min()],
+                        [entregas['lat'].max(), entregas['lon'].max()]])
+
+    return map
+
+def mapa_html(df1):
+    """ HTML do mapa (country_maps) pronto para components.html
+
+        Input: linhas filtradas com as colunas de COLUNAS
+        Output: html do mapa
+    """
+    import folium
+
+    fig = folium.Figure(height=600).add_child(country_maps(df1))
+
+    return fig.render()
+
+# artefatos exportados por utils.exportar: nome -> (função, entrada)
+# entrada: 'cubo' (cubo filtrado), 'fonte' (fonte filtrada) ou 'linhas' (fonte.linhas(COLUNAS))
+ARTEFATOS = {
+    'order_metric': (order_metric, 'cubo'),
+    'traffic_order_share': (traffic_order_share, 'cubo'),
+    'traffic_order_city': (traffic_order_city, 'cubo'),
+    'order_by_week': (order_by_week, 'cubo'),
+    'order_share_by_week': (order_share_by_week, 'cubo'),
+    'country_maps': (mapa_html, 'linhas'),
+}
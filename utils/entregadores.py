@@ -0,0 +1,76 @@
+# ----------------------------------------
+# Tabelas e métricas da Visão Entregadores
+#
+# Funções puras (fonte filtrada -> tabela), usadas pela página e pelos
+# benchmarks sem precisar de um servidor Streamlit. A fonte vem de
+# utils.backend, então as mesmas funções rodam em pandas ou em DuckDB.
+from functools import partial
+
+from utils.aproximado import resumo_amostra
+from utils.kpi import KPI, calcular_kpis
+from utils.topk import extremos_por_grupo
+
+# colunas lidas do snapshot pela página (backend pandas)
+COLUNAS = ['Order_Date', 'Road_traffic_density', 'City', 'Delivery_person_ID', 'Delivery_person_Age',
+           'Delivery_person_Ratings', 'Vehicle_condition', 'Weatherconditions', 'Time_taken(min)']
+
+# KPIs da faixa de métricas - calculados juntos pelo motor de KPIs
+KPIS = [
+    KPI('Mais Velho', 'Delivery_person_Age', 'max'),
+    KPI('Mais Novo', 'Delivery_person_Age', 'min'),
+    KPI('Melhor Condição', 'Vehicle_condition', 'max'),
+    KPI('Pior Condição', 'Vehicle_condition', 'min'),
+]
+
+# ----------------------------------------
+# Funções
+def avaliacao_entregador(fonte):
+    df_3 = fonte.agregar(['Delivery_person_ID'], {'Delivery_person_Ratings': ('Delivery_person_Ratings', 'mean')})
+
+    return df_3
+
+def avaliacao_transito(fonte):
+    df_4 = fonte.agregar(['Road_traffic_density'], {'delivery_mean': ('Delivery_person_Ratings', 'mean'),
+                                                    'delivery_std': ('Delivery_person_Ratings', 'std')})
+
+    return df_4
+
+def avaliacao_clima(fonte):
+    df_5 = fonte.agregar(['Weatherconditions'], {'delivery_mean': ('Delivery_person_Ratings', 'mean'),
+                                                 'delivery_std': ('Delivery_person_Ratings', 'std')})
+
+    return df_5
+
+def avaliacao_aproximada(amostra, por):
+    """ avaliacao_transito / avaliacao_clima do modo aproximado: média e desvio
+        das avaliações pela amostra estratificada, com as margens de erro (95%)
+
+        Input: fonte amostrada (fonte.amostrar), coluna de agrupamento
+        Output: dataframe com delivery_mean, delivery_std, as margens e as
+                linhas da amostra de cada grupo
+    """
+    df_aux = resumo_amostra(amostra, [por], 'Delivery_person_Ratings')
+    df_aux = df_aux.rename(columns={'mean': 'delivery_mean', 'mean_erro': 'delivery_mean_erro',
+                                    'std': 'delivery_std', 'std_erro': 'delivery_std_erro', 'n': 'amostra'})
+
+    return df_aux.loc[:, [por, 'delivery_mean', 'delivery_mean_erro', 'delivery_std', 'delivery_std_erro',
+                          'amostra']]
+
+def top_delivers(fonte):
+    """ Os 10 entregadores mais rápidos e os 10 mais lentos de cada cidade
+
+        Input: fonte filtrada
+        Output: (mais rápidos, mais lentos)
+    """
+    df_6 = fonte.agregar(['City', 'Delivery_person_ID'], {'Time_taken(min)': ('Time_taken(min)', 'mean')})
+
+    return extremos_por_grupo(df_6, 'City', 'Time_taken(min)', k=10)
+
+# artefatos exportados por utils.exportar: nome -> (função, entrada)
+ARTEFATOS = {
+    'kpis': (partial(calcular_kpis, kpis=KPIS), 'fonte'),
+    'avaliacao_entregador': (avaliacao_entregador, 'fonte'),
+    'avaliacao_transito': (avaliacao_transito, 'fonte'),
+    'avaliacao_clima': (avaliacao_clima, 'fonte'),
+    'top_delivers': (top_delivers, 'fonte'),
+}
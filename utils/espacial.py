@@ -0,0 +1,212 @@
+# ----------------------------------------
+# Índice espacial dos pedidos
+#
+# Uma grade fixa de latitude/longitude (células de PASSO_GRAUS graus, ~5.5 km)
+# sobre os locais de entrega e sobre os restaurantes distintos. As posições dos
+# pontos ficam ordenadas por célula, então cada célula é uma fatia achada por
+# busca binária. Uma consulta por raio visita só as células que cruzam o
+# retângulo envolvente do círculo e calcula a distância (haversine) apenas
+# para os pontos dessas células - o custo depende dos pontos próximos, não do
+# total de pedidos.
+#
+# - no_raio: posições dos pedidos com entrega a até 'km' de um ponto;
+# - restaurantes_proximos: os k restaurantes mais próximos de um ponto;
+# - faixas de distância (FAIXAS_KM) para os tempos de entrega por faixa.
+import numpy as np
+import pandas as pd
+
+from utils.geo import RAIO_TERRA_KM, coordenadas_validas, haversine_km
+from utils.topk import k_extremos
+
+PASSO_GRAUS = 0.05
+# km por grau de latitude
+KM_POR_GRAU = RAIO_TERRA_KM * np.pi / 180
+
+# limites das faixas de distância (km) usadas nos tempos por faixa
+FAIXAS_KM = [0, 2, 5, 10, 15, 20, np.inf]
+
+COLUNAS_RESTAURANTE = ['Restaurant_latitude', 'Restaurant_longitude']
+COLUNAS_ENTREGA = ['Delivery_location_latitude', 'Delivery_location_longitude']
+
+# ----------------------------------------
+# Classes
+class GradeEspacial:
+    """ Pontos agrupados em células de uma grade regular, ordenados por célula.
+
+        Input: arrays de latitude/longitude (pontos inválidos ficam de fora),
+               tamanho da célula em graus
+    """
+
+    def __init__(self, lat, lon, passo=PASSO_GRAUS):
+        lat = np.asarray(lat, dtype='float64')
+        lon = np.asarray(lon, dtype='float64')
+        validos = np.flatnonzero(coordenadas_validas(lat, lon))
+
+        self.passo = passo
+        self.colunas = int(np.ceil(360 / passo)) + 1
+        celula = self._celula(lat[validos], lon[validos])
+        ordem = np.argsort(celula, kind='stable')
+
+        # posição original, latitude e longitude de cada ponto, na ordem das células
+        self.posicoes = validos[ordem]
+        self.lat = lat[self.posicoes]
+        self.lon = lon[self.posicoes]
+        self.celulas = celula[ordem]
+
+    def __len__(self):
+        return len(self.posicoes)
+
+    def _celula(self, lat, lon):
+        linha = np.floor((np.asarray(lat) + 90) / self.passo).astype('int64')
+        coluna = np.floor((np.asarray(lon) + 180) / self.passo).astype('int64')
+
+        return linha * self.colunas + coluna
+
+    def candidatos(self, lat, lon, km):
+        """ Índices (na ordem da grade) dos pontos nas células que cruzam o
+            retângulo envolvente do círculo de raio 'km'
+        """
+        lat0, lat1, lon0, lon1 = retangulo(lat, lon, km)
+        linhas = np.arange(*self._linha_coluna(lat0, lat1, 90))
+        col0, col1 = self._linha_coluna(lon0, lon1, 180)
+
+        # cada linha da grade é um intervalo contíguo de chaves: uma busca binária por linha
+        inicios = np.searchsorted(self.celulas, linhas * self.colunas + col0, side='left')
+        fins = np.searchsorted(self.celulas, linhas * self.colunas + col1 - 1, side='right')
+        if len(inicios) == 0:
+            return np.array([], dtype='int64')
+
+        return np.concatenate([np.arange(i, f) for i, f in zip(inicios, fins)])
+
+    def _linha_coluna(self, minimo, maximo, limite):
+        return (int(np.floor((max(minimo, -limite) + limite) / self.passo)),
+                int(np.floor((min(maximo, limite) + limite) / self.passo)) + 1)
+
+    def no_raio(self, lat, lon, km):
+        """ Pontos a até 'km' de (lat, lon)
+
+            Input: latitude, longitude e raio em km
+            Output: (posições originais em ordem crescente, distâncias em km)
+        """
+        indices = self.candidatos(lat, lon, km)
+        distancias = haversine_km(np.full(len(indices), lat), np.full(len(indices), lon),
+                                  self.lat[indices], self.lon[indices])
+        dentro = distancias <= km
+        posicoes, distancias = self.posicoes[indices[dentro]], distancias[dentro]
+        ordem = np.argsort(posicoes, kind='stable')
+
+        return posicoes[ordem], distancias[ordem]
+
+    def mais_proximos(self, lat, lon, k):
+        """ Os k pontos mais próximos de (lat, lon): o raio da busca dobra até
+            achar k pontos, e todo ponto fora do raio está mais longe que eles
+
+            Input: latitude, longitude, k
+            Output: (posições originais, distâncias em km), da mais próxima à mais distante
+        """
+        km = self.passo * KM_POR_GRAU
+        posicoes, distancias = self.no_raio(lat, lon, km)
+        while len(posicoes) < min(k, len(self)) and km < np.pi * RAIO_TERRA_KM:
+            km *= 2
+            posicoes, distancias = self.no_raio(lat, lon, km)
+
+        escolhidos = k_extremos(distancias, min(k, len(distancias)), True)
+
+        return posicoes[escolhidos], distancias[escolhidos]
+
+class IndiceEspacial:
+    """ Grade dos locais de entrega de cada pedido e dos restaurantes distintos.
+
+        restaurantes: dataframe com lat, lon, City e 'n' pedidos de cada
+                      restaurante distinto, do mais movimentado ao menos
+        entregas: GradeEspacial dos locais de entrega (posições = linhas do
+                  snapshot) ou None quando as linhas não ficam em memória
+                  (backend duckdb, que filtra por raio em SQL)
+    """
+
+    def __init__(self, restaurantes, entregas=None):
+        self.restaurantes = restaurantes
+        self.grade_restaurantes = GradeEspacial(restaurantes['lat'], restaurantes['lon'])
+        self.entregas = entregas
+
+    @classmethod
+    def from_frame(cls, df1):
+        """ Índice das entregas e dos restaurantes do dataframe limpo
+
+            Input: dataframe ordenado como o snapshot, com City e as coordenadas
+            Output: IndiceEspacial
+        """
+        restaurantes = df1.groupby(COLUNAS_RESTAURANTE + ['City'], observed=True).size()
+        entregas = GradeEspacial(df1[COLUNAS_ENTREGA[0]], df1[COLUNAS_ENTREGA[1]])
+
+        return cls(_tabela_restaurantes(restaurantes.rename('n').reset_index()), entregas)
+
+    @classmethod
+    def from_fonte(cls, fonte):
+        """ Índice só dos restaurantes, agregado por uma fonte (ex.: DuckDB)
+
+            Input: fonte de utils.backend
+            Output: IndiceEspacial sem a grade das entregas
+        """
+        restaurantes = fonte.agregar(COLUNAS_RESTAURANTE + ['City'], {'n': ('City', 'size')})
+
+        return cls(_tabela_restaurantes(restaurantes))
+
+    def no_raio(self, lat, lon, km):
+        """ Posições (ordenadas) dos pedidos com entrega a até 'km' de (lat, lon) """
+        return self.entregas.no_raio(lat, lon, km)[0]
+
+    def restaurantes_proximos(self, lat, lon, k=10):
+        """ Os k restaurantes distintos mais próximos de (lat, lon)
+
+            Input: latitude, longitude, k
+            Output: dataframe de restaurantes com a coluna 'km'
+        """
+        posicoes, distancias = self.grade_restaurantes.mais_proximos(lat, lon, k)
+
+        return self.restaurantes.iloc[posicoes].assign(km=distancias).reset_index(drop=True)
+
+# ----------------------------------------
+# Funções
+def retangulo(lat, lon, km):
+    """ Retângulo envolvente do círculo de raio 'km' em volta de (lat, lon)
+
+        Input: latitude, longitude, raio em km
+        Output: (lat mínima, lat máxima, lon mínima, lon máxima)
+    """
+    dlat = km / KM_POR_GRAU
+    dlon = min(dlat / max(np.cos(np.radians(min(abs(lat) + dlat, 90))), 1e-6), 180)
+
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+def _tabela_restaurantes(df_aux):
+    """ Um restaurante por coordenada, com a cidade mais frequente dos seus
+        pedidos e o total de pedidos, do mais movimentado ao menos
+
+        Input: contagens 'n' por coordenadas do restaurante e City
+        Output: dataframe lat, lon, City, n
+    """
+    df_aux = df_aux.rename(columns={COLUNAS_RESTAURANTE[0]: 'lat', COLUNAS_RESTAURANTE[1]: 'lon'})
+    df_aux = df_aux.loc[coordenadas_validas(df_aux['lat'], df_aux['lon']) & (df_aux['n'] > 0)]
+    total = df_aux.groupby(['lat', 'lon'])['n'].transform('sum')
+    df_aux = df_aux.sort_values('n', ascending=False, kind='stable').drop_duplicates(['lat', 'lon'])
+    df_aux = df_aux.assign(n=total.loc[df_aux.index])
+
+    return df_aux.loc[:, ['lat', 'lon', 'City', 'n']].sort_values('n', ascending=False, kind='stable',
+                                                                  ignore_index=True)
+
+def rotulos_faixas(faixas=FAIXAS_KM):
+    """ Rótulos das faixas de distância ('0-2 km', ..., '20+ km') """
+    return ['{:g}+ km'.format(lo) if np.isinf(hi) else '{:g}-{:g} km'.format(lo, hi)
+            for lo, hi in zip(faixas[:-1], faixas[1:])]
+
+def faixa_distancia(distancias, faixas=FAIXAS_KM):
+    """ Faixa de cada distância, [lo, hi) em km
+
+        Input: array/Series de distâncias em km, limites das faixas
+        Output: Categorical ordenado com os rótulos de rotulos_faixas
+    """
+    codigos = np.searchsorted(np.asarray(faixas[1:-1], dtype='float64'), np.asarray(distancias), side='right')
+    codigos = np.where(np.isnan(np.asarray(distancias, dtype='float64')), -1, codigos)
+
+    return pd.Categorical.from_codes(codigos, categories=rotulos_faixas(faixas), ordered=True)
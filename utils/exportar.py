@@ -0,0 +1,244 @@
+# ----------------------------------------
+# Exportação dos gráficos e tabelas das páginas para arquivos estáticos
+#
+# Calcula, sem servidor Streamlit, os resultados de cada página para um
+# conjunto de presets de filtros e grava em disco figuras (JSON do plotly e
+# HTML), tabelas (Parquet e csv), KPIs (JSON) e o mapa (HTML), com um
+# manifesto. Quando os filtros da sidebar batem com um preset exportado para a
+# mesma versão dos dados, as páginas servem os arquivos em vez de recalcular.
+#
+# Uso:
+#   python -m utils.exportar
+#   python -m utils.exportar --presets presets.json --saida exportados
+#
+# presets.json: {"nome": {"inicio": "2022-02-11", "fim": "2022-04-13",
+#                         "Road_traffic_density": ["High", "Jam"]}}
+# Chaves ausentes (ou null) ficam com o padrão da sidebar: do início dos dados
+# até DATA_PADRAO e todos os trânsitos. O preset "padrao" é exportado sempre.
+#
+# As páginas procuram os artefatos em DASHBOARD_EXPORTADOS (padrão: exportados/).
+#
+# As páginas só usam artefatos_exportados e a leitura dos arquivos: os módulos
+# das páginas e o plotly são importados apenas quando preciso, para não pesar
+# na carga a frio de quem não exporta nem lê figuras.
+import argparse
+import importlib
+import json
+import os
+from datetime import date, datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils.profiling import etapa, medir
+from utils.sidebar import filtros_padrao
+from utils.snapshot import VERSAO_SNAPSHOT
+
+DIRETORIO_PADRAO = 'exportados'
+MANIFESTO = 'manifesto.json'
+
+# página -> módulo com o dicionário ARTEFATOS (nome -> (função, entrada))
+PAGINAS = {'empresa': 'utils.empresa', 'entregadores': 'utils.entregadores',
+           'restaurantes': 'utils.restaurantes'}
+
+PRESETS_PADRAO = {'padrao': {}}
+
+# ----------------------------------------
+# Classes
+class Artefatos:
+    """ Artefatos exportados de uma página para os filtros atuais (pode estar vazio) """
+
+    def __init__(self, diretorio=None, entradas=None):
+        self.diretorio = diretorio
+        self.entradas = entradas or {}
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def obter(self, nome, funcao, *args, **kwargs):
+        """ O artefato exportado 'nome', se existir; senão medir(nome, funcao, ...)
+
+            Input: nome do artefato, função que o calcula e os seus argumentos
+            Output: o resultado da função (ou o equivalente lido do disco)
+        """
+        entrada = self.entradas.get(nome)
+        if entrada is None:
+            return medir(nome, funcao, *args, **kwargs)
+
+        caminho = os.path.join(self.diretorio, entrada['arquivo'])
+        with etapa(nome + ' (exportado)'):
+            return _ler(caminho, entrada['tipo'], os.stat(caminho).st_mtime_ns, entrada.get('partes'))
+
+# ----------------------------------------
+# Funções
+def chave_filtros(filtros):
+    """ Representação canônica dos filtros (a ordem dos valores não importa) """
+    normalizado = {}
+    for col, valor in filtros.items():
+        if isinstance(valor, (date, datetime, pd.Timestamp)):
+            valor = pd.Timestamp(valor).date().isoformat()
+        elif valor is not None and not isinstance(valor, str):
+            valor = sorted(str(item) for item in valor)
+        normalizado[col] = valor
+
+    return json.dumps(normalizado, sort_keys=True)
+
+def _versao_json(versao):
+    """ Versão dos dados sem o nome do backend (pandas e duckdb dão o mesmo
+        resultado), com a versão do snapshot: mudar a limpeza invalida os artefatos
+    """
+    return json.loads(json.dumps([VERSAO_SNAPSHOT] + list(versao)[1:]))
+
+def resolver_preset(preset, backend):
+    """ Filtros concretos de um preset, completando o que faltar com o padrão da sidebar """
+    filtros = filtros_padrao(backend)
+    for col, valor in preset.items():
+        if valor is None:
+            continue
+        if col in ('inicio', 'fim'):
+            valor = date.fromisoformat(valor)
+        filtros[col] = valor
+
+    return filtros
+
+def _gravar(valor, base):
+    """ Grava um resultado de página e devolve a entrada do manifesto (tipo e
+        arquivo lido pelo app); csv e html ficam ao lado para leitura humana
+    """
+    import plotly.graph_objects as go
+
+    if isinstance(valor, go.Figure):
+        valor.write_html(base + '.html', include_plotlyjs='cdn')
+        with open(base + '.json', 'w') as arquivo:
+            arquivo.write(valor.to_json())
+        return {'tipo': 'figura', 'arquivo': base + '.json'}
+
+    if isinstance(valor, pd.DataFrame):
+        valor.to_csv(base + '.csv', index=False)
+        valor.to_parquet(base + '.parquet', index=False)
+        return {'tipo': 'tabela', 'arquivo': base + '.parquet'}
+
+    if isinstance(valor, tuple) and all(isinstance(item, pd.DataFrame) for item in valor):
+        for i, item in enumerate(valor):
+            item.to_csv('{}.{}.csv'.format(base, i), index=False)
+        pd.concat(valor, keys=range(len(valor)), names=['_parte', None]).reset_index(level=0).to_parquet(
+            base + '.parquet', index=False)
+        return {'tipo': 'tabelas', 'arquivo': base + '.parquet', 'partes': len(valor)}
+
+    if isinstance(valor, dict):
+        with open(base + '.json', 'w') as arquivo:
+            json.dump(valor, arquivo, indent=2)
+        return {'tipo': 'valores', 'arquivo': base + '.json'}
+
+    if isinstance(valor, str):
+        with open(base + '.html', 'w') as arquivo:
+            arquivo.write(valor)
+        return {'tipo': 'html', 'arquivo': base + '.html'}
+
+    raise TypeError('não sei exportar {}'.format(type(valor).__name__))
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _ler(caminho, tipo, mtime, partes=None):
+    if tipo == 'figura':
+        import plotly.io as pio
+
+        with open(caminho) as arquivo:
+            return pio.from_json(arquivo.read())
+
+    if tipo == 'tabela':
+        return pd.read_parquet(caminho)
+
+    if tipo == 'tabelas':
+        df_aux = pd.read_parquet(caminho)
+        return tuple(df_aux.loc[df_aux['_parte'] == i].drop(columns='_parte').reset_index(drop=True)
+                     for i in range(partes))
+
+    with open(caminho) as arquivo:
+        return json.load(arquivo) if tipo == 'valores' else arquivo.read()
+
+def exportar(presets, saida=DIRETORIO_PADRAO, paginas=PAGINAS):
+    """ Calcula e grava os artefatos de todas as páginas para cada preset
+
+        Input: dicionário nome -> preset, diretório de saída, páginas a exportar
+               (nome -> módulo)
+        Output: manifesto gravado em <saida>/manifesto.json
+    """
+    from utils.dados import load_backend, load_cube, versao_dados
+
+    modulos = {pagina: importlib.import_module(modulo) for pagina, modulo in paginas.items()}
+
+    backend = load_backend()
+    cubo_total = load_cube()
+    manifesto = {'gerado': datetime.now().isoformat(timespec='seconds'),
+                 'versao': _versao_json(versao_dados()), 'presets': {}}
+
+    for nome, preset in presets.items():
+        filtros = resolver_preset(preset, backend)
+        fonte = backend.filtrar(**filtros)
+        entradas = {'cubo': cubo_total.filtrar(**filtros), 'fonte': fonte}
+        entradas['linhas'] = fonte.linhas(modulos['empresa'].COLUNAS)
+        os.makedirs(os.path.join(saida, nome), exist_ok=True)
+
+        artefatos = {}
+        for pagina, modulo in modulos.items():
+            artefatos[pagina] = {}
+            for artefato, (funcao, entrada) in modulo.ARTEFATOS.items():
+                base = os.path.join(saida, nome, '{}.{}'.format(pagina, artefato))
+                registro = _gravar(funcao(entradas[entrada]), base)
+                print('{:<12} {:<13} {:<24} {}'.format(nome, pagina, artefato, registro['arquivo']), flush=True)
+                registro['arquivo'] = os.path.relpath(registro['arquivo'], saida)
+                artefatos[pagina][artefato] = registro
+
+        manifesto['presets'][nome] = {'filtros': json.loads(chave_filtros(filtros)),
+                                      'chave': chave_filtros(filtros), 'artefatos': artefatos}
+
+    with open(os.path.join(saida, MANIFESTO), 'w') as arquivo:
+        json.dump(manifesto, arquivo, indent=2)
+
+    return manifesto
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _ler_manifesto(caminho, mtime):
+    with open(caminho) as arquivo:
+        return json.load(arquivo)
+
+def artefatos_exportados(pagina, filtros, versao, diretorio=None):
+    """ Artefatos da página para os filtros atuais, se algum preset exportado
+        tiver exatamente esses filtros e a mesma versão dos dados.
+
+        Input: nome da página (chave de PAGINAS), filtros da sidebar,
+               versão dos dados (dados.versao_dados()), diretório dos artefatos
+        Output: Artefatos (vazio quando não há preset correspondente)
+    """
+    diretorio = diretorio or os.environ.get('DASHBOARD_EXPORTADOS', DIRETORIO_PADRAO)
+    caminho = os.path.join(diretorio, MANIFESTO)
+    if not os.path.exists(caminho):
+        return Artefatos()
+
+    manifesto = _ler_manifesto(caminho, os.stat(caminho).st_mtime_ns)
+    if manifesto['versao'] != _versao_json(versao):
+        return Artefatos()
+
+    chave = chave_filtros(filtros)
+    for preset in manifesto['presets'].values():
+        if preset['chave'] == chave:
+            return Artefatos(diretorio, preset['artefatos'].get(pagina, {}))
+
+    return Artefatos()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exporta os gráficos e tabelas das páginas para arquivos')
+    parser.add_argument('--presets', default=None, help='JSON com os presets de filtros (nome -> filtros)')
+    parser.add_argument('--saida', default=os.environ.get('DASHBOARD_EXPORTADOS', DIRETORIO_PADRAO))
+    args = parser.parse_args(argv)
+
+    presets = dict(PRESETS_PADRAO)
+    if args.presets:
+        with open(args.presets) as arquivo:
+            presets.update(json.load(arquivo))
+
+    manifesto = exportar(presets, args.saida)
+    print('\n{} presets exportados em {}'.format(len(manifesto['presets']), args.saida))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# ----------------------------------------
+# Redução do payload das figuras
+#
+# Com vários anos de pedidos, as séries diárias e semanais passam a ter mais
+# pontos do que pixels no gráfico, e serializar a figura e desenhá-la no
+# navegador vira uma parte visível do tempo de cada rerun. Aqui:
+#
+# - reduzir_serie escolhe até LARGURA_PIXELS pontos de uma série pelo LTTB
+#   (Largest-Triangle-Three-Buckets), que mantém picos e vales - o desenho
+#   continua o mesmo, só sem os pontos que caem no mesmo pixel. Só serve para
+#   linhas e scatters: em barras cada ponto descartado é um dia que some;
+# - agregar_barras soma as barras diárias em semanas inteiras (ou blocos de
+#   semanas) quando há mais dias que LARGURA_PIXELS - todo pedido continua
+#   em alguma barra;
+# - modo_render troca SVG por WebGL acima de LIMITE_WEBGL pontos;
+# - tamanho_payload mede o JSON que vai para o navegador.
+#
+# Séries com até LARGURA_PIXELS pontos saem inalteradas.
+import numpy as np
+import pandas as pd
+
+from utils.particoes import chave_semana
+
+# largura útil de um gráfico no layout 'wide' (um ponto por pixel basta)
+LARGURA_PIXELS = 1200
+# acima disso scatter/line usam WebGL (scattergl) em vez de SVG
+LIMITE_WEBGL = 1000
+
+# ----------------------------------------
+# Funções
+def _numerico(valores):
+    valores = np.asarray(valores)
+    if np.issubdtype(valores.dtype, np.datetime64):
+        return valores.astype('datetime64[ns]').astype('int64').astype('float64')
+
+    return valores.astype('float64')
+
+def lttb(x, y, pontos):
+    """ Posições dos pontos escolhidos pelo Largest-Triangle-Three-Buckets
+
+        O primeiro e o último ponto ficam sempre; os demais são divididos em
+        pontos - 2 faixas, e de cada faixa fica o ponto que forma o maior
+        triângulo com o ponto escolhido na faixa anterior e a média da próxima.
+
+        Input: x (ordenado, números ou datas), y, número de pontos desejado
+        Output: array int64 de posições, em ordem crescente
+    """
+    n = len(x)
+    if pontos >= n or pontos < 3:
+        return np.arange(n)
+
+    x = _numerico(x)
+    y = np.nan_to_num(_numerico(y))
+
+    # faixas [limites[i], limites[i + 1]) dos pontos internos e as suas médias
+    limites = np.linspace(1, n - 1, pontos - 1).astype('int64')
+    soma_x = np.concatenate([[0.0], np.cumsum(x)])
+    soma_y = np.concatenate([[0.0], np.cumsum(y)])
+    tamanhos = np.diff(limites)
+    medias_x = np.append((soma_x[limites[1:]] - soma_x[limites[:-1]]) / tamanhos, x[-1])
+    medias_y = np.append((soma_y[limites[1:]] - soma_y[limites[:-1]]) / tamanhos, y[-1])
+
+    escolhidos = np.empty(pontos, dtype='int64')
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    a = 0
+    for i in range(pontos - 2):
+        lo, hi = limites[i], limites[i + 1]
+        areas = np.abs((x[a] - medias_x[i + 1]) * (y[lo:hi] - y[a])
+                       - (x[a] - x[lo:hi]) * (medias_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(areas))
+        escolhidos[i + 1] = a
+
+    return escolhidos
+
+def reduzir_serie(df_aux, x, y, pontos=LARGURA_PIXELS):
+    """ Linhas de uma série temporal reduzidas a no máximo 'pontos' pelo LTTB
+
+        As demais colunas (ex.: barras de erro) acompanham as linhas escolhidas.
+
+        Input: dataframe ordenado por x, coluna x, coluna y, número de pontos
+        Output: dataframe (o próprio, se já couber)
+    """
+    if len(df_aux) <= pontos:
+        return df_aux
+
+    return df_aux.iloc[lttb(df_aux[x].to_numpy(), df_aux[y].to_numpy(), pontos)].reset_index(drop=True)
+
+def agregar_barras(df_aux, x, y, pontos=LARGURA_PIXELS):
+    """ Barras diárias somadas em semanas (domingo a sábado, como as partições
+        do snapshot), ou em blocos de semanas, até caberem em 'pontos' barras
+
+        Input: dataframe ordenado por x (datas), coluna x, coluna y (somada),
+               número máximo de barras
+        Output: dataframe x (domingo que abre cada barra), y (o próprio, se já couber)
+    """
+    if len(df_aux) <= pontos:
+        return df_aux
+
+    semanas = chave_semana(df_aux[x])
+    semanas_por_barra = -(-(int(semanas[-1] - semanas[0]) + 1) // pontos)
+    barra = semanas[0] + (semanas - semanas[0]) // semanas_por_barra * semanas_por_barra
+    df_aux = df_aux.groupby(barra, sort=True)[y].sum()
+    # a semana k começa no domingo k * 7 - 4 dias após 1970-01-01
+    inicio = pd.to_datetime(df_aux.index.to_numpy() * 7 - 4, unit='D')
+
+    return pd.DataFrame({x: inicio, y: df_aux.to_numpy()})
+
+def modo_render(pontos, limite=LIMITE_WEBGL):
+    """ render_mode do plotly express para uma figura com 'pontos' pontos """
+    return 'webgl' if pontos > limite else 'svg'
+
+def tamanho_payload(fig):
+    """ Tamanho em bytes do JSON da figura enviado ao navegador """
+    return len(fig.to_json().encode('utf-8'))
@@ -0,0 +1,86 @@
+# ----------------------------------------
+# Índice de filtros da sidebar
+#
+# O dataset limpo é ordenado por Order_Date, então um intervalo de datas vira
+# um intervalo de posições [inicio, fim) encontrado com searchsorted. Para as
+# colunas categóricas da sidebar são mantidos bitmaps (bits empacotados, um por
+# linha) de cada valor: os valores escolhidos de uma coluna são combinados com
+# OR e colunas diferentes com AND, sempre restritos aos bytes do intervalo de
+# datas selecionado.
+import numpy as np
+import pandas as pd
+
+# colunas com bitmap por valor
+COLUNAS_BITMAP = ['Road_traffic_density', 'City', 'Weatherconditions', 'Festival']
+
+# ----------------------------------------
+# Classes
+class FilterIndex:
+    """ Índice construído uma vez por processo sobre o dataset ordenado por data.
+
+        Input: dataframe ordenado por Order_Date com as colunas de COLUNAS_BITMAP
+    """
+
+    def __init__(self, df1, colunas=COLUNAS_BITMAP):
+        datas = df1['Order_Date'].to_numpy()
+        if len(datas) > 1 and (datas[1:] < datas[:-1]).any():
+            raise ValueError('FilterIndex exige o dataframe ordenado por Order_Date')
+
+        self.n = len(datas)
+        self.datas = datas
+        self.bitmaps = {}
+        for col in colunas:
+            serie = df1[col].astype('category')
+            codigos = serie.cat.codes.to_numpy()
+            self.bitmaps[col] = {valor: np.packbits(codigos == i)
+                                 for i, valor in enumerate(serie.cat.categories)}
+
+    def periodo(self):
+        """ Primeira e última data do dataset (datetime.date) """
+        if self.n == 0:
+            return None, None
+
+        return pd.Timestamp(self.datas[0]).date(), pd.Timestamp(self.datas[-1]).date()
+
+    def valores(self, col):
+        """ Valores com bitmap na coluna (na ordem das categorias) """
+        return list(self.bitmaps[col])
+
+    def intervalo(self, inicio=None, fim=None):
+        """ Posições [lo, hi) das linhas com inicio <= Order_Date < fim """
+        lo = 0 if inicio is None else int(np.searchsorted(self.datas, np.datetime64(inicio, 'ns'), side='left'))
+        hi = self.n if fim is None else int(np.searchsorted(self.datas, np.datetime64(fim, 'ns'), side='left'))
+
+        return lo, max(lo, hi)
+
+    def select(self, inicio=None, fim=None, **filtros):
+        """ Seleciona as linhas que atendem ao intervalo de datas e aos filtros categóricos.
+
+            Colunas em que todos os valores foram escolhidos não geram varredura.
+
+            Input: data inicial (inclusiva), data final (exclusiva) e, por coluna
+                   de COLUNAS_BITMAP, a lista de valores aceitos
+            Output: array com as posições das linhas selecionadas
+        """
+        lo, hi = self.intervalo(inicio, fim)
+        b0, b1 = lo // 8, -(-hi // 8)
+
+        combinado = None
+        for col, escolhidos in filtros.items():
+            bitmaps = self.bitmaps[col]
+            escolhidos = set(escolhidos)
+            if escolhidos.issuperset(bitmaps):
+                continue
+
+            coluna = np.zeros(b1 - b0, dtype='uint8')
+            for valor in escolhidos & set(bitmaps):
+                coluna |= bitmaps[valor][b0:b1]
+
+            combinado = coluna if combinado is None else combinado & coluna
+
+        if combinado is None:
+            return np.arange(lo, hi)
+
+        bits = np.unpackbits(combinado)[lo - b0 * 8:hi - b0 * 8]
+
+        return np.flatnonzero(bits) + lo
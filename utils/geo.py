@@ -0,0 +1,82 @@
+# ----------------------------------------
+# Funções geográficas vetorizadas
+import numpy as np
+import pandas as pd
+
+# raio médio da Terra em km (mesmo valor usado pela biblioteca haversine)
+RAIO_TERRA_KM = 6371.0088
+
+# ----------------------------------------
+# Funções
+def haversine_km(lat1, lon1, lat2, lon2):
+    """ Distância de grande círculo entre pares de pontos, calculada em NumPy.
+
+        Equivale a chamar haversine((lat1, lon1), (lat2, lon2)) linha a linha,
+        mas em uma única passada vetorizada.
+
+        Input: arrays de latitude/longitude em graus
+        Output: array float32 com as distâncias em km
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype='float64')) for a in (lat1, lon1, lat2, lon2))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    distancia = 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+
+    return distancia.astype('float32')
+
+def coordenadas_validas(lat, lon):
+    """ Máscara das coordenadas utilizáveis (dentro dos limites e diferentes de 0, 0) """
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+
+    return (np.abs(lat) <= 90) & (np.abs(lon) <= 180) & ~((lat == 0) & (lon == 0))
+
+def agrupar_em_grade(lat, lon, max_celulas=2000):
+    """ Agrupa pontos em uma grade regular de latitude/longitude, no servidor.
+
+        O tamanho da célula se adapta à quantidade de pontos: a grade tem cerca
+        de 4 * sqrt(n) células sobre a área ocupada (limitado a max_celulas), então
+        o payload cresce bem mais devagar que o número de pontos.
+
+        Input: arrays de latitude/longitude, número máximo de células da grade
+        Output: dataframe com lat/lon do centróide de cada célula ocupada e 'n' pontos
+    """
+    validos = coordenadas_validas(lat, lon)
+    lat = np.asarray(lat, dtype='float64')[validos]
+    lon = np.asarray(lon, dtype='float64')[validos]
+    if len(lat) == 0:
+        return pd.DataFrame({'lat': [], 'lon': [], 'n': []})
+
+    lat0, lon0 = lat.min(), lon.min()
+    area = max(lat.max() - lat0, 1e-6) * max(lon.max() - lon0, 1e-6)
+    alvo = int(np.clip(4 * np.sqrt(len(lat)), 1, max_celulas))
+    passo = np.sqrt(area / alvo)
+
+    linha = ((lat - lat0) // passo).astype('int64')
+    coluna = ((lon - lon0) // passo).astype('int64')
+    celula = linha * (coluna.max() + 1) + coluna
+
+    _, inversa, n = np.unique(celula, return_inverse=True, return_counts=True)
+    grade = pd.DataFrame({'lat': np.bincount(inversa, weights=lat) / n,
+                          'lon': np.bincount(inversa, weights=lon) / n,
+                          'n': n})
+
+    return grade
+
+def heatmap_payload(grade):
+    """ Pontos [lat, lon, peso] da grade para o HeatMap do folium, peso normalizado em (0, 1] """
+    if len(grade) == 0:
+        return []
+
+    peso = grade['n'] / grade['n'].max()
+
+    return np.column_stack([grade['lat'].round(5), grade['lon'].round(5), peso.round(4)]).tolist()
+
+def geojson_payload(grade):
+    """ FeatureCollection GeoJSON com um ponto por célula da grade e a contagem em 'n' """
+    features = [{'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': [round(lon, 5), round(lat, 5)]},
+                 'properties': {'n': int(n)}}
+                for lat, lon, n in zip(grade['lat'], grade['lon'], grade['n'])]
+
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,125 @@
+# ----------------------------------------
+# Motor de KPIs das faixas de métricas (st.metric)
+#
+# As páginas declaram os KPIs que exibem; o motor junta todos os que usam o
+# mesmo agrupamento em uma única consulta à fonte (utils.backend) e devolve o
+# valor de cada tile a partir desse resultado compartilhado.
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from utils.aproximado import FRACAO_AMOSTRA, resumo_amostra
+from utils.cubo import ENTREGADOR
+
+# nome: rótulo do tile | coluna/agregacao: o que calcular
+# grupo/valor: opcional, calcula só para as linhas em que grupo == valor
+KPI = namedtuple('KPI', ['nome', 'coluna', 'agregacao', 'grupo', 'valor'], defaults=[None, None])
+
+# ----------------------------------------
+# Funções
+def plano_kpis(kpis):
+    """ Agrupa os KPIs por agrupamento e junta as agregações de cada coluna.
+
+        Input: lista de KPI
+        Output: dicionário grupo -> {coluna: [agregações]} (uma passada por grupo)
+    """
+    plano = {}
+    for kpi in kpis:
+        colunas = plano.setdefault(kpi.grupo, {})
+        agregacoes = colunas.setdefault(kpi.coluna, [])
+        if kpi.agregacao not in agregacoes:
+            agregacoes.append(kpi.agregacao)
+
+    return plano
+
+def _nome(coluna, agregacao):
+    return '{}|{}'.format(coluna, agregacao)
+
+def calcular_kpis(fonte, kpis, casas=2):
+    """ Calcula todos os KPIs declarados com uma consulta por agrupamento.
+
+        Input: fonte filtrada (utils.backend), lista de KPI e casas decimais
+               para arredondamento
+        Output: dicionário nome do KPI -> valor (NaN quando não há dados)
+    """
+    resultados = {}
+    for grupo, colunas in plano_kpis(kpis).items():
+        agregacoes = {_nome(col, agregacao): (col, agregacao)
+                      for col, lista in colunas.items() for agregacao in lista}
+        if grupo is None:
+            resultados[grupo] = fonte.agregar([], agregacoes)
+        else:
+            resultados[grupo] = fonte.agregar([grupo], agregacoes).set_index(grupo)
+
+    valores = {}
+    for kpi in kpis:
+        resultado = resultados[kpi.grupo]
+        if kpi.grupo is None:
+            valor = resultado[_nome(kpi.coluna, kpi.agregacao)].iloc[0]
+        elif kpi.valor in resultado.index:
+            valor = resultado.loc[kpi.valor, _nome(kpi.coluna, kpi.agregacao)]
+        else:
+            valor = np.nan
+
+        # seleção vazia: o DuckDB devolve NULL (None/pd.NA) onde o pandas devolve NaN
+        if pd.isna(valor):
+            valor = np.nan
+        if hasattr(valor, 'item'):
+            valor = valor.item()
+        if isinstance(valor, float):
+            valor = round(valor, casas)
+
+        valores[kpi.nome] = valor
+
+    return valores
+
+def calcular_kpis_aproximados(amostra, esbocos, kpis, fracao=FRACAO_AMOSTRA, casas=2):
+    """ KPIs do modo aproximado, cada um com a sua margem de erro (95%).
+
+        - nunique de Delivery_person_ID: HyperLogLog dos esboços
+        - mean e std: amostra estratificada (uma consulta por grupo e coluna)
+        - demais agregações: calculadas sobre a amostra, sem margem de erro
+
+        Input: fonte amostrada (fonte.amostrar), esboços filtrados
+               (utils.aproximado.Esbocos), lista de KPI, fração amostrada e
+               casas decimais
+        Output: dicionário nome do KPI -> (valor, erro); erro None quando não há margem
+    """
+    resumos, outros = {}, [kpi for kpi in kpis if kpi.agregacao not in ('mean', 'std', 'nunique')]
+    valores = calcular_kpis(amostra, outros, casas) if outros else {}
+    valores = {nome: (valor, None) for nome, valor in valores.items()}
+
+    for kpi in kpis:
+        if kpi.agregacao == 'nunique' and kpi.coluna == ENTREGADOR:
+            total = esbocos.agrupar()
+            if len(total) == 0:
+                valores[kpi.nome] = (np.nan, np.nan)
+            else:
+                valores[kpi.nome] = (int(round(total[ENTREGADOR].iloc[0])),
+                                     int(round(total[ENTREGADOR + '_erro'].iloc[0])))
+            continue
+        if kpi.agregacao == 'nunique':
+            raise ValueError('o modo aproximado só estima nunique de {}'.format(ENTREGADOR))
+        if kpi.agregacao not in ('mean', 'std'):
+            continue
+
+        chave = (kpi.grupo, kpi.coluna)
+        if chave not in resumos:
+            por = [] if kpi.grupo is None else [kpi.grupo]
+            resumo = resumo_amostra(amostra, por, kpi.coluna, fracao)
+            resumos[chave] = resumo if kpi.grupo is None else resumo.set_index(kpi.grupo)
+        resumo = resumos[chave]
+
+        if kpi.grupo is None:
+            linha = resumo.iloc[0]
+        elif kpi.valor in resumo.index:
+            linha = resumo.loc[kpi.valor]
+        else:
+            valores[kpi.nome] = (np.nan, np.nan)
+            continue
+
+        valores[kpi.nome] = (round(float(linha[kpi.agregacao]), casas),
+                             round(float(linha[kpi.agregacao + '_erro']), casas))
+
+    return valores
@@ -0,0 +1,156 @@
+# ----------------------------------------
+# Execução particionada em vários processos
+#
+# Na carga a frio o trabalho é dividido em partições independentes:
+# - limpeza: o csv é dividido em faixas de bytes (alinhadas a quebras de
+#   linha) e cada processo lê, limpa e grava a sua faixa;
+# - cubo: o snapshot é particionado por semana (utils.particoes), então o
+#   período é dividido em faixas de semanas inteiras; cada processo lê só as
+#   partições da sua faixa (read_periodo), monta o cubo dela e os cubos
+#   parciais são juntados com Cubo.juntar (contagens, somas, somas dos
+#   quadrados, mínimos, máximos e pares distintos de entregadores são todos
+#   mergeáveis).
+#
+# DASHBOARD_PROCESSOS define o número de processos (padrão: os núcleos da
+# máquina; 1 desliga o modo particionado).
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.cubo import DIMENSOES, ENTREGADOR, MEDIDAS, Cubo
+from utils.dados import COLUNAS_CSV, clean_code, resumo_bloco
+from utils.particoes import particoes, read_periodo
+from utils.snapshot import write_snapshot_blocos
+
+# ----------------------------------------
+# Funções
+def processos_configurados():
+    """ Número de processos do modo particionado (DASHBOARD_PROCESSOS ou os núcleos da máquina) """
+    valor = os.environ.get('DASHBOARD_PROCESSOS', '').strip()
+
+    return max(1, int(valor)) if valor else (os.cpu_count() or 1)
+
+def _executor(processos):
+    # spawn: o servidor do Streamlit tem várias threads, e fork com threads ativas não é seguro
+    return ProcessPoolExecutor(processos, mp_context=multiprocessing.get_context('spawn'))
+
+def faixas_de_bytes(path, bytes_por_faixa):
+    """ Divide o corpo do csv em faixas de ~bytes_por_faixa que começam e terminam
+        em quebras de linha (o csv não tem quebras de linha dentro de campos)
+
+        Input: caminho do csv, tamanho aproximado de cada faixa
+        Output: (linha de cabeçalho em bytes, lista de (início, fim))
+    """
+    faixas = []
+    with open(path, 'rb') as arquivo:
+        cabecalho = arquivo.readline()
+        inicio = arquivo.tell()
+        tamanho = os.fstat(arquivo.fileno()).st_size
+        while inicio < tamanho:
+            arquivo.seek(min(inicio + bytes_por_faixa, tamanho))
+            arquivo.readline()
+            fim = min(arquivo.tell(), tamanho)
+            faixas.append((inicio, fim))
+            inicio = fim
+
+    return cabecalho, faixas
+
+def _bytes_por_linha(path, amostra=1000):
+    with open(path, 'rb') as arquivo:
+        arquivo.readline()
+        linhas = [arquivo.readline() for _ in range(amostra)]
+
+    linhas = [linha for linha in linhas if linha]
+    return sum(map(len, linhas)) / max(len(linhas), 1)
+
+def _limpar_faixa(path, cabecalho, inicio, fim, destino):
+    """ Processo: lê uma faixa de bytes do csv, limpa e grava em 'destino' """
+    with open(path, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        dados = arquivo.read(fim - inicio)
+
+    relatorio = {}
+    bloco = clean_code(pd.read_csv(io.BytesIO(cabecalho + dados), usecols=COLUNAS_CSV), relatorio)
+    if len(bloco) == 0:
+        return {'relatorio': relatorio, 'linhas': 0, 'resumo': None, 'destino': None}
+
+    write_snapshot_blocos([bloco], destino, (), particionar=False)
+
+    return {'relatorio': relatorio, 'linhas': len(bloco), 'resumo': resumo_bloco(bloco), 'destino': destino}
+
+def limpar_em_paralelo(path, prefixo_tmp, linhas_por_bloco, processos, progresso=None):
+    """ Limpa o csv em faixas de ~linhas_por_bloco linhas, em paralelo.
+
+        Cada faixa vira um Parquet temporário '<prefixo_tmp>.<n>.tmp'; no máximo
+        'processos' faixas ficam em memória ao mesmo tempo. Se alguma faixa
+        falhar, os temporários já gravados são apagados.
+
+        Input: caminho do csv, prefixo dos temporários, linhas por faixa,
+               processos, função progresso(fase, feito, total) opcional
+        Output: lista, na ordem do csv, de dicionários com 'relatorio',
+                'linhas', 'resumo' (ver dados.resumo_bloco) e 'destino'
+    """
+    cabecalho, faixas = faixas_de_bytes(path, max(1, int(linhas_por_bloco * _bytes_por_linha(path))))
+    destinos = ['{}.{}.tmp'.format(prefixo_tmp, i) for i in range(len(faixas))]
+    parciais = [None] * len(faixas)
+
+    try:
+        with _executor(min(processos, len(faixas))) as executor:
+            futuros = {executor.submit(_limpar_faixa, path, cabecalho, inicio, fim, destino): i
+                       for i, ((inicio, fim), destino) in enumerate(zip(faixas, destinos))}
+            for feitos, futuro in enumerate(as_completed(futuros), start=1):
+                parciais[futuros[futuro]] = futuro.result()
+                if progresso is not None:
+                    progresso('limpeza', feitos, len(faixas))
+    except BaseException:
+        for destino in destinos:
+            if os.path.exists(destino):
+                os.remove(destino)
+        raise
+
+    return parciais
+
+def _cubo_parcial(parquet_path, inicio, fim):
+    """ Processo: cubo do período [inicio, fim) do snapshot """
+    return Cubo.from_frame(read_periodo(parquet_path, inicio, fim, DIMENSOES + MEDIDAS + [ENTREGADOR]))
+
+def _dividir_periodos(df_particoes, partes):
+    """ Períodos [inicio, fim) contíguos, de semanas inteiras, com ~o mesmo
+        número de linhas cada (None nas pontas: sem limite)
+
+        Input: resumo das partições (utils.particoes.particoes), número de partes
+        Output: lista de (inicio, fim)
+    """
+    total = df_particoes['linhas'].sum()
+    periodos, inicio, linhas = [], None, 0
+    for semana, linhas_semana in zip(df_particoes['semana'], df_particoes['linhas']):
+        linhas += linhas_semana
+        if linhas >= total * (len(periodos) + 1) / partes:
+            # a semana seguinte começa no domingo (semana + 1) * 7 - 4 dias após 1970-01-01
+            fim = pd.Timestamp((int(semana) + 1) * 7 - 4, unit='D')
+            periodos.append((inicio, fim))
+            inicio = fim
+
+    if periodos:
+        periodos[-1] = (periodos[-1][0], None)
+
+    return periodos
+
+def montar_cubo(parquet_path, processos):
+    """ Cubo do snapshot montado por faixas de datas em paralelo e juntado.
+
+        Input: caminho do snapshot, número de processos
+        Output: Cubo (igual ao de Cubo.from_frame sobre o snapshot inteiro)
+    """
+    periodos = _dividir_periodos(particoes(parquet_path), processos)
+    if len(periodos) <= 1:
+        return _cubo_parcial(parquet_path, None, None)
+
+    with _executor(min(processos, len(periodos))) as executor:
+        parciais = list(executor.map(_cubo_parcial, [parquet_path] * len(periodos),
+                                     *zip(*periodos)))
+
+    return Cubo.juntar(parciais)
@@ -0,0 +1,134 @@
+# ----------------------------------------
+# Partições semanais do snapshot
+#
+# O snapshot é gravado ordenado por Order_Date e com os row groups alinhados às
+# semanas (domingo a sábado, como o '%U' do strftime): nenhum row group mistura
+# duas semanas. Cada partição é identificada por uma chave inteira,
+#
+#   semana = (dias desde 1970-01-01 + 4) // 7      (1970-01-01 foi uma quinta)
+#
+# e os metadados do Parquet já guardam, por row group, o número de linhas e o
+# mínimo/máximo de cada coluna - o resumo de cada partição sai do rodapé do
+# arquivo, sem ler os dados. Com isso:
+#
+# - read_periodo lê só as partições que cruzam o período e apara as das pontas
+#   (usado pela montagem do cubo em paralelo, utils.paralelo, em que cada
+#   processo lê o seu período);
+# - o DuckDB descarta sozinho os row groups fora do filtro de datas;
+# - os gráficos semanais agrupam pela semana inteira (semana_do_ano), sem
+#   formatar datas como texto.
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# colunas com mínimo/máximo no resumo das partições
+COLUNAS_RESUMO = ['Time_taken(min)', 'distance']
+
+# ----------------------------------------
+# Funções
+def _dias(datas):
+    return np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+
+def chave_semana(datas):
+    """ Chave inteira da partição semanal de cada data (única entre anos)
+
+        Input: array/Series de datas
+        Output: array int64
+    """
+    return (_dias(datas) + 4) // 7
+
+def semana_do_ano(datas):
+    """ Número da semana no ano com domingo como primeiro dia, igual a
+        int(strftime('%U')), calculado com inteiros
+
+        Input: Series de datas
+        Output: Series int8
+    """
+    datas = pd.Series(datas)
+    domingo_zero = (datas.dt.dayofweek + 1) % 7
+
+    return ((datas.dt.dayofyear - 1 + 7 - domingo_zero) // 7).astype('int8')
+
+def fatias_semanais(df1):
+    """ Divide um dataframe ordenado por Order_Date nas suas semanas
+
+        Input: dataframe ordenado por data
+        Output: gerador de dataframes, um por semana (na ordem)
+    """
+    semanas = chave_semana(df1['Order_Date'])
+    cortes = np.flatnonzero(semanas[1:] != semanas[:-1]) + 1
+    for inicio, fim in zip(np.concatenate([[0], cortes]), np.concatenate([cortes, [len(df1)]])):
+        if fim > inicio:
+            yield df1.iloc[inicio:fim]
+
+def particoes(path):
+    """ Resumo das partições semanais do snapshot, lido só do rodapé do Parquet
+
+        Input: caminho do parquet
+        Output: dataframe ordenado por semana com 'semana', 'inicio', 'fim'
+                (primeira e última data), 'linhas', 'primeira' (posição da
+                primeira linha), 'row_groups' e '<coluna>_min'/'<coluna>_max'
+                de COLUNAS_RESUMO
+    """
+    metadata = pq.ParquetFile(path).metadata
+    nomes = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+
+    registros, primeira = [], 0
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        registro = {'row_group': i, 'linhas': row_group.num_rows, 'primeira': primeira}
+        for col in ['Order_Date'] + COLUNAS_RESUMO:
+            if col not in nomes:
+                continue
+            estatisticas = row_group.column(nomes.index(col)).statistics
+            registro[col + '_min'] = estatisticas.min if estatisticas is not None else None
+            registro[col + '_max'] = estatisticas.max if estatisticas is not None else None
+        registros.append(registro)
+        primeira += row_group.num_rows
+
+    df_aux = pd.DataFrame(registros)
+    if len(df_aux) == 0:
+        return pd.DataFrame(columns=['semana', 'inicio', 'fim', 'linhas', 'primeira', 'row_groups'])
+
+    df_aux['inicio'] = pd.to_datetime(df_aux.pop('Order_Date_min'))
+    df_aux['fim'] = pd.to_datetime(df_aux.pop('Order_Date_max'))
+    df_aux['semana'] = chave_semana(df_aux['inicio'])
+
+    agregacoes = {'inicio': ('inicio', 'min'), 'fim': ('fim', 'max'), 'linhas': ('linhas', 'sum'),
+                  'primeira': ('primeira', 'min'), 'row_groups': ('row_group', list)}
+    for col in COLUNAS_RESUMO:
+        if col + '_min' in df_aux.columns:
+            agregacoes[col + '_min'] = (col + '_min', 'min')
+            agregacoes[col + '_max'] = (col + '_max', 'max')
+
+    return df_aux.groupby('semana', sort=True).agg(**agregacoes).reset_index()
+
+def read_periodo(path, inicio=None, fim=None, colunas=None):
+    """ Lê do snapshot só as linhas com inicio <= Order_Date < fim: as partições
+        inteiramente fora do período nem são lidas e as duas das pontas são
+        aparadas por busca binária (o snapshot é ordenado por data)
+
+        Input: caminho do parquet, data inicial, data final, colunas (None = todas)
+        Output: dataframe
+    """
+    df_particoes = particoes(path)
+    selecionadas = np.ones(len(df_particoes), dtype=bool)
+    if inicio is not None:
+        selecionadas &= (df_particoes['fim'] >= pd.Timestamp(inicio)).to_numpy()
+    if fim is not None:
+        selecionadas &= (df_particoes['inicio'] < pd.Timestamp(fim)).to_numpy()
+
+    row_groups = [i for grupo in df_particoes.loc[selecionadas, 'row_groups'] for i in grupo]
+    if not row_groups and len(df_particoes):
+        # período sem dados: lê uma partição e apara tudo, mantendo os tipos (categorias)
+        row_groups = df_particoes['row_groups'].iloc[0][:1]
+    lidas = None if colunas is None else list(dict.fromkeys(list(colunas) + ['Order_Date']))
+    arquivo = pq.ParquetFile(path, memory_map=True)
+    df1 = arquivo.read_row_groups(row_groups, columns=lidas).to_pandas(self_destruct=True, split_blocks=True)
+
+    datas = df1['Order_Date'].to_numpy()
+    lo = 0 if inicio is None else int(np.searchsorted(datas, np.datetime64(inicio, 'ns'), side='left'))
+    hi = len(df1) if fim is None else int(np.searchsorted(datas, np.datetime64(fim, 'ns'), side='left'))
+    df1 = df1.iloc[lo:max(lo, hi)].reset_index(drop=True)
+
+    return df1 if colunas is None else df1.loc[:, list(colunas)]
@@ -0,0 +1,143 @@
+# ----------------------------------------
+# Percentis por grupo (acompanhamento de SLA)
+#
+# Média e desvio escondem a cauda: o SLA é medido pelo p90/p99 do tempo de
+# entrega. Quantis exatos por grupo exigem ordenar todas as linhas filtradas a
+# cada rerun; aqui cada chave dia x trânsito x cidade x clima guarda um
+# t-digest (utils.aproximado) do tempo de entrega e outro das avaliações,
+# montados uma vez por processo (dados.load_percentis). Para qualquer período
+# e agrupamento os digests das chaves são juntados - o custo depende do
+# número de chaves do período, não do número de pedidos.
+#
+# O erro exibido é o do t-digest: a distância até os centróides vizinhos do
+# percentil. Com tempos inteiros e poucas notas distintas por chave os digests
+# costumam guardar cada valor, e o erro fica em zero.
+import numpy as np
+import pandas as pd
+
+from utils.aproximado import COMPRESSAO, digests_por_chave, fatiar_digests, grupos_de_chaves, quantis_por_grupo
+from utils.cubo import DERIVADAS, fatia_de_datas
+
+# chave dos digests: os filtros da sidebar e os agrupamentos dos gráficos
+CHAVES = ['Order_Date', 'Road_traffic_density', 'City', 'Weatherconditions']
+MEDIDAS = ['Time_taken(min)', 'Delivery_person_Ratings']
+
+# tempo: a cauda lenta; avaliações: a cauda das notas baixas
+QUANTIS_TEMPO = (0.5, 0.9, 0.99)
+QUANTIS_AVALIACAO = (0.01, 0.1, 0.5)
+
+# rótulo -> colunas de agrupamento oferecidas nas páginas
+AGRUPAMENTOS = {
+    'Cidade': ['City'],
+    'Trânsito': ['Road_traffic_density'],
+    'Clima': ['Weatherconditions'],
+    'Cidade e trânsito': ['City', 'Road_traffic_density'],
+    'Semana': ['week_of_year'],
+}
+
+# ----------------------------------------
+# Classes
+class PercentisGrupos:
+    """ t-digests de cada medida por chave.
+
+        chaves: dataframe ordenado por CHAVES com CHAVES, DERIVADAS e 'n' (pedidos da chave)
+        digests: medida -> (centroides, extremos) de aproximado.digests_por_chave
+    """
+
+    def __init__(self, chaves, digests):
+        for col, derivar in DERIVADAS.items():
+            if col not in chaves.columns:
+                chaves[col] = derivar(chaves)
+
+        self.chaves = chaves
+        self.digests = digests
+
+    def __len__(self):
+        return len(self.chaves)
+
+    @classmethod
+    def from_fonte(cls, fonte, medidas=MEDIDAS, compressao=COMPRESSAO):
+        """ Monta os digests com uma agregação da fonte por medida (contagem de
+            cada valor por chave), sem trazer as linhas para a memória
+
+            Input: fonte de utils.backend, medidas, compressão do t-digest
+            Output: PercentisGrupos
+        """
+        chaves = fonte.agregar(CHAVES, {'n': (CHAVES[0], 'size')})
+        indice = pd.MultiIndex.from_frame(chaves[CHAVES])
+
+        digests = {}
+        for medida in medidas:
+            df_aux = fonte.agregar(CHAVES + [medida], {'n': (medida, 'size')})
+            df_aux = df_aux.loc[df_aux[medida].notna()]
+            chave = indice.get_indexer(pd.MultiIndex.from_frame(df_aux[CHAVES]))
+            digests[medida] = digests_por_chave(chave, df_aux[medida], df_aux['n'], len(chaves), compressao)
+
+        return cls(chaves, digests)
+
+    def filtrar(self, inicio=None, fim=None, **filtros):
+        """ Mantém só as chaves dentro do período [inicio, fim) e dos filtros
+            (mesmo contrato de Cubo.filtrar, restrito às colunas de CHAVES)
+        """
+        lo, hi = fatia_de_datas(self.chaves['Order_Date'], inicio, fim)
+        chaves = self.chaves.iloc[lo:hi]
+        mascara = np.ones(hi - lo, dtype=bool)
+        for col, escolhidos in filtros.items():
+            if col not in CHAVES:
+                raise ValueError('os percentis só filtram por {}, recebido {!r}'.format(CHAVES, col))
+            mascara &= chaves[col].isin(list(escolhidos)).to_numpy()
+
+        digests = {medida: fatiar_digests(centroides, extremos, lo, hi, mascara)
+                   for medida, (centroides, extremos) in self.digests.items()}
+
+        return PercentisGrupos(chaves.loc[mascara].reset_index(drop=True), digests)
+
+    def quantis(self, medida, quantis, por=()):
+        """ Percentis de uma medida por grupo, juntando os digests das chaves
+
+            Input: medida, lista de quantis (ex.: [0.5, 0.9]) e colunas de
+                   agrupamento (de CHAVES ou DERIVADAS; vazia = total geral)
+            Output: dataframe com 'por', 'n' e, por quantil, 'p<nn>' e 'p<nn>_erro'
+        """
+        grupo, df_aux = grupos_de_chaves(self.chaves, por)
+        df_aux['n'] = np.bincount(grupo, weights=self.chaves['n'].to_numpy(), minlength=len(df_aux)).astype('int64')
+        centroides, extremos = self.digests[medida]
+
+        return quantis_por_grupo(grupo, df_aux, centroides, extremos, list(quantis))
+
+# ----------------------------------------
+# Funções
+def percentis_por_grupo(percentis, medida, por, quantis):
+    """ Tabela de percentis de uma medida por grupo, na ordem dos rótulos
+
+        Input: PercentisGrupos filtrado, medida, colunas de agrupamento, quantis
+        Output: dataframe 'por', 'n', 'p<nn>' e 'p<nn>_erro' (grupos sem pedidos ficam de fora)
+    """
+    df_aux = percentis.quantis(medida, quantis, por)
+
+    return df_aux.loc[df_aux['n'] > 0].reset_index(drop=True)
+
+def grafico_percentis(df_aux, por, quantis, titulo):
+    """ Um traço por percentil com o erro do t-digest como barra de erro: barras
+        agrupadas por grupo, ou linhas quando o agrupamento é por semana
+
+        Input: tabela de percentis_por_grupo, colunas de agrupamento, quantis,
+               título do eixo y
+        Output: figura
+    """
+    import plotly.graph_objects as go
+
+    rotulos = df_aux[list(por)].astype(str).agg(' / '.join, axis=1) if len(df_aux) else []
+    linhas = list(por) == ['week_of_year']
+
+    fig = go.Figure()
+    for q in quantis:
+        nome = 'p{:.0f}'.format(q * 100)
+        erro = dict(type='data', array=df_aux[nome + '_erro'])
+        if linhas:
+            fig.add_trace(go.Scatter(name=nome, x=rotulos, y=df_aux[nome], error_y=erro, mode='lines+markers'))
+        else:
+            fig.add_trace(go.Bar(name=nome, x=rotulos, y=df_aux[nome], error_y=erro))
+    fig.update_layout(barmode='group', yaxis_title=titulo, xaxis_title=' / '.join(por))
+
+    return fig
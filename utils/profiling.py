@@ -0,0 +1,224 @@
+# ----------------------------------------
+# Perfil de execução das páginas (opcional)
+#
+# Mede tempo, linhas e pico de memória de cada etapa do rerun (leitura,
+# clean_code, filtros, cada gráfico e o render) e mostra o resultado em um
+# painel de debug na sidebar. Fica desligado por padrão; liga com a variável
+# de ambiente DASHBOARD_PROFILE=1 ou com ?profile=1 na URL. Com
+# DASHBOARD_PROFILE_LOG=<arquivo> cada rerun também é gravado em JSON lines.
+#
+# Desligado, etapa() devolve um contexto vazio e medir() chama a função direto.
+# plotar() mede o render de uma figura e registra o tamanho do seu JSON.
+#
+# O tracemalloc é do processo inteiro: ele fica ligado só enquanto algum rerun
+# perfilado está rodando (iniciar liga, painel desliga) e o pico de memória de
+# uma etapa inclui o que outras sessões alocaram no mesmo intervalo. Etapas
+# que se sobrepuseram a outro rerun perfilado são marcadas como pico compartilhado.
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils.figuras import tamanho_payload
+
+# cada sessão do Streamlit roda o script na sua própria thread
+_local = threading.local()
+
+# reruns perfilados em andamento (thread -> Perfil), protegidos pela trava;
+# _entradas conta os reruns que já ligaram o rastreio, para detectar sobreposição
+_trava = threading.Lock()
+_rastreando = {}
+_entradas = 0
+# o tracemalloc foi ligado por este módulo (e não, por exemplo, por PYTHONTRACEMALLOC)
+_ligado_aqui = False
+
+# ----------------------------------------
+# Classes
+class Perfil:
+    """ Registros das etapas de um rerun de uma página """
+
+    def __init__(self, pagina, ativo):
+        self.pagina = pagina
+        self.ativo = ativo
+        self.registros = []
+        # tabelas informativas mostradas no painel (ex.: memória por coluna)
+        self.tabelas = {}
+        # etapas abertas; cada uma guarda a memória inicial e o maior pico visto
+        self._pilha = []
+
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas=None):
+        """ Mede o bloco; o dicionário devolvido aceita 'linhas' preenchido depois.
+
+            Etapas podem ser aninhadas (ex.: clean_code dentro de load_data num
+            cache miss): antes de zerar o pico do tracemalloc, o pico da etapa
+            externa é guardado na pilha, e ao sair o pico interno é repassado.
+        """
+        registro = {'etapa': nome, 'linhas': linhas}
+        entradas = _entradas
+        compartilhado = _outros_perfis()
+        memoria, pico = tracemalloc.get_traced_memory()
+        if self._pilha:
+            self._pilha[-1]['pico'] = max(self._pilha[-1]['pico'], pico)
+        tracemalloc.reset_peak()
+        quadro = {'base': memoria, 'pico': memoria}
+        self._pilha.append(quadro)
+
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['segundos'] = time.perf_counter() - inicio
+            quadro['pico'] = max(quadro['pico'], tracemalloc.get_traced_memory()[1])
+            self._pilha.pop()
+            if self._pilha:
+                self._pilha[-1]['pico'] = max(self._pilha[-1]['pico'], quadro['pico'])
+            registro['pico_mb'] = (quadro['pico'] - quadro['base']) / 2 ** 20
+            registro['pico_compartilhado'] = compartilhado or _outros_perfis() or _entradas != entradas
+            self.registros.append(registro)
+
+# ----------------------------------------
+# Funções
+def _ligado():
+    if os.environ.get('DASHBOARD_PROFILE', '') not in ('', '0'):
+        return True
+
+    return st.experimental_get_query_params().get('profile', ['0'])[0] not in ('', '0')
+
+def _outros_perfis():
+    """ Se outro rerun perfilado está em andamento (o pico do tracemalloc é compartilhado) """
+    with _trava:
+        return any(thread is not threading.current_thread() for thread in _rastreando)
+
+def _ligar_rastreio(perfil):
+    """ Registra o rerun perfilado desta thread e liga o tracemalloc, se preciso """
+    global _entradas, _ligado_aqui
+
+    with _trava:
+        _rastreando[threading.current_thread()] = perfil
+        _entradas += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _ligado_aqui = True
+
+def _desligar_rastreio():
+    """ Tira o rerun desta thread (e os de threads já encerradas, cujo rerun foi
+        interrompido antes do painel) e desliga o tracemalloc quando não sobra nenhum
+    """
+    global _ligado_aqui
+
+    with _trava:
+        _rastreando.pop(threading.current_thread(), None)
+        for thread in [thread for thread in _rastreando if not thread.is_alive()]:
+            del _rastreando[thread]
+        if not _rastreando and _ligado_aqui:
+            tracemalloc.stop()
+            _ligado_aqui = False
+
+def iniciar(pagina):
+    """ Começa o perfil do rerun atual da página (chamar logo após set_page_config)
+
+        Um rerun anterior desta thread interrompido antes do painel (ex.: por
+        st.stop ou por um novo rerun) é encerrado aqui.
+
+        Input: nome da página
+        Output: Perfil
+    """
+    _desligar_rastreio()
+    perfil = Perfil(pagina, _ligado())
+    if perfil.ativo:
+        _ligar_rastreio(perfil)
+    _local.perfil = perfil
+
+    return perfil
+
+def perfil_atual():
+    """ Perfil do rerun em execução nesta thread (None fora de uma página) """
+    return getattr(_local, 'perfil', None)
+
+def etapa(nome, linhas=None):
+    """ Contexto que mede uma etapa, ou um contexto vazio com o perfil desligado.
+
+        Uso:
+            with etapa('filtro') as registro:
+                df1 = ...
+                registro['linhas'] = len(df1)
+    """
+    perfil = perfil_atual()
+    if perfil is None or not perfil.ativo:
+        return contextlib.nullcontext({})
+
+    return perfil.etapa(nome, linhas)
+
+def medir(nome, funcao, *args, **kwargs):
+    """ Chama funcao(*args, **kwargs) medindo a etapa; linhas = tamanho do primeiro argumento """
+    perfil = perfil_atual()
+    if perfil is None or not perfil.ativo:
+        return funcao(*args, **kwargs)
+
+    linhas = len(args[0]) if args and hasattr(args[0], '__len__') else None
+    with perfil.etapa(nome, linhas):
+        return funcao(*args, **kwargs)
+
+def plotar(nome, fig, **kwargs):
+    """ st.plotly_chart(fig, **kwargs) medido como a etapa 'render <nome>'; com o
+        perfil ligado o registro também traz o tamanho do JSON da figura (payload_kb)
+    """
+    perfil = perfil_atual()
+    if perfil is None or not perfil.ativo:
+        return st.plotly_chart(fig, **kwargs)
+
+    payload_kb = tamanho_payload(fig) / 1024
+    with perfil.etapa('render ' + nome) as registro:
+        registro['payload_kb'] = payload_kb
+        return st.plotly_chart(fig, **kwargs)
+
+def anexar(nome, funcao, *args, **kwargs):
+    """ Guarda a tabela funcao(*args, **kwargs) para o painel; com o perfil
+        desligado a função nem é chamada.
+
+        Input: título da tabela, função que devolve um dataframe e os seus argumentos
+        Output: None
+    """
+    perfil = perfil_atual()
+    if perfil is not None and perfil.ativo:
+        perfil.tabelas[nome] = funcao(*args, **kwargs)
+
+    return None
+
+def painel():
+    """ Mostra o painel de debug na sidebar, grava o log, se configurado, e
+        encerra o perfil do rerun (desligando o tracemalloc se for o último)
+    """
+    perfil = perfil_atual()
+    if perfil is None or not perfil.ativo:
+        return None
+    _desligar_rastreio()
+
+    df_perfil = pd.DataFrame(perfil.registros, columns=['etapa', 'segundos', 'linhas', 'pico_mb',
+                                                        'pico_compartilhado', 'payload_kb'])
+    with st.sidebar.expander('Debug - perfil do rerun', expanded=True):
+        st.metric('Tempo total das etapas', '{:.3f}s'.format(df_perfil['segundos'].sum()))
+        st.dataframe(df_perfil.round({'segundos': 4, 'pico_mb': 2, 'payload_kb': 1}), hide_index=True)
+        st.caption('pico_mb é medido no processo inteiro: inclui o que outras sessões alocaram durante '
+                   'a etapa. pico_compartilhado marca as etapas que rodaram junto com outro rerun '
+                   'perfilado, cujos picos não valem para esta sessão.')
+        for nome, tabela in perfil.tabelas.items():
+            st.caption(nome)
+            st.dataframe(tabela, hide_index=True)
+
+    log_path = os.environ.get('DASHBOARD_PROFILE_LOG')
+    if log_path:
+        registro = {'data': datetime.now().isoformat(timespec='seconds'), 'pagina': perfil.pagina,
+                    'etapas': perfil.registros,
+                    'tabelas': {nome: tabela.to_dict('records') for nome, tabela in perfil.tabelas.items()}}
+        with open(log_path, 'a') as arquivo:
+            arquivo.write(json.dumps(registro, default=str) + '\n')
+
+    return None
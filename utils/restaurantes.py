@@ -0,0 +1,126 @@
+# ----------------------------------------
+# Gráficos e métricas da Visão Restaurantes
+#
+# Funções puras (dados -> figura/tabela), usadas pela página e pelos benchmarks
+# sem precisar de um servidor Streamlit. O plotly (pesado na carga a frio) só
+# é importado pelos gráficos que o usam.
+from functools import partial
+
+import numpy as np
+
+from utils.espacial import faixa_distancia, rotulos_faixas
+from utils.kpi import KPI, calcular_kpis
+
+# colunas lidas do snapshot pela página
+# (com o filtro por raio o cubo é montado das linhas, então as dimensões dele entram)
+COLUNAS = ['Order_Date', 'Road_traffic_density', 'Delivery_person_ID', 'Festival',
+           'Time_taken(min)', 'distance', 'City', 'Type_of_order', 'Weatherconditions']
+
+# KPIs da faixa de métricas - calculados juntos pelo motor de KPIs
+KPIS = [
+    KPI('Entregadores', 'Delivery_person_ID', 'nunique'),
+    KPI('Distância Média', 'distance', 'mean'),
+    KPI('Tempo Festivais', 'Time_taken(min)', 'mean', grupo='Festival', valor='Yes'),
+    KPI('Desvio Festivais', 'Time_taken(min)', 'std', grupo='Festival', valor='Yes'),
+    KPI('Tempo S/ Festivais', 'Time_taken(min)', 'mean', grupo='Festival', valor='No'),
+    KPI('Desvio S/ Festivais', 'Time_taken(min)', 'std', grupo='Festival', valor='No'),
+]
+
+# ----------------------------------------
+# Funções
+def tempo_cidade_media(cubo):
+    import plotly.graph_objects as go
+
+    avg_distance = cubo.agrupar(['City'], medidas=['distance']).rename(columns={'distance_mean':'distance'})
+    fig = go.Figure( data=[go.Pie(labels=avg_distance['City'], values=avg_distance['distance'], pull=[0,0.15,0])])
+
+    return fig
+
+def tempo_cidade_desvio(cubo):
+    import plotly.graph_objects as go
+
+    df_3 = cubo.agrupar(['City'], medidas=['Time_taken(min)'])
+    df_3 = df_3.rename(columns={'Time_taken(min)_mean':'avg_time', 'Time_taken(min)_std':'std_time'})
+
+    fig = go.Figure()
+    fig.add_trace( go.Bar( name='Control',x=df_3['City'],y=df_3['avg_time'],error_y=dict( type='data', array=df_3['std_time'])))
+    fig.update_layout(barmode='group')
+
+    return fig
+
+def avg_std_cidade_trafego(cubo):
+    import plotly.express as px
+
+    df_5 = cubo.agrupar(['City','Road_traffic_density'], medidas=['Time_taken(min)'])
+    df_5 = df_5.rename(columns={'Time_taken(min)_mean':'avg_time', 'Time_taken(min)_std':'std_time'})
+    # categorias sem pedidos (ex.: cidades fora do raio) viram setores de peso zero no sunburst
+    df_5 = df_5.astype({'City': str, 'Road_traffic_density': str})
+    fig = px.sunburst(df_5, path=['City', 'Road_traffic_density'], values='avg_time',
+          color='std_time', color_continuous_scale='RdBu',
+          color_continuous_midpoint=np.average(df_5['std_time']) )
+
+    return fig
+
+def distribuicao_distancia(cubo):
+    df_4 = cubo.agrupar(['City','Type_of_order'], medidas=['Time_taken(min)'])
+    df_4 = df_4.rename(columns={'Time_taken(min)_mean':'avg_time', 'Time_taken(min)_std':'std_time'})
+    df_4 = df_4.loc[:, ['City','Type_of_order','avg_time','std_time']]
+    
+    return df_4
+
+def tempo_por_faixa(fonte):
+    """ Tempo de entrega por faixa de distância (utils.espacial.FAIXAS_KM)
+
+        Input: fonte filtrada
+        Output: dataframe faixa, pedidos, avg_time, std_time, p50_time e p90_time,
+                uma linha por faixa (faixas sem pedidos ficam com zero pedidos)
+    """
+    df_aux = fonte.linhas(['distance', 'Time_taken(min)'])
+    df_aux['faixa'] = faixa_distancia(df_aux['distance'].to_numpy())
+    grupos = df_aux.groupby('faixa', observed=False)['Time_taken(min)']
+
+    df_faixas = grupos.agg(pedidos='size', avg_time='mean', std_time='std')
+    df_faixas['p50_time'] = grupos.quantile(0.5)
+    df_faixas['p90_time'] = grupos.quantile(0.9)
+
+    return df_faixas.reindex(rotulos_faixas()).rename_axis('faixa').reset_index()
+
+def grafico_faixas(df_faixas):
+    """ Barras do tempo médio por faixa de distância, com o desvio como barra de erro
+
+        Input: tabela de tempo_por_faixa
+        Output: figura
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace( go.Bar( name='Tempo médio',x=df_faixas['faixa'],y=df_faixas['avg_time'],
+                           error_y=dict( type='data', array=df_faixas['std_time'])))
+    fig.add_trace( go.Scatter( name='p90',x=df_faixas['faixa'],y=df_faixas['p90_time'], mode='markers'))
+
+    return fig
+
+def percentis_tempo(esbocos, quantis=(0.5, 0.9, 0.99)):
+    """ Percentis do tempo de entrega do período pelos t-digests dos esboços
+
+        Input: esboços filtrados (utils.aproximado.Esbocos), quantis
+        Output: dicionário rótulo -> (valor, erro)
+    """
+    df_aux = esbocos.quantis(list(quantis))
+    valores = {}
+    for q in quantis:
+        nome = 'p{:.0f}'.format(q * 100)
+        valores['Tempo ' + nome] = ((df_aux[nome].iloc[0], df_aux[nome + '_erro'].iloc[0]) if len(df_aux)
+                                    else (np.nan, np.nan))
+
+    return valores
+
+# artefatos exportados por utils.exportar: nome -> (função, entrada)
+ARTEFATOS = {
+    'kpis': (partial(calcular_kpis, kpis=KPIS), 'fonte'),
+    'tempo_cidade_media': (tempo_cidade_media, 'cubo'),
+    'tempo_cidade_desvio': (tempo_cidade_desvio, 'cubo'),
+    'avg_std_cidade_trafego': (avg_std_cidade_trafego, 'cubo'),
+    'distribuicao_distancia': (distribuicao_distancia, 'cubo'),
+    'tempo_por_faixa': (tempo_por_faixa, 'fonte'),
+}
@@ -0,0 +1,169 @@
+# ----------------------------------------
+# Sidebar compartilhada pelas páginas
+from datetime import date, timedelta
+
+import streamlit as st
+
+# data final padrão do filtro de período
+DATA_PADRAO = date(2022, 4, 13)
+
+# chave do st.session_state com o estado do modo aproximado
+CHAVE_APROXIMADO = 'modo_aproximado'
+
+# filtro por raio: chaves do st.session_state, raio padrão e restaurantes listados
+CHAVE_RAIO = 'filtro_raio'
+CHAVE_CENTRO = 'raio_centro'
+CHAVE_KM = 'raio_km'
+CHAVE_LAT = 'raio_lat'
+CHAVE_LON = 'raio_lon'
+RAIO_PADRAO_KM = 5
+LIMITE_RESTAURANTES = 200
+# opção do centro para digitar latitude e longitude
+OUTRO_PONTO = 'ponto'
+
+# ----------------------------------------
+# Funções
+@st.cache_resource(show_spinner=False)
+def logo(path='logo.png'):
+    """ Bytes do logo, lidos do disco uma vez por processo (compartilhados
+        entre reruns, sessões e páginas)
+
+        Input: caminho da imagem
+        Output: bytes
+    """
+    with open(path, 'rb') as arquivo:
+        return arquivo.read()
+
+def filtros_padrao(indice):
+    """ Filtros da sidebar antes de qualquer interação do usuário: do início dos
+        dados até DATA_PADRAO (limitada ao período) e todos os trânsitos
+
+        Input: backend ou FilterIndex do dataset
+        Output: dicionário de filtros, no formato devolvido por sidebar()
+    """
+    min_date, fim_dados = _limites(indice)
+
+    return {'inicio': min_date, 'fim': min(max(DATA_PADRAO, min_date), fim_dados),
+            'Road_traffic_density': indice.valores('Road_traffic_density')}
+
+def _limites(indice):
+    """ Limites do slider de período: o primeiro dia dos dados e o dia seguinte
+        ao último - o fim do período é exclusivo, então é o único valor de fim
+        que inclui o último dia
+    """
+    min_date, max_date = indice.periodo()
+    if max_date is None:
+        return min_date, max_date
+
+    return min_date, max_date + timedelta(days=1)
+
+def sidebar(indice, restaurantes=None):
+    """ Desenha a sidebar (logo, período e trânsito) e devolve os filtros escolhidos.
+
+        O período é inclusivo no início e exclusivo no fim, como o antigo filtro
+        "Order_Date < data limite". Os filtros são aceitos por
+        FilterIndex.select (linhas), Cubo.filtrar (células) e pelo filtrar()
+        dos backends.
+
+        Input: backend (utils.backend) ou FilterIndex do dataset - qualquer
+               objeto com periodo() e valores(coluna); restaurantes: função
+               que devolve a tabela de restaurantes do índice espacial - com
+               ela a sidebar ganha o filtro por raio, lido por filtro_raio()
+        Output: dicionário de filtros (inicio, fim e valores por coluna); o
+                modo aproximado fica fora dos filtros, em modo_aproximado()
+    """
+    #image_path='C:/Users/Phelipe Pachler/Documents/REPOS/ftc_python_analise_dados/notebooks/'
+    st.sidebar.image(logo(), width=300)
+
+    st.sidebar.markdown('# Pachler Company')
+    st.sidebar.markdown('## Fastest Delivery in Town')
+    st.sidebar.markdown('---')
+    st.sidebar.markdown('## Selecione o período')
+
+    min_date, fim_dados = _limites(indice)
+    padrao = filtros_padrao(indice)
+
+    date_slider = st.sidebar.slider(
+        'Quais datas?', value=(padrao['inicio'], padrao['fim']),
+        min_value=min_date,
+        max_value=fim_dados,
+        format='DD/MM/YYYY',
+        help='O dia final não entra no período: para incluir o último dia dos dados, '
+             'leve o fim até o dia seguinte a ele.')
+
+    st.sidebar.markdown('---')
+
+    traffic_values = padrao['Road_traffic_density']
+    traffic_options = st.sidebar.multiselect(
+        'Quais as condições do trânsito?',
+        traffic_values,
+        default=traffic_values)
+
+    if restaurantes is not None:
+        st.sidebar.markdown('---')
+        _widgets_raio(restaurantes)
+
+    st.sidebar.markdown('---')
+    st.sidebar.checkbox(
+        'Modo aproximado', key=CHAVE_APROXIMADO,
+        help='Respostas instantâneas para períodos longos: entregadores distintos por HyperLogLog, '
+             'percentis por t-digest e médias por amostra estratificada, cada valor com a sua '
+             'margem de erro (95%).')
+
+    st.sidebar.markdown('---')
+    st.sidebar.markdown('### Powered by Comunidade DS')
+
+    inicio, fim = date_slider
+    filtros = {'inicio': inicio, 'fim': fim, 'Road_traffic_density': traffic_options}
+    # seleção vazia: as páginas desenham KPIs e gráficos sem pedidos, o aviso explica o porquê
+    if inicio >= fim or not traffic_options:
+        st.warning('Nenhum pedido na seleção: escolha um período com o fim depois do início '
+                   '(o dia final não entra) e ao menos uma condição de trânsito.')
+
+    return filtros
+
+def _widgets_raio(restaurantes):
+    """ Filtro por raio: centro (um dos restaurantes mais movimentados ou um
+        ponto digitado) e raio em km; a tabela de restaurantes só é lida com
+        o filtro ligado
+    """
+    ligado = st.sidebar.checkbox(
+        'Filtrar por raio', key=CHAVE_RAIO,
+        help='Só os pedidos entregues a até N km do centro escolhido (índice espacial em grade).')
+    if not ligado:
+        return None
+
+    df_rest = restaurantes().head(LIMITE_RESTAURANTES)
+    rotulos = {(float(lat), float(lon)): '{} ({:.4f}, {:.4f}) - {} pedidos'.format(cidade, lat, lon, n)
+               for lat, lon, cidade, n in df_rest.itertuples(index=False)}
+    centro = st.sidebar.selectbox(
+        'Centro', list(rotulos) + [OUTRO_PONTO], key=CHAVE_CENTRO,
+        format_func=lambda opcao: 'Outro ponto (latitude/longitude)' if opcao == OUTRO_PONTO else rotulos[opcao])
+    if centro == OUTRO_PONTO:
+        padrao = next(iter(rotulos), (0.0, 0.0))
+        st.sidebar.number_input('Latitude', -90.0, 90.0, padrao[0], format='%.5f', key=CHAVE_LAT)
+        st.sidebar.number_input('Longitude', -180.0, 180.0, padrao[1], format='%.5f', key=CHAVE_LON)
+    st.sidebar.slider('Raio (km)', 1, 50, RAIO_PADRAO_KM, key=CHAVE_KM)
+
+    return None
+
+def filtro_raio():
+    """ Raio escolhido na sidebar, no formato aceito por backend.filtrar(raio=...)
+
+        Output: {'lat', 'lon', 'km'} ou None (filtro desligado ou sem centro)
+    """
+    if not st.session_state.get(CHAVE_RAIO, False):
+        return None
+
+    centro = st.session_state.get(CHAVE_CENTRO)
+    if centro == OUTRO_PONTO:
+        centro = (st.session_state.get(CHAVE_LAT), st.session_state.get(CHAVE_LON))
+    if centro is None or None in centro:
+        return None
+
+    return {'lat': float(centro[0]), 'lon': float(centro[1]),
+            'km': float(st.session_state.get(CHAVE_KM, RAIO_PADRAO_KM))}
+
+def modo_aproximado():
+    """ Indica se o modo aproximado foi ligado na sidebar """
+    return bool(st.session_state.get(CHAVE_APROXIMADO, False))
@@ -0,0 +1,118 @@
+# ----------------------------------------
+# Snapshot colunar (Parquet) do dataset já limpo
+#
+# Conversão manual (em blocos de linhas, com memória limitada):
+#   python -m utils.snapshot dataset/train.csv [saida.parquet] [linhas_por_bloco]
+import json
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.particoes import fatias_semanais, particoes
+
+# chave gravada nos metadados do arquivo com a assinatura do csv de origem
+CHAVE_ORIGEM = b'pachler_origem'
+
+# versão do formato do snapshot - incrementar sempre que clean_code mudar as colunas
+# geradas, para que snapshots antigos sejam refeitos
+VERSAO_SNAPSHOT = 5
+
+# ----------------------------------------
+# Funções
+def snapshot_path(csv_path):
+    """ Caminho do snapshot correspondente a um csv: mesmo nome, extensão .parquet """
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+def write_snapshot(df1, path, assinatura):
+    """ Grava o dataframe limpo em Parquet, preservando os tipos (inclusive category),
+        com um row group por semana (utils.particoes).
+
+        A assinatura (mtime, tamanho) do csv de origem e a versão do formato são
+        gravadas nos metadados para que o snapshot seja descartado quando o csv
+        ou a limpeza mudarem. A escrita é feita
+        num arquivo temporário e renomeada, então processos concorrentes nunca
+        leem um snapshot pela metade.
+
+        Input: dataframe limpo, caminho do parquet, assinatura do csv
+        Output: None
+    """
+    return write_snapshot_blocos([df1], path, assinatura)
+
+def write_snapshot_blocos(blocos, path, assinatura, particionar=True):
+    """ Como write_snapshot, mas recebe o dataset em blocos (ex.: um gerador) e
+        grava cada um como row groups do mesmo arquivo - só um bloco fica em
+        memória por vez. Os blocos devem ter o mesmo esquema; colunas category
+        podem ter categorias diferentes em cada bloco.
+
+        Com particionar, os blocos (ordenados por data) são cortados nas
+        fronteiras das semanas, então nenhum row group mistura duas semanas;
+        arquivos temporários com blocos fora de ordem usam particionar=False.
+
+        Input: iterável de dataframes limpos, caminho do parquet, assinatura do
+               csv, se alinha os row groups às semanas
+        Output: None
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    writer = None
+    try:
+        for df1 in blocos:
+            for parte in fatias_semanais(df1) if particionar and len(df1) else [df1]:
+                table = pa.Table.from_pandas(parte, preserve_index=False)
+                if writer is None:
+                    metadata = dict(table.schema.metadata or {})
+                    metadata[CHAVE_ORIGEM] = json.dumps([VERSAO_SNAPSHOT] + list(assinatura)).encode()
+                    writer = pq.ParquetWriter(tmp_path, table.schema.with_metadata(metadata))
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError('nenhum bloco para gravar em {}'.format(path))
+    os.replace(tmp_path, path)
+
+    return None
+
+def snapshot_valido(path, assinatura):
+    """ Indica se existe um snapshot gerado a partir do csv com esta assinatura """
+    if not os.path.exists(path):
+        return False
+
+    metadata = pq.read_schema(path).metadata or {}
+    origem = metadata.get(CHAVE_ORIGEM)
+
+    return origem is not None and json.loads(origem) == [VERSAO_SNAPSHOT] + list(assinatura)
+
+def read_snapshot(path, colunas=None):
+    """ Lê o snapshot carregando apenas as colunas pedidas.
+
+        A conversão para pandas libera cada coluna Arrow assim que ela é
+        convertida (self_destruct) e não junta as colunas em blocos
+        (split_blocks), então o pico de memória fica perto de uma cópia dos
+        dados, não de duas.
+
+        Input: caminho do parquet, lista de colunas (None = todas)
+        Output: dataframe
+    """
+    table = pq.read_table(path, columns=colunas)
+
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+if __name__ == '__main__':
+    from utils.dados import DATASET_PATH, LINHAS_POR_BLOCO, assinatura_arquivo, ingerir_em_blocos
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    parquet_path = sys.argv[2] if len(sys.argv) > 2 else snapshot_path(csv_path)
+    linhas_por_bloco = int(float(sys.argv[3])) if len(sys.argv) > 3 else LINHAS_POR_BLOCO
+
+    def progresso(fase, feito, total):
+        print('{:<10} {:>6.1%}'.format(fase, feito / total if total else 1), flush=True)
+
+    relatorio = ingerir_em_blocos(csv_path, parquet_path, assinatura_arquivo(csv_path),
+                                  linhas_por_bloco, progresso)
+    print('{linhas} linhas gravadas em {0} ({descartadas} descartadas por NaN, '
+          '{malformadas} malformadas, {blocos} blocos)'.format(parquet_path, **relatorio))
+
+    print('{} partições semanais'.format(len(particoes(parquet_path))))
@@ -0,0 +1,120 @@
+# ----------------------------------------
+# Tabelas paginadas no servidor
+#
+# O st.dataframe serializa a tabela inteira a cada rerun; com dezenas de
+# milhares de entregadores isso é a maior parte do payload da página. Aqui a
+# tabela agregada fica no servidor e o navegador recebe só a página visível:
+# a busca (por trecho do ID), a ordenação e o corte da página são feitos em
+# pandas/NumPy antes do st.dataframe.
+#
+# A ordenação usa a seleção parcial do utils.topk: só as linhas até o fim da
+# página pedida são ordenadas, não a tabela inteira.
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.topk import k_extremos
+
+LINHAS_POR_PAGINA = 25
+
+# ----------------------------------------
+# Funções
+def _valores_ordenaveis(coluna):
+    """ Array comparável com a mesma ordem dos valores da coluna """
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        if coluna.cat.categories.is_monotonic_increasing:
+            return coluna.cat.codes.to_numpy()
+        return coluna.astype(str).to_numpy()
+
+    return coluna.to_numpy()
+
+def buscar(df_aux, coluna, busca):
+    """ Linhas cuja 'coluna' contém o texto 'busca' (sem diferenciar maiúsculas)
+
+        Em colunas category a busca roda uma vez por categoria, não por linha.
+
+        Input: dataframe, coluna de busca, texto (vazio = todas as linhas)
+        Output: dataframe filtrado
+    """
+    if not busca:
+        return df_aux
+
+    serie = df_aux[coluna]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        achadas = serie.cat.categories.astype(str).str.contains(busca, case=False, regex=False)
+        mascara = np.isin(serie.cat.codes.to_numpy(), np.flatnonzero(achadas))
+    else:
+        mascara = serie.astype(str).str.contains(busca, case=False, regex=False).to_numpy()
+
+    return df_aux.loc[mascara]
+
+def pagina_tabela(df_aux, pagina=1, por_pagina=LINHAS_POR_PAGINA, ordem=None, crescente=True,
+                  busca='', coluna_busca=None):
+    """ Uma página da tabela depois da busca e da ordenação
+
+        Valores ausentes ficam sempre no fim, nos dois sentidos.
+
+        Input: tabela agregada, página (a partir de 1), linhas por página, coluna
+               de ordenação (None = ordem da tabela), sentido, texto de busca e
+               coluna onde buscar
+        Output: (dataframe da página, total de linhas depois da busca)
+    """
+    if coluna_busca is not None:
+        df_aux = buscar(df_aux, coluna_busca, busca)
+    total = len(df_aux)
+    inicio = (max(pagina, 1) - 1) * por_pagina
+    fim = min(inicio + por_pagina, total)
+    if inicio >= fim:
+        return df_aux.iloc[0:0], total
+
+    if ordem is None:
+        return df_aux.iloc[inicio:fim], total
+
+    ausentes = df_aux[ordem].isna().to_numpy()
+    validas = np.flatnonzero(~ausentes)
+    valores = _valores_ordenaveis(df_aux[ordem])[validas]
+    posicoes = validas[k_extremos(valores, min(fim, len(validas)), crescente)]
+    posicoes = np.concatenate([posicoes, np.flatnonzero(ausentes)[:max(fim - len(validas), 0)]])
+
+    return df_aux.iloc[posicoes[inicio:fim]], total
+
+def tabela_paginada(df_aux, key, coluna_busca=None, por_pagina=LINHAS_POR_PAGINA):
+    """ Desenha busca, ordenação e paginação e envia ao navegador só a página visível
+
+        A busca e a ordenação ficam no session_state (key); mudar qualquer uma
+        volta para a primeira página.
+
+        Input: tabela agregada, chave única dos widgets, coluna da busca por
+               texto (None = sem busca), linhas por página
+        Output: dataframe da página exibida
+    """
+    chave_pagina = key + '_pagina'
+
+    def _primeira_pagina():
+        st.session_state[chave_pagina] = 1
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+    busca = ''
+    if coluna_busca is not None:
+        busca = col1.text_input('Buscar {}'.format(coluna_busca), key=key + '_busca',
+                                on_change=_primeira_pagina)
+    ordem = col2.selectbox('Ordenar por', [None] + list(df_aux.columns), key=key + '_ordem',
+                           format_func=lambda coluna: '-' if coluna is None else coluna,
+                           on_change=_primeira_pagina)
+    crescente = col3.radio('Sentido', ['↑', '↓'], key=key + '_sentido', horizontal=True,
+                           on_change=_primeira_pagina) == '↑'
+
+    if coluna_busca is not None:
+        df_aux = buscar(df_aux, coluna_busca, busca)
+    total = len(df_aux)
+    paginas = max(-(-total // por_pagina), 1)
+    if st.session_state.get(chave_pagina, 1) > paginas:
+        st.session_state[chave_pagina] = paginas
+    pagina = st.number_input('Página', min_value=1, max_value=paginas, step=1, key=chave_pagina)
+
+    df_pagina, total = pagina_tabela(df_aux, int(pagina), por_pagina, ordem, crescente)
+    st.dataframe(df_pagina, hide_index=True, use_container_width=True)
+    st.caption('{} a {} de {} linhas'.format(min((int(pagina) - 1) * por_pagina + 1, total),
+                                             (int(pagina) - 1) * por_pagina + len(df_pagina), total))
+
+    return df_pagina
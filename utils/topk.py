@@ -0,0 +1,54 @@
+# ----------------------------------------
+# Top-k por grupo com seleção parcial
+#
+# Em vez de ordenar a tabela inteira, cada grupo usa np.argpartition para
+# separar os k menores (ou maiores) valores e ordena apenas esses k.
+import numpy as np
+
+# ----------------------------------------
+# Funções
+def k_extremos(valores, k, menores):
+    """ Posições dos k menores (ou maiores) valores, já ordenadas """
+    if len(valores) > k:
+        if menores:
+            posicoes = np.argpartition(valores, k - 1)[:k]
+        else:
+            posicoes = np.argpartition(valores, len(valores) - k)[-k:]
+    else:
+        posicoes = np.arange(len(valores))
+
+    ordem = np.argsort(valores[posicoes], kind='stable')
+
+    return posicoes[ordem if menores else ordem[::-1]]
+
+def top_k_por_grupo(df1, grupo, valor, k=10, sentidos=(True,)):
+    """ Os k menores e/ou maiores valores de cada grupo, sem ordenar a tabela inteira.
+
+        Funciona com qualquer número de grupos (inclusive zero) e devolve os
+        grupos em ordem crescente. Os índices dos grupos são calculados uma vez
+        e servem para todos os sentidos pedidos.
+
+        Input: dataframe, coluna de grupo, coluna de valor, k e sentidos
+               (True = k menores, False = k maiores)
+        Output: lista com um dataframe por sentido, até k linhas por grupo
+    """
+    valores = df1[valor].to_numpy()
+    grupos = sorted(df1.groupby(grupo, observed=True).indices.items())
+
+    resultados = []
+    for menores in sentidos:
+        posicoes = [p[k_extremos(valores[p], k, menores)] for _, p in grupos]
+        posicoes = np.concatenate(posicoes) if posicoes else np.array([], dtype='int64')
+        resultados.append(df1.iloc[posicoes].reset_index(drop=True))
+
+    return resultados
+
+def extremos_por_grupo(df1, grupo, valor, k=10):
+    """ Os k menores e os k maiores valores de cada grupo, na mesma passada
+
+        Input: dataframe, coluna de grupo, coluna de valor, k
+        Output: (k menores por grupo, k maiores por grupo)
+    """
+    menores, maiores = top_k_por_grupo(df1, grupo, valor, k, sentidos=(True, False))
+
+    return menores, maiores